@@ -0,0 +1,94 @@
+"""
+Compare the ways the plugin can decode a volume stored in an assetstore:
+
+* temp-file: copy the file into a temporary file and read it with SimpleITK,
+  as every read used to
+* direct: read the file in place through a link carrying its extension, as
+  done for filesystem assetstores
+* memory: decode the file content from memory, as done for other assetstores
+* mmap: decode an uncompressed file from a memory map
+
+Usage: python benchmarks/read_volume.py --size 512 512 400 --repeat 3
+"""
+import argparse
+import mmap
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import SimpleITK as sitk
+
+from segverviewer.image_io import read_image_from_buffer, read_local_image
+
+
+def read_with_temp_file(path, exts):
+    with tempfile.NamedTemporaryFile(suffix=exts, delete=True) as tmp:
+        with open(path, 'rb') as fp:
+            shutil.copyfileobj(fp, tmp)
+            tmp.flush()
+        return sitk.ReadImage(tmp.name)
+
+
+def read_direct(path, exts):
+    return read_local_image(path, exts)
+
+
+def read_from_memory(path, exts):
+    with open(path, 'rb') as fp:
+        return read_image_from_buffer(fp.read(), exts)
+
+
+def read_from_mmap(path, exts):
+    with open(path, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        image = read_image_from_buffer(buffer, exts)
+        # The image must not reference the map once it is closed
+        return sitk.Image(image)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, nargs=3, default=(512, 512, 400),
+                        help='volume size as x y z')
+    parser.add_argument('--exts', nargs='+', default=('.nii', '.nii.gz', '.nrrd'))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    array = rng.integers(-1024, 3000, size=args.size[::-1], dtype=np.int16)
+    image = sitk.GetImageFromArray(array)
+    image.SetSpacing((0.7, 0.7, 1.25))
+
+    readers = {
+        'temp-file': read_with_temp_file,
+        'direct': read_direct,
+        'memory': read_from_memory,
+        'mmap': read_from_mmap,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for exts in args.exts:
+            written = os.path.join(tmp_dir, f'volume{exts}')
+            sitk.WriteImage(image, written, useCompression=exts != '.nii')
+            # Assetstores name files by their hash, without extension
+            path = os.path.join(tmp_dir, 'b1946ac92492d2347c6235b4d2611184')
+            os.replace(written, path)
+            size_mb = os.path.getsize(path) / 1024 ** 2
+
+            for name, reader in readers.items():
+                if name == 'mmap' and exts != '.nii':
+                    continue
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    result = reader(path, exts)
+                    timings.append(time.perf_counter() - start)
+                assert np.array_equal(sitk.GetArrayViewFromImage(result), array)
+                print(f'{exts:8} {size_mb:8.1f} MB  {name:10} '
+                      f'best {min(timings):7.3f} s  mean {np.mean(timings):7.3f} s')
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare the ways segmentation files can be matched against a segVerHandler
+index with many versions:
+
+* nested-scan: compare the name built for every version with every file of
+  the label folder, as `_get_seg_files` used to
+* name-index: build the expected names once and match the files through a
+  dictionary keyed by name, as done now
+
+Only the matching is measured, the Mongo queries are left out. The nested scan
+is quadratic, so it is timed on a subset of the versions and extrapolated.
+
+Usage: python benchmarks/seg_file_lookup.py --volumes 1000 --versions 100
+"""
+import argparse
+import time
+
+from segverviewer.manifest import match_files, version_file_names
+
+
+def synthetic_index(volumes, versions):
+    return {
+        'label-extension': '.nii.gz',
+        'volumes': {
+            f'volume-{v:06d}': {
+                'versions': [{'id': f'volume-{v:06d}-version-{s:04d}'} for s in range(versions)]
+            }
+            for v in range(volumes)
+        },
+    }
+
+
+def synthetic_files(index, extra):
+    files = [{'_id': i, 'name': name} for i, name in enumerate(version_file_names(index))]
+    # Files of the label folder which are not listed in the index
+    files.extend({'_id': -i, 'name': f'unlisted-{i}.nii.gz'} for i in range(1, extra + 1))
+    return files
+
+
+def nested_scan(index, files):
+    extension = index['label-extension']
+    matched = []
+    for _, volume_data in index['volumes'].items():
+        for segmentation in volume_data['versions']:
+            for file in files:
+                if f'{segmentation["id"]}{extension}' == file['name']:
+                    matched.append({'name': file['name'], '_id': file['_id']})
+    return matched
+
+
+def name_index(index, files):
+    return [{'name': file['name'], '_id': file['_id']}
+            for file in match_files(version_file_names(index), files)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--volumes', type=int, default=1000)
+    parser.add_argument('--versions', type=int, default=100, help='versions per volume')
+    parser.add_argument('--extra-files', type=int, default=1000)
+    parser.add_argument('--scan-volumes', type=int, default=10,
+                        help='volumes matched by the nested scan before extrapolating')
+    args = parser.parse_args()
+
+    index = synthetic_index(args.volumes, args.versions)
+    files = synthetic_files(index, args.extra_files)
+    total = args.volumes * args.versions
+    print(f'{total} versions, {len(files)} files')
+
+    start = time.perf_counter()
+    matched = name_index(index, files)
+    elapsed = time.perf_counter() - start
+    assert len(matched) == total
+    print(f'name-index   {elapsed:9.3f} s')
+
+    subset = dict(index, volumes=dict(list(index['volumes'].items())[:args.scan_volumes]))
+    start = time.perf_counter()
+    scanned = nested_scan(subset, files)
+    elapsed = time.perf_counter() - start
+    assert scanned == name_index(subset, files)
+    print(f'nested-scan  {elapsed * args.volumes / args.scan_volumes:9.3f} s (extrapolated from '
+          f'{args.scan_volumes * args.versions} versions)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,111 @@
-import json
+import colorsys
+import os
+import traceback
 import tempfile
 import shutil
 import numpy as np
 
 from girder.constants import TokenScope, AccessType
-from girder.exceptions import ValidationException
+from girder.exceptions import AccessException, FilePathException, ValidationException
 from girder.models.file import File
 from girder.models.folder import Folder
 from girder.models.collection import Collection
 from girder.models.item import Item
+from girder.models.upload import Upload
+from girder.models.user import User
 from girder.plugin import GirderPlugin
 from girder import events
+from girder.utility import config
 from girder.api import access
 from girder.api.describe import Description, autoDescribeRoute
 from girder.api.rest import Resource, filtermodel
 
 import SimpleITK as sitk
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
 
 import configparser
 
+from .volume_cache import (
+    volume_cache, result_cache, index_cache, brick_cache, file_cache_key
+)
+from .slicing import PLANES, extract_plane, extract_slice, plane_orientation, slice_count
+from .transport import FORMATS, binary_response, content_etag, not_modified, pack_mask
+from .image_io import (
+    IMAGE_EXTENSIONS, PROBE_BYTES, can_read_from_buffer, probe_image_header,
+    read_image_from_buffer, read_local_image, read_local_image_information, sniff_image_format
+)
+from .contours import label_contours, mask_surface, pack_polylines
+from .derivatives import compute_label_derivatives
+from .quantification import quantify_labels
+from .metrics import compute_metrics
+from .bricks import BrickedArray, BrickedImage, read_brick, read_header, write_bricks
+from .pyramid import build_pyramid, downsample, level_geometry, pyramid_level
+from .diff import CATEGORIES, category_counts, category_volume, changed_voxels, run_lengths
+from .models import Job, SegmentationRecord, ERROR, QUEUED, RUNNING, SUCCESS
+from .search import SORT_FIELDS
+from .work_queue import ingest_queue, job_queue
+from .version_matrix import pairwise_matrix
+from .manifest import (
+    list_versions, list_volumes, load_index, load_index_outline, load_index_versions,
+    match_files, page, summarize_index, version_file_names, volume_file_names
+)
+
+# Caching of the voxel endpoints, see `_not_modified`. URLs name files by ID and
+# a file may get new content, so responses are revalidated by default.
+_HTTP_CACHE_NOTES = (
+    'Responses carry an ETag derived from the content of their files and parameters, '
+    'and requests with a matching If-None-Match get an empty 304 without decoding. '
+    'They are sent with Cache-Control: private, no-cache, as their URL names a file by '
+    'ID whose content can be replaced, and they require authentication so proxies must '
+    'not share them. The http_cache_max_age setting lets clients reuse them for that '
+    'many seconds without revalidating.'
+)
+
+
 class GirderPlugin(GirderPlugin):
     DISPLAY_NAME = 'SegVerViewer'
     CLIENT_SOURCE_PATH = 'web_client'
 
     def load(self, info):
         Item().exposeFields(level=AccessType.READ, fields={'segmentation'})
+        # Returned by the core file endpoints without any additional lookup
+        File().exposeFields(level=AccessType.READ, fields={'tag', 'comment'})
+
+        # Decoded volume cache limits can be set in the [segverviewer] config section
+        plugin_config = config.getConfig().get('segverviewer', {})
+        volume_cache.configure(
+            max_bytes=plugin_config.get('volume_cache_max_bytes'),
+            max_entries=plugin_config.get('volume_cache_max_entries')
+        )
+        result_cache.configure(
+            max_bytes=plugin_config.get('result_cache_max_bytes'),
+            max_entries=plugin_config.get('result_cache_max_entries')
+        )
+        index_cache.configure(
+            max_bytes=plugin_config.get('index_cache_max_bytes'),
+            max_entries=plugin_config.get('index_cache_max_entries')
+        )
+        brick_cache.configure(
+            max_bytes=plugin_config.get('brick_cache_max_bytes'),
+            max_entries=plugin_config.get('brick_cache_max_entries')
+        )
+        ingest_queue.configure(
+            workers=plugin_config.get('ingest_workers'),
+            max_pending=plugin_config.get('ingest_max_pending')
+        )
+
+        # Jobs interrupted by a restart are queued again
+        for job in Job().find({'status': {'$in': [QUEUED, RUNNING]}}):
+            if job['type'] == 'ingest':
+                ingest_queue.submit(_ingest_file, job)
+            elif job['type'] == 'version_matrix':
+                job_queue.submit(_run_version_matrix, job)
+            elif job['type'] == 'bricks':
+                job_queue.submit(_run_bricks_job, job)
+            elif job['type'] == 'search_index':
+                job_queue.submit(_run_search_index_job, job)
 
         # File handlers
 
@@ -33,8 +114,6 @@ class GirderPlugin(GirderPlugin):
         # Needed for the time being
         events.bind('model.file.remove', 'segmentation_viewer', _deletion_handler)
 
-        events.bind('rest.get.file/:id.after', 'segmentation_viewer', _file_get_handler)
-
         # Endpoints
         # Needed for the time being, until we make the final implementation for source volume and segmentation list endpoints
         info['apiRoot'].item.route(
@@ -77,11 +156,36 @@ class SegmentationItem(Resource):
             (':id', 'is_segverhandler_instance'),
             self.is_segverhandler_instance
         )
+        self.route(
+            'GET',
+            (':id', 'bootstrap'),
+            self.get_bootstrap
+        )
         self.route(
             'GET',
             (':id', 'get_index'),
             self.get_index
         )
+        self.route(
+            'GET',
+            (':id', 'index_summary'),
+            self.get_index_summary
+        )
+        self.route(
+            'GET',
+            (':id', 'index_volumes'),
+            self.list_index_volumes
+        )
+        self.route(
+            'GET',
+            (':id', 'index_versions'),
+            self.list_index_versions
+        )
+        self.route(
+            'GET',
+            ('search',),
+            self.search_segmentations
+        )
         self.route(
             'GET',
             (':id', 'get_all_index_files'),
@@ -98,6 +202,108 @@ class SegmentationItem(Resource):
             self.get_seg_files
         )
 
+        # Tags and comments of many segmentation files at once
+        self.route(
+            'GET',
+            ('file_info',),
+            self.get_file_info
+        )
+        self.route(
+            'PUT',
+            ('file_info',),
+            self.update_file_info
+        )
+
+        self.route(
+            'GET',
+            ('volume_cache',),
+            self.get_volume_cache_stats
+        )
+
+        # Slice access, so viewers never need to download whole volumes
+        self.route(
+            'GET',
+            (':id', 'volume_info'),
+            self.get_volume_info
+        )
+        self.route(
+            'GET',
+            (':id', 'slice', ':k'),
+            self.get_slice
+        )
+        self.route(
+            'GET',
+            ('diff_slice', ':k'),
+            self.get_diff_slice
+        )
+        self.route(
+            'GET',
+            (':id', 'region'),
+            self.get_region
+        )
+        self.route(
+            'GET',
+            (':id', 'contours', ':k'),
+            self.get_contours
+        )
+        self.route(
+            'GET',
+            (':id', 'surface'),
+            self.get_surface
+        )
+        self.route(
+            'GET',
+            (':id', 'derivatives'),
+            self.get_derivatives
+        )
+        self.route(
+            'GET',
+            ('quantification',),
+            self.get_quantification
+        )
+        self.route(
+            'GET',
+            ('metrics',),
+            self.get_metrics
+        )
+
+        # Background jobs
+        self.route(
+            'POST',
+            (':id', 'version_matrix'),
+            self.start_version_matrix
+        )
+        self.route(
+            'GET',
+            (':id', 'version_matrix'),
+            self.get_version_matrix
+        )
+        self.route(
+            'POST',
+            (':id', 'bricks'),
+            self.start_bricks
+        )
+        self.route(
+            'POST',
+            (':id', 'search_index'),
+            self.start_search_index
+        )
+        self.route(
+            'GET',
+            ('job', ':id'),
+            self.get_job
+        )
+        self.route(
+            'GET',
+            ('ingest_queue',),
+            self.get_ingest_queue
+        )
+        self.route(
+            'GET',
+            (':id', 'ingest_job'),
+            self.get_ingest_job
+        )
+
         # Will likely get reworked later
         self.route(
             'GET',
@@ -185,6 +391,36 @@ class SegmentationItem(Resource):
             return False
         return True
 
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get everything the viewer of a collection needs to render, in one request')
+        .modelParam(
+            'id',
+            'Collection ID',
+            model='collection',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .notes('Combines is_segverhandler_instance, index_summary, get_volume_files and '
+               'get_seg_files. Segmentation files also hold their tag and comment. Only '
+               'isSegverhandlerInstance is returned when the collection has no instance.')
+        .errorResponse('Collection ID was invalid')
+        .errorResponse('Read permission denied on the collection', 403)
+    )
+    def get_bootstrap(self, collection):
+        """
+        Get the instance flag, index summary, volume files and segmentation files of a collection
+        """
+        config, index, active_index = _get_segverhandler_instance(collection)
+        if not config or not index or not active_index:
+            return {'isSegverhandlerInstance': False}
+        return {
+            'isSegverhandlerInstance': True,
+            'index': summarize_index(index),
+            'volumeFiles': _get_volume_files(collection, index),
+            'segFiles': _get_seg_files(collection, index, fields=('tag', 'comment'))
+        }
+
     @access.user(scope=TokenScope.DATA_READ)
     @autoDescribeRoute(
         Description('Get index file for a collection with a segVerHandler instance')
@@ -195,6 +431,9 @@ class SegmentationItem(Resource):
             level=AccessType.READ,
             paramType='path'
         )
+        .notes('The whole index is parsed. Large indices are better browsed with '
+               'index_summary, index_volumes and index_versions, which only parse the '
+               'parts they need.')
         .errorResponse('Collection ID was invalid')
         .errorResponse('Read permission denied on the base image item', 403)
     )
@@ -202,9 +441,151 @@ class SegmentationItem(Resource):
         """
         Get index file for a collection with a segVerHandler instance
         """
-        _, index, _ = _get_segverhandler_instance(collection)
+        _, index, _ = _get_segverhandler_instance(collection, 'full')
         return index
 
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description(
+            'Get the settings of the segVerHandler index of a collection, without its volumes')
+        .modelParam(
+            'id',
+            'Collection ID',
+            model='collection',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .errorResponse('Collection ID was invalid')
+        .errorResponse('Read permission denied on the collection', 403)
+    )
+    def get_index_summary(self, collection):
+        """
+        Get the top-level settings of the index and the number of volumes and versions it lists
+        """
+        return summarize_index(_get_index(collection))
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('List the volumes of the segVerHandler index of a collection')
+        .modelParam(
+            'id',
+            'Collection ID',
+            model='collection',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .param('text', 'Only list volumes whose ID contains this text', required=False)
+        .pagingParams(defaultSort=None)
+        .errorResponse('Collection ID was invalid')
+        .errorResponse('Read permission denied on the collection', 403)
+    )
+    def list_index_volumes(self, collection, text, limit, offset):
+        """
+        List a page of volume IDs, with their number of versions
+        """
+        return list_volumes(_get_index(collection), text, offset, limit)
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('List the segmentation versions of the segVerHandler index of a collection')
+        .modelParam(
+            'id',
+            'Collection ID',
+            model='collection',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .param('volume', 'Only list the versions of this volume', required=False)
+        .param('tag', 'Only list the versions with this tag', required=False)
+        .pagingParams(defaultSort=None)
+        .errorResponse('Collection ID was invalid')
+        .errorResponse('Read permission denied on the collection', 403)
+        .errorResponse('Volume not found in the index', 400)
+    )
+    def list_index_versions(self, collection, volume, tag, limit, offset):
+        """
+        List a page of versions, with the ID and tag of their segmentation file when it exists.
+        A version has a tag when its segmentation file was tagged, or when the index gives it one.
+        """
+        index = _get_index(collection, 'versions', volume)
+        if volume is not None and volume not in index['volumes']:
+            raise ValidationException(f'volume \'{volume}\' not found in index', 'volume')
+
+        versions = list_versions(index, volume)
+        total = len(versions)
+        if tag is None:
+            # Only the files of the page need to be looked up
+            versions = page(versions, offset, limit)
+        files = {
+            file['name']: file
+            for file in _find_files_by_name(
+                _get_segmentation_folder(collection, index),
+                [version['name'] for version in versions])
+        }
+        for version in versions:
+            file = files.get(version['name'])
+            version['fileId'] = file['_id'] if file else None
+            if file and file.get('tag'):
+                version['tag'] = file['tag']
+        if tag is not None:
+            versions = [version for version in versions if version.get('tag') == tag]
+            total = len(versions)
+            versions = page(versions, offset, limit)
+
+        return {
+            'total': total,
+            'versions': versions
+        }
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Search the segmentation files of a collection')
+        .modelParam(
+            'collectionId',
+            'Collection ID',
+            model='collection',
+            level=AccessType.READ,
+            paramType='query',
+            destName='collection'
+        )
+        .param('volume', 'Only find the versions of this volume', required=False)
+        .param('version', 'Only find this version', required=False)
+        .param('tag', 'Only find segmentations with this tag', required=False)
+        .jsonParam('labels', 'JSON list of labels the segmentations must all contain',
+                   requireArray=True, required=False)
+        .param('minCount', 'Minimum number of voxels of each of the labels',
+               dataType='integer', required=False)
+        .pagingParams(defaultSort='volume')
+        .notes('Segmentations are indexed when they are ingested, and their tag when it is '
+               'set. Files ingested before are indexed with POST /segmentation/{id}/search_index. '
+               f'Results can be sorted by {", ".join(SORT_FIELDS)}.')
+        .errorResponse('Collection ID was invalid')
+        .errorResponse('Read permission denied on the collection', 403)
+        .errorResponse('Invalid labels, count or sort field', 400)
+    )
+    def search_segmentations(self, collection, volume, version, tag, labels, minCount,
+                             limit, offset, sort):
+        """
+        Find the segmentation files matching a volume, version, tag and label set,
+        with the voxel count of each of their labels
+        """
+        if labels is not None and not all(
+                isinstance(label, int) and not isinstance(label, bool) for label in labels):
+            raise ValidationException('labels must be a list of integers', 'labels')
+        if minCount is not None and not labels:
+            raise ValidationException('a minimum count needs labels', 'minCount')
+        for field, _ in sort:
+            if field not in SORT_FIELDS:
+                raise ValidationException(f'cannot sort on \'{field}\'', 'sort')
+
+        total, records = SegmentationRecord().search(
+            collection['_id'], offset=offset, limit=limit, sort=sort,
+            volume=volume, version=version, tag=tag, labels=labels, min_count=minCount)
+        return {
+            'total': total,
+            'records': records
+        }
+
     @access.user(scope=TokenScope.DATA_READ)
     @autoDescribeRoute(
         Description('Get all files within a collection related segVerHandler index')
@@ -332,6 +713,7 @@ class SegmentationItem(Resource):
         """
         file['tag'] = tag
         File().save(file)
+        SegmentationRecord().set_tags({file['_id']: tag})
 
     @access.user(scope=TokenScope.DATA_WRITE)
     @autoDescribeRoute(
@@ -359,7 +741,79 @@ class SegmentationItem(Resource):
 
     @access.user(scope=TokenScope.DATA_READ)
     @autoDescribeRoute(
-        Description('Get the base image of an item as a JSON object')
+        Description('Get the tag and comment of several segmentation files')
+        .jsonParam('ids', 'JSON list of file IDs', requireArray=True)
+        .param(
+            'skip_missing',
+            'Leave the files that do not exist or are not readable out of the response '
+            'instead of failing',
+            dataType='boolean',
+            required=False,
+            default=False
+        )
+        .errorResponse('A file ID was invalid')
+        .errorResponse('Read permission denied on a file', 403)
+    )
+    def get_file_info(self, ids, skip_missing):
+        """
+        Get the tags and comments of files, by file ID
+        """
+        files = _load_files(ids, self.getCurrentUser(), AccessType.READ, skip_missing)
+        return {
+            str(file['_id']): {'tag': file.get('tag'), 'comment': file.get('comment')}
+            for file in files
+        }
+
+    @access.user(scope=TokenScope.DATA_WRITE)
+    @autoDescribeRoute(
+        Description('Set the tag and comment of several segmentation files')
+        .jsonParam('updates', 'JSON object mapping file IDs to an object with a new '
+                   '\'tag\' and/or \'comment\'', paramType='body', requireObject=True)
+        .notes('All files are updated in a single bulk write. Fields not given are left unchanged.')
+        .errorResponse('A file ID or update was invalid')
+        .errorResponse('Write permission denied on a file', 403)
+    )
+    def update_file_info(self, updates):
+        """
+        Set the tags and comments of files
+        """
+        for file_id, update in updates.items():
+            if not isinstance(update, dict) or not update or set(update) - {'tag', 'comment'}:
+                raise ValidationException(
+                    f'update of file {file_id} must only hold a \'tag\' and/or a \'comment\'',
+                    'updates')
+
+        files = _load_files(list(updates), self.getCurrentUser(), AccessType.WRITE)
+        if files:
+            File().collection.bulk_write([
+                UpdateOne({'_id': file['_id']}, {'$set': update})
+                for file, update in zip(files, updates.values())
+            ], ordered=False)
+        SegmentationRecord().set_tags({
+            file['_id']: update['tag']
+            for file, update in zip(files, updates.values()) if 'tag' in update
+        })
+        return {
+            str(file['_id']): {
+                'tag': update.get('tag', file.get('tag')),
+                'comment': update.get('comment', file.get('comment'))
+            }
+            for file, update in zip(files, updates.values())
+        }
+
+    @access.admin
+    @autoDescribeRoute(
+        Description('Get usage statistics of the decoded volume cache')
+    )
+    def get_volume_cache_stats(self):
+        """
+        Get the hit/miss counters and current size of the decoded volume cache
+        """
+        return volume_cache.stats()
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get the metadata of a volume or segmentation without its voxels')
         .modelParam(
             'id',
             'File ID',
@@ -367,73 +821,827 @@ class SegmentationItem(Resource):
             level=AccessType.READ,
             paramType='path'
         )
+        .modelParam(
+            'volume_id',
+            'Source Volume File ID, if given the file is treated as a segmentation of it',
+            model='file',
+            level=AccessType.READ,
+            paramType='query',
+            destName='volume_file',
+            required=False
+        )
         .errorResponse('ID was invalid')
         .errorResponse('Read permission denied on the item', 403)
-        .errorResponse('Item does not have a segmentation property', 400)
-        .errorResponse('Item does not have a base image', 400)
+        .errorResponse('File was not readable by SimpleITK', 400)
     )
-    def get_base_image_data_json(self, file):
+    def get_volume_info(self, file, volume_file):
         """
-        Get the base image of an item as a JSON object. readable by VTKjs.
+        Get the spatial metadata and slice counts of a volume. For segmentations
+        the labels and quantification are included as well. Bricked volumes are
+        described from their bricks header, without decoding their voxels.
         """
-        
         try:
-            image, array = _read_image_with_sitk(file)
+            image, array = _read_volume_for_slicing(file)
+        except RuntimeError:
+            raise ValidationException('Image file is not readable by SimpleITK', '')
 
-            # print(f'array len: {len(array)}, subarray len: {len(array[0])}, subsubarray len: {len(array[0][0])}')
+        volume_info = {
+            'shape': image.GetSize(),
+            'spacing': image.GetSpacing(),
+            'origin': image.GetOrigin(),
+            'direction': image.GetDirection(),
+            'dtype': array.dtype.name,
+            'sliceCounts': [slice_count(array, axis) for axis in range(array.ndim)],
+        }
 
-            image_data_array = []
-            for image_slice in array:
-                image_data_array.append(image_slice.flatten().tolist())
+        if volume_file:
+            try:
+                _, base_array = _read_volume_for_slicing(volume_file)
+            except RuntimeError:
+                raise ValidationException('Image file is not readable by SimpleITK', '')
+            if base_array.shape != array.shape:
+                raise ValidationException(
+                    'Base image and segmentation files must have the same dimensions',
+                    'shape_mismatch'
+                )
+
+            try:
+                derivatives = _get_seg_derivatives(file)
+                quantification = _get_quantification(file, volume_file)
+            except RuntimeError:
+                raise ValidationException('Image file is not readable by SimpleITK', '')
+            volume_info['labels'] = [
+                {'value': label, 'color': _label_color(label)}
+                for label in derivatives['labels']
+            ]
+            volume_info['quantification'] = quantification['overall']
+
+        return volume_info
 
-            image_data = {
-                'shape': image.GetSize(),
-                'spacing': image.GetSpacing(),
-                'origin': image.GetOrigin(),
-                'direction': image.GetDirection(),
-                'data': image_data_array,
-            }
-            # print(f'Base image data: {image_data}')
-            # print(f'Shape: {image_data["shape"]}, Spacing: {image_data["spacing"]}, Origin: {image_data["origin"]}, Direction: {image_data["direction"]}')
-            # print(f'Base image data length: {len(image_data["data"])}')
-            return image_data
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get the precomputed label statistics of a segmentation')
+        .notes('Bounding boxes and slices are given in (z, y, x) order, bounding boxes '
+               'as inclusive [min, max] index pairs for each axis.')
+        .modelParam(
+            'id',
+            'Segmentation File ID',
+            model='file',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .errorResponse('ID was invalid')
+        .errorResponse('Read permission denied on the item', 403)
+        .errorResponse('File was not readable by SimpleITK', 400)
+    )
+    def get_derivatives(self, file):
+        """
+        Get the label set, voxel counts, bounding boxes and per-slice label
+        presence of a segmentation.
+        """
+        try:
+            return _get_seg_derivatives(file)
         except RuntimeError:
-            raise ValidationException('Base image file is not readable by SimpleITK', 'base_image')
+            raise ValidationException('Segmentation file is not readable by SimpleITK', '')
 
     @access.user(scope=TokenScope.DATA_READ)
     @autoDescribeRoute(
-        Description('get a segmentation as a JSON object')
-        .param(
+        Description('Get the intensity statistics of a source volume under each label '
+                    'of a segmentation')
+        .modelParam(
             'seg_id',
             'Segmentation File ID',
-            paramType='query'
+            model='file',
+            level=AccessType.READ,
+            paramType='query',
+            destName='seg_file'
         )
-        .param(
+        .modelParam(
             'volume_id',
             'Source Volume File ID',
-            paramType='query'
+            model='file',
+            level=AccessType.READ,
+            paramType='query',
+            destName='volume_file'
         )
         .errorResponse('File ID was invalid')
-        .errorResponse('File was not found', 400)
+        .errorResponse('Read permission denied on the item', 403)
         .errorResponse('File was not readable by SimpleITK', 400)
     )
-    def get_seg_data_json(self, seg_id, volume_id):
+    def get_quantification(self, seg_file, volume_file):
         """
-        Get segmentation overlayed on base image as a JSON object readable by VTKjs.
-        This method overlays the segmentation on top of the base image.
+        Get the min, max, mean, SD and volume in mm³ of the source volume
+        intensities under each label, and over the whole foreground.
         """
         try:
+            return _get_quantification(seg_file, volume_file)
+        except RuntimeError:
+            raise ValidationException('Image file is not readable by SimpleITK', '')
 
-            # Load the file objects from the provided IDs
-            volume_file = File().load(volume_id, force=True)
-            if not volume_file:
-                raise ValidationException('Source volume file not found', 'volume_id')
-
-            seg_file = File().load(seg_id, force=True)
-            if not seg_file:
-                raise ValidationException('SSegmentation file not found', 'seg_id')
-
-            # Read both image files
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get overlap and surface distance metrics between two segmentations')
+        .notes('Distances are given in physical units (mm). Metrics that are undefined, '
+               'e.g. distances to a label missing from one segmentation, are null.')
+        .modelParam(
+            'seg1_id',
+            'First segmentation file ID',
+            model='file',
+            level=AccessType.READ,
+            paramType='query',
+            destName='seg1'
+        )
+        .modelParam(
+            'seg2_id',
+            'Second segmentation file ID',
+            model='file',
+            level=AccessType.READ,
+            paramType='query',
+            destName='seg2'
+        )
+        .errorResponse('File ID was invalid')
+        .errorResponse('Read permission denied on the item', 403)
+        .errorResponse('File was not readable by SimpleITK', 400)
+    )
+    def get_metrics(self, seg1, seg2):
+        """
+        Get the Dice, Jaccard, Hausdorff, HD95 and ASSD between two segmentations,
+        for each label and for the whole foreground.
+        """
+        try:
+            return _get_metrics(seg1, seg2)
+        except RuntimeError:
+            raise ValidationException('Segmentation file is not readable by SimpleITK', '')
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Start computing the Dice and changed voxels between all versions of a volume')
+        .modelParam(
+            'id',
+            'Collection ID',
+            model='collection',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .param('volume', 'Volume ID, as listed in the segVerHandler index', paramType='query')
+        .notes('The matrix is computed by a background job, poll it with '
+               'GET /segmentation/job/{id}.')
+        .errorResponse('Collection ID was invalid')
+        .errorResponse('Read permission denied on the collection', 403)
+        .errorResponse('Volume not found in the index', 400)
+    )
+    def start_version_matrix(self, collection, volume):
+        """
+        Queue the pairwise comparison of every segmentation version of a volume
+        """
+        versions, files = _get_version_files(collection, volume)
+        job = Job().create_job(
+            'version_matrix',
+            user=self.getCurrentUser(),
+            collectionId=collection['_id'],
+            volume=volume,
+            versions=versions,
+            fileIds=[file['_id'] for file in files]
+        )
+        job_queue.submit(_run_version_matrix, job)
+        return job
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get the latest matrix comparing all versions of a volume')
+        .modelParam(
+            'id',
+            'Collection ID',
+            model='collection',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .param('volume', 'Volume ID, as listed in the segVerHandler index', paramType='query')
+        .errorResponse('Collection ID was invalid')
+        .errorResponse('Read permission denied on the collection', 403)
+    )
+    def get_version_matrix(self, collection, volume):
+        """
+        Get the most recent version matrix job of a volume, with its result once done
+        """
+        return Job().findOne({
+            'type': 'version_matrix',
+            'collectionId': collection['_id'],
+            'volume': volume
+        }, sort=[('created', -1)])
+
+    @access.user(scope=TokenScope.DATA_WRITE)
+    @autoDescribeRoute(
+        Description('Start storing a volume or segmentation as compressed bricks')
+        .notes('Slices and regions of a bricked file are read by decompressing only the '
+               'bricks they touch, instead of decoding the whole volume. The bricks are '
+               'stored in a file attached to the image, poll the job with '
+               'GET /segmentation/job/{id}.')
+        .modelParam(
+            'id',
+            'File ID',
+            model='file',
+            level=AccessType.WRITE,
+            paramType='path'
+        )
+        .errorResponse('ID was invalid')
+        .errorResponse('Write permission denied on the item', 403)
+    )
+    def start_bricks(self, file):
+        """
+        Queue the conversion of an image to bricks
+        """
+        job = Job().create_job('bricks', user=self.getCurrentUser(), fileId=file['_id'])
+        job_queue.submit(_run_bricks_job, job)
+        return job
+
+    @access.user(scope=TokenScope.DATA_WRITE)
+    @autoDescribeRoute(
+        Description('Start rebuilding the search records of the segmentations of a collection')
+        .modelParam(
+            'id',
+            'Collection ID',
+            model='collection',
+            level=AccessType.WRITE,
+            paramType='path'
+        )
+        .notes('Needed for files ingested before the search index existed. Segmentations '
+               'are decoded only when their label derivatives are not stored yet, poll the '
+               'job with GET /segmentation/job/{id}.')
+        .errorResponse('Collection ID was invalid')
+        .errorResponse('Write permission denied on the collection', 403)
+    )
+    def start_search_index(self, collection):
+        """
+        Queue the indexing of every segmentation file listed in the index of a collection
+        """
+        _get_index(collection)
+        job = Job().create_job(
+            'search_index', user=self.getCurrentUser(), collectionId=collection['_id'])
+        job_queue.submit(_run_search_index_job, job)
+        return job
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get the status, progress and result of a background job')
+        .modelParam('id', 'Job ID', model=Job, paramType='path', destName='job')
+        .errorResponse('Job ID was invalid')
+        .errorResponse('Read permission denied on the data of the job', 403)
+    )
+    def get_job(self, job):
+        """
+        Get a background job of the plugin
+        """
+        # Jobs are visible to everyone who can read the data they derive from
+        if job.get('collectionId'):
+            Collection().load(
+                job['collectionId'], user=self.getCurrentUser(), level=AccessType.READ, exc=True)
+        elif job.get('fileId'):
+            File().load(job['fileId'], user=self.getCurrentUser(), level=AccessType.READ, exc=True)
+        return job
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get the state of the queue ingesting uploaded files')
+    )
+    def get_ingest_queue(self):
+        """
+        Get the depth and counters of the ingestion queue, and the number of
+        ingestion jobs of each status
+        """
+        return dict(ingest_queue.stats(), jobs={
+            status: Job().collection.count_documents({'type': 'ingest', 'status': status})
+            for status in (QUEUED, RUNNING, SUCCESS, ERROR)
+        })
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get the latest ingestion job of a file')
+        .modelParam(
+            'id',
+            'File ID',
+            model='file',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .errorResponse('ID was invalid')
+        .errorResponse('Read permission denied on the item', 403)
+    )
+    def get_ingest_job(self, file):
+        """
+        Get the status, progress and result of the ingestion of a file
+        """
+        return Job().findOne({'type': 'ingest', 'fileId': file['_id']}, sort=[('created', -1)])
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get a single slice of a volume or segmentation')
+        .modelParam(
+            'id',
+            'File ID',
+            model='file',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .param('k', 'Index of the slice', paramType='path', dataType='integer')
+        .param(
+            'axis',
+            'NumPy axis to slice along, 0 being the slowest varying one',
+            paramType='query',
+            dataType='integer',
+            required=False,
+            default=0,
+            enum=[0, 1, 2]
+        )
+        .param(
+            'plane',
+            'Patient plane to slice along instead of the NumPy axis, the slice is then '
+            'reoriented from the image direction to the radiological convention',
+            paramType='query',
+            required=False,
+            enum=list(PLANES)
+        )
+        .param(
+            'level',
+            'Pyramid level, each level halving the resolution of the previous one',
+            paramType='query',
+            dataType='integer',
+            required=False,
+            default=0
+        )
+        .param(
+            'maxSize',
+            'Maximum number of rows and columns of the slice, the finest level '
+            'fitting it is returned',
+            paramType='query',
+            dataType='integer',
+            required=False
+        )
+        .param(
+            'labels',
+            'Comma separated labels, e.g. 7 or 1,7. A bitmask of the voxels holding any '
+            'of them is returned instead of the voxels, see the mask field of the response',
+            paramType='query',
+            required=False
+        )
+        .param(
+            'format',
+            'Response format: JSON lists, or a JSON header followed by a raw '
+            'little-endian voxel buffer (raw) or an NPY array (npy)',
+            paramType='query',
+            required=False,
+            default='json',
+            enum=list(FORMATS)
+        )
+        .notes('The slice index always refers to the full resolution volume. Label maps '
+               'are downsampled to the most frequent label of each block, other images '
+               'to the mean of each block. Masks hold one bit per voxel in C order, the '
+               'first voxel of each byte in its least significant bit. ' + _HTTP_CACHE_NOTES)
+        .errorResponse('ID was invalid')
+        .errorResponse('Read permission denied on the item', 403)
+        .errorResponse('Slice index out of range', 400)
+        .errorResponse('File was not readable by SimpleITK', 400)
+    )
+    def get_slice(self, file, k, axis, plane, level, maxSize, labels, format):
+        """
+        Get one slice of a volume as a JSON object readable by VTKjs.
+        """
+        labels = _parse_labels(labels)
+        if _not_modified([file], k=k, axis=axis, plane=plane, level=level, maxSize=maxSize,
+                         labels=labels, format=format):
+            return b''
+        try:
+            slice_data, slice_array = _get_slice(file, axis, k, level, maxSize, plane)
+        except RuntimeError:
+            raise ValidationException('Image file is not readable by SimpleITK', '')
+        if labels:
+            slice_array, slice_data['mask'] = pack_mask(slice_array, labels)
+
+        if format != 'json':
+            return binary_response(slice_data, slice_array, format)
+
+        slice_data['data'] = slice_array.ravel().tolist()
+        return slice_data
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get a single slice of the difference between two segmentations')
+        .notes(_HTTP_CACHE_NOTES)
+        .param('k', 'Index of the slice', paramType='path', dataType='integer')
+        .modelParam(
+            'seg1_id',
+            'First segmentation file ID',
+            model='file',
+            level=AccessType.READ,
+            paramType='query',
+            destName='seg1'
+        )
+        .modelParam(
+            'seg2_id',
+            'Second segmentation file ID',
+            model='file',
+            level=AccessType.READ,
+            paramType='query',
+            destName='seg2'
+        )
+        .param(
+            'axis',
+            'NumPy axis to slice along, 0 being the slowest varying one',
+            paramType='query',
+            dataType='integer',
+            required=False,
+            default=0,
+            enum=[0, 1, 2]
+        )
+        .param(
+            'plane',
+            'Patient plane to slice along instead of the NumPy axis',
+            paramType='query',
+            required=False,
+            enum=list(PLANES)
+        )
+        .param(
+            'mode',
+            'Difference to compute: absolute difference of the label values, uint8 '
+            'categories (0 agree, 1 only in A, 2 only in B, 3 label changed)',
+            paramType='query',
+            required=False,
+            default='absolute',
+            enum=['absolute', 'category']
+        )
+        .param(
+            'label',
+            'Only report differences involving this label, for the category mode',
+            paramType='query',
+            dataType='integer',
+            required=False
+        )
+        .param(
+            'format',
+            'Response format: JSON lists, or a JSON header followed by a raw '
+            'little-endian voxel buffer (raw) or an NPY array (npy)',
+            paramType='query',
+            required=False,
+            default='json',
+            enum=list(FORMATS)
+        )
+        .errorResponse('File ID was invalid')
+        .errorResponse('Read permission denied on a file', 403)
+        .errorResponse('Slice index out of range', 400)
+        .errorResponse('File was not readable by SimpleITK', 400)
+    )
+    def get_diff_slice(self, k, seg1, seg2, axis, plane, mode, label, format):
+        """
+        Get one slice of the difference between two segmentations as a JSON
+        object readable by VTKjs. Only the requested slice is compared.
+        """
+        if _not_modified([seg1, seg2], k=k, axis=axis, plane=plane, mode=mode, label=label,
+                         format=format):
+            return b''
+        try:
+            seg1_image, seg1_array = _read_volume_for_slicing(seg1)
+            _, seg2_array = _read_volume_for_slicing(seg2)
+        except RuntimeError:
+            raise ValidationException('Segmentation file is not readable by SimpleITK', '')
+
+        if seg1_array.shape != seg2_array.shape:
+            raise ValidationException(
+                'Segmentation files must have the same dimensions', 'shape_mismatch')
+
+        # Use seg1_image for spatial metadata (since both should have same metadata)
+        diff_data, seg1_slice = _slice_data(seg1_image, seg1_array, axis, k, plane)
+        _, seg2_slice = _slice_data(seg1_image, seg2_array, axis, k, plane)
+
+        if mode == 'category':
+            diff_slice = category_volume(seg1_slice, seg2_slice, label)
+            diff_data['labels'] = CATEGORIES
+        else:
+            diff_slice = np.abs(seg1_slice.astype(np.float32) - seg2_slice.astype(np.float32))
+        diff_data['type'] = 'difference'
+        diff_data['mode'] = mode
+        if format != 'json':
+            return binary_response(diff_data, diff_slice, format)
+
+        diff_data['data'] = diff_slice.ravel().tolist()
+        return diff_data
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get a box of voxels of a volume or segmentation')
+        .notes('Indices are given in (z, y, x) order. Bricked files only decompress the '
+               'bricks the box touches, see POST /segmentation/{id}/bricks. '
+               + _HTTP_CACHE_NOTES)
+        .modelParam(
+            'id',
+            'File ID',
+            model='file',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .param('start', 'First index of the box along each axis, e.g. 0,64,64',
+               paramType='query')
+        .param('stop', 'Index after the last one of the box along each axis, e.g. 1,128,128',
+               paramType='query')
+        .param(
+            'labels',
+            'Comma separated labels, e.g. 7 or 1,7. A bitmask of the voxels holding any '
+            'of them is returned instead of the voxels, see the mask field of the response',
+            paramType='query',
+            required=False
+        )
+        .param(
+            'format',
+            'Response format: JSON lists, or a JSON header followed by a raw '
+            'little-endian voxel buffer (raw) or an NPY array (npy)',
+            paramType='query',
+            required=False,
+            default='json',
+            enum=list(FORMATS)
+        )
+        .errorResponse('ID was invalid')
+        .errorResponse('Read permission denied on the item', 403)
+        .errorResponse('Box out of range', 400)
+        .errorResponse('File was not readable by SimpleITK', 400)
+    )
+    def get_region(self, file, start, stop, labels, format):
+        """
+        Get the voxels of a box of a volume, along with its shape.
+        """
+        labels = _parse_labels(labels)
+        if _not_modified([file], start=start, stop=stop, labels=labels, format=format):
+            return b''
+        try:
+            _, array = _read_volume_for_slicing(file)
+        except RuntimeError:
+            raise ValidationException('Image file is not readable by SimpleITK', '')
+
+        starts = _parse_indices(start, 'start', array.ndim)
+        stops = _parse_indices(stop, 'stop', array.ndim)
+        for first, last, size in zip(starts, stops, array.shape):
+            if not 0 <= first < last <= size:
+                raise ValidationException(
+                    f'Box must be non-empty and within the volume shape {list(array.shape)}',
+                    'stop')
+
+        region = array[tuple(slice(first, last) for first, last in zip(starts, stops))]
+        region_data = {'start': starts, 'stop': stops, 'shape': list(region.shape)}
+        if labels:
+            region, region_data['mask'] = pack_mask(region, labels)
+        if format != 'json':
+            return binary_response(region_data, region, format)
+
+        region_data['data'] = region.ravel().tolist()
+        return region_data
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get the outlines of the labels of a segmentation slice')
+        .notes('The outlines of each label are closed polylines, sent as one buffer of '
+               'float32 (column, row) vertices in pixel coordinates of the slice, as returned '
+               'by the slice endpoint with the same parameters. The contours field lists, '
+               'for each label, the number of vertices of each of its polylines in buffer '
+               'order. ' + _HTTP_CACHE_NOTES)
+        .modelParam(
+            'id',
+            'File ID',
+            model='file',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .param('k', 'Index of the slice', paramType='path', dataType='integer')
+        .param(
+            'axis',
+            'NumPy axis to slice along, 0 being the slowest varying one',
+            paramType='query',
+            dataType='integer',
+            required=False,
+            default=0,
+            enum=[0, 1, 2]
+        )
+        .param(
+            'plane',
+            'Patient plane to slice along instead of the NumPy axis',
+            paramType='query',
+            required=False,
+            enum=list(PLANES)
+        )
+        .param(
+            'level',
+            'Pyramid level, each level halving the resolution of the previous one',
+            paramType='query',
+            dataType='integer',
+            required=False,
+            default=0
+        )
+        .param(
+            'maxSize',
+            'Maximum number of rows and columns of the slice, the finest level '
+            'fitting it is outlined',
+            paramType='query',
+            dataType='integer',
+            required=False
+        )
+        .param('labels', 'Comma separated labels to outline, every label by default',
+               paramType='query', required=False)
+        .param(
+            'format',
+            'Response format: JSON lists, or a JSON header followed by a raw '
+            'little-endian vertex buffer (raw) or an NPY array (npy)',
+            paramType='query',
+            required=False,
+            default='json',
+            enum=list(FORMATS)
+        )
+        .errorResponse('ID was invalid')
+        .errorResponse('Read permission denied on the item', 403)
+        .errorResponse('Slice index out of range', 400)
+        .errorResponse('File was not readable by SimpleITK', 400)
+    )
+    def get_contours(self, file, k, axis, plane, level, maxSize, labels, format):
+        """
+        Get the outlines of the labels of one slice of a segmentation.
+        """
+        labels = _parse_labels(labels)
+        if _not_modified([file], k=k, axis=axis, plane=plane, level=level, maxSize=maxSize,
+                         labels=labels, format=format):
+            return b''
+        try:
+            contour_data, vertices = _get_contours(file, axis, k, level, maxSize, plane, labels)
+        except RuntimeError:
+            raise ValidationException('Image file is not readable by SimpleITK', '')
+
+        if format != 'json':
+            return binary_response(contour_data, vertices, format)
+
+        return dict(contour_data, data=vertices.ravel().tolist())
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get the surface mesh of a label of a segmentation')
+        .notes('The mesh follows the faces of the voxels of the label, after downsampling '
+               'the label the given number of times. Vertices are float32 (x, y, z) physical '
+               'coordinates and triangles uint32 vertex indices, counter-clockwise seen from '
+               'outside. Raw and NPY responses hold the vertices followed by the triangles '
+               'in one buffer of 32 bit words. ' + _HTTP_CACHE_NOTES)
+        .modelParam(
+            'id',
+            'File ID',
+            model='file',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .param('label', 'Label of the surface', paramType='query', dataType='integer')
+        .param(
+            'level',
+            'Number of times the label is downsampled, each time dividing the number '
+            'of triangles by about four',
+            paramType='query',
+            dataType='integer',
+            required=False,
+            default=1
+        )
+        .param(
+            'format',
+            'Response format: JSON lists, or a JSON header followed by a raw '
+            'little-endian buffer (raw) or an NPY array (npy)',
+            paramType='query',
+            required=False,
+            default='json',
+            enum=list(FORMATS)
+        )
+        .errorResponse('ID was invalid')
+        .errorResponse('Read permission denied on the item', 403)
+        .errorResponse('File was not readable by SimpleITK', 400)
+    )
+    def get_surface(self, file, label, level, format):
+        """
+        Get the surface of a label of a segmentation as a triangle mesh.
+        """
+        if level < 0:
+            raise ValidationException('level must not be negative', 'level')
+        if _not_modified([file], label=label, level=level, format=format):
+            return b''
+        try:
+            surface_data, vertices, triangles = _get_surface(file, label, level)
+        except RuntimeError:
+            raise ValidationException('Image file is not readable by SimpleITK', '')
+
+        if format != 'json':
+            return binary_response(surface_data, np.concatenate(
+                [vertices.view(np.uint32).ravel(), triangles.ravel()]), format)
+
+        return dict(surface_data, vertices=vertices.ravel().tolist(),
+                    triangles=triangles.ravel().tolist())
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('Get the base image of an item as a JSON object')
+        .notes(_HTTP_CACHE_NOTES)
+        .modelParam(
+            'id',
+            'File ID',
+            model='file',
+            level=AccessType.READ,
+            paramType='path'
+        )
+        .param(
+            'format',
+            'Response format: JSON lists, or a JSON header followed by a raw '
+            'little-endian voxel buffer (raw) or an NPY array (npy)',
+            paramType='query',
+            required=False,
+            default='json',
+            enum=list(FORMATS)
+        )
+        .errorResponse('ID was invalid')
+        .errorResponse('Read permission denied on the item', 403)
+        .errorResponse('Item does not have a segmentation property', 400)
+        .errorResponse('Item does not have a base image', 400)
+    )
+    def get_base_image_data_json(self, file, format):
+        """
+        Get the base image of an item as a JSON object. readable by VTKjs.
+        """
+        if _not_modified([file], format=format):
+            return b''
+        try:
+            image, array = _read_image_with_sitk(file)
+
+            # print(f'array len: {len(array)}, subarray len: {len(array[0])}, subsubarray len: {len(array[0][0])}')
+
+            if format != 'json':
+                return binary_response({
+                    'shape': image.GetSize(),
+                    'spacing': image.GetSpacing(),
+                    'origin': image.GetOrigin(),
+                    'direction': image.GetDirection(),
+                }, array, format)
+
+            image_data_array = []
+            for image_slice in array:
+                image_data_array.append(image_slice.flatten().tolist())
+
+            image_data = {
+                'shape': image.GetSize(),
+                'spacing': image.GetSpacing(),
+                'origin': image.GetOrigin(),
+                'direction': image.GetDirection(),
+                'data': image_data_array,
+            }
+            # print(f'Base image data: {image_data}')
+            # print(f'Shape: {image_data["shape"]}, Spacing: {image_data["spacing"]}, Origin: {image_data["origin"]}, Direction: {image_data["direction"]}')
+            # print(f'Base image data length: {len(image_data["data"])}')
+            return image_data
+        except RuntimeError:
+            raise ValidationException('Base image file is not readable by SimpleITK', 'base_image')
+
+    @access.user(scope=TokenScope.DATA_READ)
+    @autoDescribeRoute(
+        Description('get a segmentation as a JSON object')
+        .notes(_HTTP_CACHE_NOTES)
+        .param(
+            'seg_id',
+            'Segmentation File ID',
+            paramType='query'
+        )
+        .param(
+            'volume_id',
+            'Source Volume File ID',
+            paramType='query'
+        )
+        .param(
+            'format',
+            'Response format: JSON lists, or a JSON header followed by a raw '
+            'little-endian voxel buffer (raw) or an NPY array (npy)',
+            paramType='query',
+            required=False,
+            default='json',
+            enum=list(FORMATS)
+        )
+        .errorResponse('File ID was invalid')
+        .errorResponse('File was not found', 400)
+        .errorResponse('File was not readable by SimpleITK', 400)
+    )
+    def get_seg_data_json(self, seg_id, volume_id, format):
+        """
+        Get segmentation overlayed on base image as a JSON object readable by VTKjs.
+        This method overlays the segmentation on top of the base image.
+        """
+        try:
+
+            # Load the file objects from the provided IDs
+            volume_file = File().load(volume_id, force=True)
+            if not volume_file:
+                raise ValidationException('Source volume file not found', 'volume_id')
+
+            seg_file = File().load(seg_id, force=True)
+            if not seg_file:
+                raise ValidationException('SSegmentation file not found', 'seg_id')
+
+            if _not_modified([volume_file, seg_file], format=format):
+                return b''
+
+            # Read both image files
             base_image_sitk, base_array = _read_image_with_sitk(volume_file)
             seg_image_sitk, seg_array = _read_image_with_sitk(seg_file)
 
@@ -452,11 +1660,33 @@ class SegmentationItem(Resource):
             
             # print(f'Seg - RGB array shape: {rgb_array.shape}')
             
-            # Get unique segmentation labels for info
-            unique_labels = np.unique(seg_array)
-            unique_labels_no_bg = unique_labels[unique_labels != 0]
+            # Get unique segmentation labels for info, computed once per file
+            unique_labels_no_bg = _get_seg_derivatives(seg_file, seg_array)['labels']
             print(f'Seg - Found {len(unique_labels_no_bg)} unique segmentation labels: {unique_labels_no_bg}')
 
+            # Intensity statistics of the base image over the whole segmented foreground
+            quantification = _get_quantification(seg_file, volume_file)['overall']
+
+            print(f'Seg - Quantification statistics: {quantification}')
+
+            labels = [
+                {
+                    'value': int(label),
+                    'color': _label_color(label)
+                } for label in unique_labels_no_bg
+            ]
+
+            if format != 'json':
+                # Use base_image for spatial metadata (since both should have same metadata)
+                return binary_response({
+                    'shape': seg_image_sitk.GetSize(),
+                    'spacing': base_image_sitk.GetSpacing(),
+                    'origin': base_image_sitk.GetOrigin(),
+                    'direction': base_image_sitk.GetDirection(),
+                    'labels': labels,
+                    'quantification': quantification
+                }, seg_array, format)
+
             overlay_array = []
 
             # for slice in rgb_array:
@@ -466,21 +1696,6 @@ class SegmentationItem(Resource):
             for slice in seg_array:
                 overlay_array.append(np.array(slice).flatten().tolist())
 
-            # Get statistics about the overlay
-            unique_overlay_values = np.unique(overlay_array)
-            print(f'Seg - Unique overlay values: {len(unique_overlay_values)} values')
-
-            # Compute quantification statistics for the overlay, Still not sure how to calculate them correctly 🫠
-            quantification = {
-                'min': np.random.random(),
-                'max': np.random.random(),
-                'mean': np.random.random(),
-                'sd': np.random.random(),
-                'volume': np.random.randint(1, 100)
-            }
-
-            print(f'Seg - Quantification statistics: {quantification}')
-
             # Use base_image for spatial metadata (since both should have same metadata)
             seg_data = {
                 'shape': seg_image_sitk.GetSize(),
@@ -490,12 +1705,7 @@ class SegmentationItem(Resource):
                 # 'data': overlay_array.flatten().tolist(),  # Convert to list for JSON serialization
                 # 'data': seg_array.flatten().tolist(),  # Convert to list for JSON serialization
                 'data': overlay_array,  # Convert to list for JSON serialization
-                'labels': [
-                    {
-                        'value': int(label),
-                        'color': [np.random.random() for _ in range(3)]  # Random RGB color
-                    } for label in unique_labels_no_bg
-                ],
+                'labels': labels,
                 'quantification': quantification
             }
             
@@ -509,6 +1719,7 @@ class SegmentationItem(Resource):
     @access.user(scope=TokenScope.DATA_READ)
     @autoDescribeRoute(
         Description('get segmentation difference data as a JSON object')
+        .notes(_HTTP_CACHE_NOTES)
         .param(
             'seg1_id',
             'First segmentation file ID',
@@ -519,11 +1730,38 @@ class SegmentationItem(Resource):
             'Second segmentation file ID',
             paramType='query'
         )
+        .param(
+            'mode',
+            'Difference to compute: absolute difference of the label values, uint8 '
+            'categories (0 agree, 1 only in A, 2 only in B, 3 label changed), or sparse runs '
+            'of (slice, start index in the slice, length, category) covering the changed '
+            'voxels, slices being taken along the leading (z) axis',
+            paramType='query',
+            required=False,
+            default='absolute',
+            enum=['absolute', 'category', 'sparse']
+        )
+        .param(
+            'label',
+            'Only report differences involving this label, for the category and sparse modes',
+            paramType='query',
+            dataType='integer',
+            required=False
+        )
+        .param(
+            'format',
+            'Response format: JSON lists, or a JSON header followed by a raw '
+            'little-endian voxel buffer (raw) or an NPY array (npy)',
+            paramType='query',
+            required=False,
+            default='json',
+            enum=list(FORMATS)
+        )
         .errorResponse('File ID was invalid')
         .errorResponse('File was not found', 400)
         .errorResponse('File was not readable by SimpleITK', 400)
     )
-    def get_seg_diff_data_json(self, seg1_id, seg2_id):
+    def get_seg_diff_data_json(self, seg1_id, seg2_id, mode, label, format):
         """
         Get segmentation difference data as a JSON object readable by VTKjs.
         This method computes the differences between two segmentation files.
@@ -537,7 +1775,10 @@ class SegmentationItem(Resource):
             seg2 = File().load(seg2_id, force=True)
             if not seg2:
                 raise ValidationException('Second segmentation file not found', 'seg2_id')
-            
+
+            if _not_modified([seg1, seg2], mode=mode, label=label, format=format):
+                return b''
+
             # Read both segmentation files
             seg1_image, seg1_array = _read_image_with_sitk(seg1)
             seg2_image, seg2_array = _read_image_with_sitk(seg2)
@@ -548,11 +1789,38 @@ class SegmentationItem(Resource):
             if seg1_array.shape != seg2_array.shape:
                 raise ValidationException('Segmentation files must have the same dimensions', 'shape_mismatch')
             
-            # Compute the absolute difference between the two segmentations
-            diff_array = np.abs(seg1_array.astype(np.float32) - seg2_array.astype(np.float32))
-            
-            # Convert back to appropriate data type for visualization
-            # diff_array = diff_array.astype(np.uint8)
+            # Use seg1_image for spatial metadata (since both should have same metadata)
+            diff_header = {
+                'shape': seg1_image.GetSize(),
+                'spacing': seg1_image.GetSpacing(),
+                'origin': seg1_image.GetOrigin(),
+                'direction': seg1_image.GetDirection(),
+                'type': 'difference',
+                'mode': mode,
+            }
+
+            if mode == 'sparse':
+                runs, counts = _get_sparse_diff(seg1, seg2, seg1_array, seg2_array, label)
+                # Lets viewers reorient the slices they decode from the runs
+                planes = {
+                    plane: plane_orientation(seg1_image.GetDirection(), plane) for plane in PLANES
+                }
+                diff_header.update(categories=CATEGORIES, counts=counts, planes=planes)
+                if format != 'json':
+                    return binary_response(diff_header, runs, format)
+                diff_header['runs'] = runs.tolist()
+                return diff_header
+
+            if mode == 'category':
+                diff_array = category_volume(seg1_array, seg2_array, label)
+                # Categories are shown like labels by the viewer
+                diff_header['labels'] = CATEGORIES
+            else:
+                # Compute the absolute difference between the two segmentations
+                diff_array = np.abs(seg1_array.astype(np.float32) - seg2_array.astype(np.float32))
+
+            if format != 'json':
+                return binary_response(diff_header, diff_array, format)
 
             diff_data_array = []
             for diff_slice in diff_array:
@@ -567,15 +1835,7 @@ class SegmentationItem(Resource):
             # unique_diff_values = np.unique(diff_array)
             # print(f'Diff - Unique difference values: {unique_diff_values}')
             
-            # Use seg1_image for spatial metadata (since both should have same metadata)
-            diff_data = {
-                'shape': seg1_image.GetSize(),
-                'spacing': seg1_image.GetSpacing(),
-                'origin': seg1_image.GetOrigin(),
-                'direction': seg1_image.GetDirection(),
-                'data': diff_data_array,  # Convert to list for JSON serialization
-                'type': 'difference',  # Add type identifier for frontend
-            }
+            diff_data = dict(diff_header, data=diff_data_array)
             
             # print(f'Diff - Final shape: {diff_data["shape"]}')
             # print(f'Diff - Final data length: {len(diff_data["data"])}')
@@ -585,29 +1845,67 @@ class SegmentationItem(Resource):
             raise ValidationException('Segmentation file is not readable by SimpleITK', '')
 
 
-def _get_segverhandler_instance(collection: Collection):
+def _get_segverhandler_instance(collection: Collection, view: str = 'outline',
+                                volume: str = None):
     """
     Get all the information related to a segverhandler instance within a collection.
+
+    The parsed configuration and index are cached per collection and view. A
+    cached instance costs a single query checking that neither file changed,
+    and is dropped when a file is uploaded to or removed from the collection.
+
+    :param collection: Girder collection object
+    :param view: parts of the index to parse, see `_get_segverhandler_index`
+    :param volume: for the 'versions' view, the only volume to parse
     """
-    config = _get_segverhandler_config(collection)
-    if not config:
+    key = (str(collection['_id']), view, volume)
+    cached = index_cache.get(key)
+    if cached is not None and _are_files_unchanged(cached['files']):
+        return cached['instance']
+
+    config_file = _get_segverhandler_file(collection, 'config')
+    if not config_file:
         return (None, None, None)
+    config = _get_segverhandler_config(config_file)
 
     active_index = config["index"]["active"]
 
-    index = _get_segverhandler_index(collection, active_index)
-    if not index:
+    index_file = _get_segverhandler_file(collection, f"{active_index}.manifest.json")
+    if not index_file:
         return (None, None, None)
+    index = _get_segverhandler_index(index_file, view, volume)
+
+    instance = (config, index, active_index)
+    files = dict(file_cache_key(file) for file in (config_file, index_file))
+    # Parsed JSON takes a few times the size of the file, partial views less
+    index_cache.put(key, {'files': files, 'instance': instance},
+                    config_file['size'] + (4 if view == 'full' else 1) * index_file['size'])
+    return instance
+
+
+def _are_files_unchanged(versions: dict) -> bool:
+    """
+    Check in a single query that files still exist with the same content.
 
-    return (config, index, active_index)
+    :param versions: dictionary mapping file IDs to the version component
+        of their `file_cache_key`
+    :return: whether every file is unchanged
+    """
+    files = File().find(
+        {'_id': {'$in': [ObjectId(file_id) for file_id in versions]}},
+        fields=['sha512', 'updated', 'created']
+    )
+    current = dict(file_cache_key(file) for file in files)
+    return current == versions
 
 
-def _get_segverhandler_config(collection: Collection):
+def _get_segverhandler_file(collection: Collection, name: str):
     """
-    Get the .segverhandler configuration from a collection.
-    
+    Get a file of the .segverhandler folder of a collection.
+
     :param collection: Girder collection object
-    :return: configuration object or None if not found
+    :param name: name of the item and file
+    :return: Girder file object or None if not found
     """
     folder = Folder().findOne({
         'parentId': collection['_id'],
@@ -617,75 +1915,193 @@ def _get_segverhandler_config(collection: Collection):
 
     if not folder:
         return None
-    
-    config_file_name = 'config'
 
-    config_item = Item().findOne({
+    item = Item().findOne({
         'folderId': folder['_id'],
-        'name': config_file_name
+        'name': name
     })
 
-    if not config_item:
+    if not item:
         return None
 
-    config_file = File().findOne({
-        'itemId': config_item['_id'],
-        'name': config_file_name
+    return File().findOne({
+        'itemId': item['_id'],
+        'name': name
     })
 
-    if not config_file:
-        return None
 
+def _get_segverhandler_config(config_file):
+    """
+    Get the .segverhandler configuration from its file.
+
+    :param config_file: Girder file object of the configuration
+    :return: configuration object
+    """
     config = configparser.ConfigParser()
     with File().open(config_file) as fp:
         config.read_string(fp.read().decode('utf-8'))
         return config
 
 
-def _get_segverhandler_index(collection: Collection, active_index: str) -> dict:
+def _get_segverhandler_index(index_file, view: str = 'full', volume: str = None) -> dict:
+    """
+    Get the .segverhandler index from its file. Only the parts of the index a
+    view needs are parsed: the 'outline' holds the settings and the version
+    IDs, see `load_index_outline`, 'versions' adds every field of the
+    versions, see `load_index_versions`, and 'full' is the whole index.
+
+    :param index_file: Girder file object of the active index
+    :param view: 'outline', 'versions' or 'full'
+    :param volume: for the 'versions' view, the only volume to parse
+    :return: index file list
+    """
+    with File().open(index_file) as fp:
+        if view == 'outline':
+            return load_index_outline(fp)
+        if view == 'versions':
+            return load_index_versions(fp, volume)
+        return load_index(fp)
+
+
+def _get_index(collection: Collection, view: str = 'outline', volume: str = None) -> dict:
     """
-    Get the .segverhandler index from a collection.
+    Get the segVerHandler index of a collection.
 
     :param collection: Girder collection object
-    :return: index file list or None if not found
+    :param view: parts of the index to parse, see `_get_segverhandler_index`
+    :param volume: for the 'versions' view, the only volume to parse
+    :return: index
+    :raises ValidationException: if the collection has no segVerHandler instance
     """
-    folder = Folder().findOne({
-        'parentId': collection['_id'],
-        'parentCollection': 'collection',
-        'name': '.segverhandler'
-    })
+    _, index, _ = _get_segverhandler_instance(collection, view, volume)
+    if not index:
+        raise ValidationException('segVerHandler index not found in collection', 'collection')
+    return index
 
-    if not folder:
-        return None
 
-    index_name = f"{active_index}.manifest.json"
+def _get_seg_files(collection: Collection, index: dict = None, fields=()) -> list:
+    """
+    Get the segmentation files listed in the segVerHandler index of a collection.
 
-    index_item = Item().findOne({
-        'folderId': folder['_id'],
-        'name': index_name
-    })
+    :param collection: Girder collection object
+    :param index: segVerHandler index, looked up when not given
+    :param fields: additional file fields to return, None when a file lacks them
+    :return: list of files with their name, ID and additional fields
+    """
+    if index is None:
+        # Find the .segverhandler folder in this collection
+        _, index, _ = _get_segverhandler_instance(collection)
 
-    if not index_item:
-        return None
+    segmentation_folder = _get_segmentation_folder(collection, index)
+    names = version_file_names(index)
+    segmentation_files = _find_files_by_name(segmentation_folder, names)
+    return [
+        dict({field: file.get(field) for field in fields}, name=file['name'], _id=file['_id'])
+        for file in segmentation_files
+    ]
 
-    index_file = File().findOne({
-        'itemId': index_item['_id'],
-        'name': index_name
-    })
 
-    if not index_file:
-        return None
+def _load_files(ids, user, level: int, skip_missing: bool = False) -> list:
+    """
+    Load many files, checking access through the folders of their items.
+    Takes three queries whatever the number of files.
+
+    :param ids: file IDs
+    :param user: user the access is checked for
+    :param level: required access level
+    :param skip_missing: leave out the files that do not exist or that the
+        user lacks access to, instead of failing
+    :return: list of Girder file objects, in the order of the IDs
+    :raises ValidationException: if an ID is invalid or, unless skipped, a
+        file does not exist
+    :raises AccessException: if the user lacks access to a file, unless skipped
+    """
+    try:
+        object_ids = [ObjectId(file_id) for file_id in ids]
+    except (InvalidId, TypeError):
+        raise ValidationException('invalid file ID', 'ids')
+
+    files = {file['_id']: file for file in File().find({'_id': {'$in': object_ids}})}
+    missing = [str(file_id) for file_id in object_ids if file_id not in files]
+    if missing and not skip_missing:
+        raise ValidationException(f'files not found: {", ".join(missing)}', 'ids')
+
+    items = {
+        item['_id']: item
+        for item in Item().find(
+            {'_id': {'$in': list({file.get('itemId') for file in files.values()})}},
+            fields=['folderId'])
+    }
+    folders = {
+        folder['_id']: folder
+        for folder in Folder().find(
+            {'_id': {'$in': list({item['folderId'] for item in items.values()})}})
+    }
+    for file_id, file in list(files.items()):
+        item = items.get(file.get('itemId'))
+        folder = folders.get(item['folderId']) if item else None
+        if folder is None or not Folder().hasAccess(folder, user, level):
+            if not skip_missing:
+                raise AccessException(f'access denied on file {file_id}')
+            del files[file_id]
+    return [files[file_id] for file_id in object_ids if file_id in files]
+
+
+def _get_volume_files(collection: Collection, index: dict = None) -> list:
+    if index is None:
+        # Find the .segverhandler folder in this collection
+        _, index, _ = _get_segverhandler_instance(collection)
+
+    volumes_directory = index.get('volume-path', None)
+    if not volumes_directory:
+        raise ValidationException('volumes directory not specified in config', '')
     
-    with File().open(index_file) as fp:
-        index = json.load(fp)
+    volume_file_extension = index.get('volume-extension', None)
+    if not volume_file_extension:
+        raise ValidationException('volumes file extension not specified in config', '')
 
-    return index
+    volume_folder = Folder().findOne({
+        'parentId': collection['_id'],
+        'name': volumes_directory
+    })
 
+    if not volume_folder:
+        raise ValidationException(f'volumes directory \'{volumes_directory}\' not found in collection', 'collection')
 
-def _get_seg_files(collection: Collection) -> list:
-    # Find the .segverhandler folder in this collection
-    _, index, _ = _get_segverhandler_instance(collection)
+    volume_files = _find_files_by_name(volume_folder, volume_file_names(index))
+    return [{'name': file['name'], '_id': file['_id']} for file in volume_files]
+
+
+def _get_version_files(collection: Collection, volume: str) -> tuple:
+    """
+    Get the segmentation files of every version of a volume listed in the
+    segVerHandler index of a collection.
+
+    :param collection: Girder collection object
+    :param volume: volume ID in the index
+    :return: tuple (versions, files) with the IDs of the versions that have a
+        segmentation file, in index order, and their Girder file objects
+    :raises ValidationException: if the index, the label folder or the volume is missing
+    """
+    index = _get_index(collection)
+    if volume not in index['volumes']:
+        raise ValidationException(f'volume \'{volume}\' not found in index', 'volume')
+
+    segmentation_folder = _get_segmentation_folder(collection, index)
+    names = version_file_names(index, volume)
+    files = _find_files_by_name(segmentation_folder, names)
+    return [names[file['name']][1] for file in files], files
+
+
+def _get_segmentation_folder(collection: Collection, index: dict) -> dict:
+    """
+    Get the folder holding the segmentation files listed in a segVerHandler index.
 
+    :param collection: Girder collection object
+    :param index: segVerHandler index
+    :return: Girder folder object
+    :raises ValidationException: if the folder is not configured or not found
+    """
     segmentation_directory = index.get('label-path', None)
     if not segmentation_directory:
         raise ValidationException('segmentation directory not specified in config', '')
@@ -700,72 +2116,503 @@ def _get_seg_files(collection: Collection) -> list:
     })
 
     if not segmentation_folder:
-        raise ValidationException(f'segmentation directory \'{segmentation_directory}\' not found in collection', 'collection')
+        raise ValidationException(
+            f'segmentation directory \'{segmentation_directory}\' not found in collection',
+            'collection')
+    return segmentation_folder
 
-    segmentation_files = _lookup_files_in_folder(segmentation_folder)
 
-    segmentation_file_data = []
-    for _, volume_data in index['volumes'].items():
-        for segmentation in volume_data['versions']:
-            for segmentation_file in segmentation_files:
-                if f'{segmentation['id']}{segmentation_file_extension}' == segmentation_file['name']:
-                    segmentation_file_data.append({
-                        'name': segmentation_file['name'],
-                        '_id': segmentation_file['_id']
-                    })
-                    
-    return segmentation_file_data
+def _find_files_by_name(folder: Folder, names) -> list:
+    """
+    Find the files with the given names in the items of a folder. Items are
+    usually named after their file, so they are first looked up by name and
+    their files fetched in one query, both using indices. Names that are not
+    found this way are then looked up among the files of every item of the
+    folder.
+
+    :param folder: Girder folder object
+    :param names: expected file names, in the order of the result
+    :return: list of Girder file objects, for the names that were found
+    """
+    names = list(names)
+    if not names:
+        return []
+    items = Item().find({'folderId': folder['_id'], 'name': {'$in': names}}, fields=['_id'])
+    files = list(File().find({
+        'itemId': {'$in': [item['_id'] for item in items]},
+        'name': {'$in': names}
+    }))
+
+    found = {file['name'] for file in files}
+    missing = [name for name in names if name not in found]
+    if missing:
+        items = Item().find({'folderId': folder['_id']}, fields=['_id'])
+        files.extend(File().find({
+            'itemId': {'$in': [item['_id'] for item in items]},
+            'name': {'$in': missing}
+        }))
+    return match_files(names, files)
+
+
+def _run_version_matrix(job) -> None:
+    """
+    Run a version matrix job, see `pairwise_matrix`. Each version is decoded
+    once, unless it is already in the volume cache, and the matrix is stored
+    as the job result.
 
+    :param job: job document
+    """
+    def arrays():
+        for file_id in job['fileIds']:
+            file = File().load(file_id, force=True)
+            if file is None:
+                raise ValidationException('A segmentation file was removed', 'fileIds')
+            cached = volume_cache.get(file_cache_key(file))
+            if cached is not None:
+                yield cached[1]
+            else:
+                yield sitk.GetArrayFromImage(_decode_image_with_sitk(file))
+
+    job_model = Job()
+    job_model.set_running(job)
+    workers = config.getConfig().get('segverviewer', {}).get('matrix_workers') or os.cpu_count()
+    try:
+        matrix = pairwise_matrix(
+            arrays(), int(workers),
+            progress=lambda current, total: job_model.set_progress(job, current, total))
+    except Exception:
+        job_model.set_error(job, traceback.format_exc())
+        return
+    job_model.set_success(job, dict(matrix, versions=job['versions']))
 
-def _get_volume_files(collection: Collection) -> list:
-    # Find the .segverhandler folder in this collection
-    _, index, _ = _get_segverhandler_instance(collection)
 
-    volumes_directory = index.get('volume-path', None)
-    if not volumes_directory:
-        raise ValidationException('volumes directory not specified in config', '')
-    
-    volume_file_extension = index.get('volume-extension', None)
-    if not volume_file_extension:
-        raise ValidationException('volumes file extension not specified in config', '')
+def _slice_data(image, array, axis: int, index: int, plane: str = None) -> tuple:
+    """
+    Build the JSON object readable by VTKjs for one slice of a volume.
+
+    :param image: SimpleITK image holding the spatial metadata
+    :param array: volume array of the image
+    :param axis: NumPy axis to slice along
+    :param index: index of the slice along that axis
+    :param plane: patient plane to slice along instead of the NumPy axis, the
+        slice is then reoriented to the radiological convention, see `extract_plane`
+    :return: tuple (slice_data, slice_array), with the slice data without voxels
+    :raises ValidationException: if the slice index is out of range
+    """
+    if plane:
+        axis = plane_orientation(image.GetDirection(), plane)['axis']
+    count = slice_count(array, axis)
+    if index < 0 or index >= count:
+        raise ValidationException(f'Slice index must be between 0 and {count - 1}', 'k')
+
+    if plane:
+        slice_array, geometry = extract_plane(
+            array, image.GetSpacing(), image.GetOrigin(), image.GetDirection(), plane, index)
+        geometry['plane'] = plane
+    else:
+        slice_array, shape, spacing = extract_slice(array, image.GetSpacing(), axis, index)
+        geometry = {
+            'shape': shape,
+            'spacing': spacing,
+            'origin': image.GetOrigin(),
+            'direction': image.GetDirection(),
+            'axis': axis,
+        }
+    return dict(geometry, slice=index, sliceCount=count), slice_array
 
-    volume_folder = Folder().findOne({
-        'parentId': collection['_id'],
-        'name': volumes_directory
-    })
 
-    if not volume_folder:
-        raise ValidationException(f'volumes directory \'{volumes_directory}\' not found in collection', 'collection')
+def _get_slice(file, axis: int, index: int, level: int = 0, max_size: int = None,
+               plane: str = None) -> tuple:
+    """
+    Get one slice of a volume, from a level of its pyramid when a lower
+    resolution is requested, see `_get_pyramid`.
+
+    :param file: Girder file object
+    :param axis: NumPy axis to slice along
+    :param index: index of the slice in the full resolution volume
+    :param level: pyramid level, lowered to the coarsest one available
+    :param max_size: maximum number of rows and columns of the slice
+    :param plane: patient plane to slice along instead of the NumPy axis
+    :return: tuple (slice_data, slice_array), with the slice data without voxels
+    :raises ValidationException: if the slice index is out of range
+    :raises RuntimeError: if file is not readable by SimpleITK
+    """
+    if level > 0 or max_size:
+        pyramid = _get_pyramid(file)
+        if plane:
+            axis = plane_orientation(pyramid['direction'], plane)['axis']
+        levels = len(pyramid['levels'])
+        if max_size:
+            level = max(level, pyramid_level(pyramid['shape'], axis, max_size, levels))
+        level = min(level, levels)
+
+    if level <= 0:
+        image, array = _read_volume_for_slicing(file)
+        slice_data, slice_array = _slice_data(image, array, axis, index, plane)
+        slice_data['level'] = 0
+        return slice_data, slice_array
+
+    count = pyramid['shape'][axis]
+    if index < 0 or index >= count:
+        raise ValidationException(f'Slice index must be between 0 and {count - 1}', 'k')
+    image, array = pyramid['levels'][level - 1]
+    slice_data, slice_array = _slice_data(image, array, axis, index >> level, plane)
+    slice_data.update(slice=index, sliceCount=count, level=level)
+    return slice_data, slice_array
+
+
+def _get_contours(file, axis: int, index: int, level: int = 0, max_size: int = None,
+                  plane: str = None, labels=None) -> tuple:
+    """
+    Get the outlines of the labels of one slice of a segmentation, see
+    `label_contours`. They are cached per file, slice and labels.
+
+    :param file: Girder file object of the segmentation
+    :param axis: NumPy axis to slice along
+    :param index: index of the slice in the full resolution volume
+    :param level: pyramid level
+    :param max_size: maximum number of rows and columns of the slice
+    :param plane: patient plane to slice along instead of the NumPy axis
+    :param labels: labels to outline, every label of the slice when empty
+    :return: tuple (contour_data, vertices), with the slice data and the
+        'contours' of each label, and the vertices of the polylines
+    :raises ValidationException: if the slice index is out of range
+    :raises RuntimeError: if file is not readable by SimpleITK
+    """
+    slice_data, slice_array = _get_slice(file, axis, index, level, max_size, plane)
+    key = file_cache_key(file, 'contours', plane or axis, index, slice_data['level'],
+                         tuple(labels or ()))
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    vertices, slice_data['contours'] = pack_polylines(
+        label_contours(slice_array, labels or None))
+    result_cache.put(key, (slice_data, vertices), vertices.nbytes + 1024)
+    return slice_data, vertices
 
-    volumes_in_index = [f"{file}{volume_file_extension}" for file in index['volumes']]
-    folder_files = _lookup_files_in_folder(volume_folder)
-    volume_files = [ file for file in folder_files if file["name"] in volumes_in_index ]
-    return [ {'name': file['name'], '_id': file['_id']} for file in volume_files ]
 
+def _get_surface(file, label: int, level: int) -> tuple:
+    """
+    Get the surface mesh of a label of a segmentation, see `mask_surface`,
+    in physical coordinates. It is cached per file, label and level.
+
+    :param file: Girder file object of the segmentation
+    :param label: label of the surface
+    :param level: number of times the label mask is downsampled before meshing,
+        lowered when the mask gets down to a single voxel
+    :return: tuple (surface_data, vertices, triangles)
+    :raises ValidationException: if the segmentation is not 3D
+    :raises RuntimeError: if file is not readable by SimpleITK
+    """
+    key = file_cache_key(file, 'surface', label, level)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    image, array = _read_image_with_sitk(file)
+    if array.ndim != 3:
+        raise ValidationException('Surfaces can only be extracted from 3D label maps', 'id')
+    mask = (array == label).astype(np.uint8)
+    requested, level = level, 0
+    while level < requested and max(mask.shape) > 1:
+        mask = downsample(mask, labels=True)
+        level += 1
+    spacing, origin = level_geometry(
+        image.GetSpacing(), image.GetOrigin(), image.GetDirection(), level)
+    vertices, triangles = mask_surface(mask.astype(bool))
+
+    direction = np.reshape(image.GetDirection(), (3, 3))
+    vertices = (vertices * spacing @ direction.T + origin).astype(np.float32)
+    if np.linalg.det(direction) < 0:
+        # A mirroring direction turns the triangles inside out
+        triangles = triangles[:, ::-1].copy()
+
+    surface_data = {
+        'label': label,
+        'level': level,
+        'vertexCount': len(vertices),
+        'triangleCount': len(triangles),
+    }
+    result = (surface_data, vertices, triangles)
+    result_cache.put(key, result, vertices.nbytes + triangles.nbytes + 256)
+    return result
+
+
+def _get_pyramid(file) -> dict:
+    """
+    Get the downsampled levels of a volume, see `build_pyramid`. Segmentations
+    listed in the index of their collection are treated as label maps. The
+    pyramid is built from the decoded volume once and kept in the volume cache.
+
+    :param file: Girder file object
+    :return: dictionary with the 'shape' and 'direction' of the full resolution
+        volume and its 'levels', as (image, array) tuples from level 1 on
+    :raises RuntimeError: if file is not readable by SimpleITK
+    """
+    key = file_cache_key(file, 'pyramid')
+    pyramid = volume_cache.get(key)
+    if pyramid is not None:
+        return pyramid
+
+    image, array = _read_image_with_sitk(file)
+    pyramid = {'shape': array.shape, 'direction': image.GetDirection(), 'levels': []}
+    # Multi-component images would be downsampled across their components
+    if array.ndim == 3:
+        labels = _is_index_segmentation(Item().load(file['itemId'], force=True))
+        for level, level_array in enumerate(build_pyramid(array, labels), 1):
+            spacing, origin = level_geometry(
+                image.GetSpacing(), image.GetOrigin(), image.GetDirection(), level)
+            level_image = sitk.GetImageFromArray(level_array)
+            level_image.SetSpacing(spacing)
+            level_image.SetOrigin(origin)
+            level_image.SetDirection(image.GetDirection())
+            pyramid['levels'].append((level_image, sitk.GetArrayViewFromImage(level_image)))
+
+    volume_cache.put(key, pyramid, sum(array.nbytes for _, array in pyramid['levels']))
+    return pyramid
+
+
+def _not_modified(files, **params) -> bool:
+    """
+    Tag a response with the versions of the files it derives from and the
+    request parameters shaping it, see `not_modified`. The http_cache_max_age
+    setting lets clients reuse responses without revalidating them.
+
+    :param files: Girder file objects the response derives from
+    :param params: request parameters shaping the response
+    :return: whether the client copy is current, the endpoint should then
+        return right away without decoding anything
+    """
+    max_age = config.getConfig().get('segverviewer', {}).get('http_cache_max_age') or 0
+    tag = content_etag([file_cache_key(file) for file in files], params)
+    return not_modified(tag, int(max_age))
 
 
-def _lookup_files_in_folder(folder: Folder) -> list:
+def _parse_indices(value: str, name: str, ndim: int) -> list:
     """
-    Look up files in a folder by extension.
+    Parse a comma separated list of voxel indices.
+
+    :param value: indices, e.g. '0,64,64'
+    :param name: name of the parameter holding them
+    :param ndim: expected number of indices
+    :return: list of indices
+    :raises ValidationException: if the list is malformed
     """
-    files = []
-    for item in Item().find({'folderId': folder['_id']}):
-        for file in Item().childFiles(item):
-            files.append(file)
+    try:
+        indices = [int(index) for index in value.split(',')]
+    except ValueError:
+        raise ValidationException(f'{name} must be a comma separated list of integers', name)
+    if len(indices) != ndim:
+        raise ValidationException(f'{name} must hold {ndim} indices', name)
+    return indices
+
+
+def _parse_labels(value: str) -> list:
+    """
+    Parse a comma separated list of labels.
+
+    :param value: labels, e.g. '1,7', or None
+    :return: list of labels, empty when none are given
+    :raises ValidationException: if the list is malformed
+    """
+    if not value:
+        return []
+    try:
+        return [int(label) for label in value.split(',')]
+    except ValueError:
+        raise ValidationException('labels must be a comma separated list of integers', 'labels')
+
+
+def _get_seg_derivatives(file, array=None) -> dict:
+    """
+    Get the derivatives of a segmentation file, see `compute_label_derivatives`.
+    They are computed once per file content and stored on the file document.
+
+    :param file: Girder file object of the segmentation
+    :param array: segmentation array, read from the file when not given
+    :return: derivatives of the segmentation
+    :raises RuntimeError: if file is not readable by SimpleITK
+    """
+    version = file_cache_key(file)[1]
+    derivatives = file.get('segverviewer', {}).get('derivatives')
+    if derivatives and derivatives.get('version') == version:
+        return derivatives
+
+    if array is None:
+        _, array = _read_image_with_sitk(file)
+
+    derivatives = compute_label_derivatives(array)
+    derivatives['version'] = version
+    File().update(
+        {'_id': file['_id']},
+        {'$set': {'segverviewer.derivatives': derivatives}},
+        multi=False
+    )
+    file.setdefault('segverviewer', {})['derivatives'] = derivatives
+    return derivatives
+
+
+def _get_quantification(seg_file, volume_file) -> dict:
+    """
+    Get the statistics of a source volume under each label of a segmentation,
+    see `quantify_labels`. Results are memoized per file contents.
+
+    :param seg_file: Girder file object of the segmentation
+    :param volume_file: Girder file object of the source volume
+    :return: per-label and overall statistics
+    :raises RuntimeError: if a file is not readable by SimpleITK
+    :raises ValidationException: if the files do not have the same dimensions
+    """
+    key = file_cache_key(seg_file) + file_cache_key(volume_file, 'quantification')
+    quantification = result_cache.get(key)
+    if quantification is not None:
+        return quantification
+
+    _, seg_array = _read_image_with_sitk(seg_file)
+    volume_image, volume_array = _read_image_with_sitk(volume_file)
+    if seg_array.shape != volume_array.shape:
+        raise ValidationException(
+            'Base image and segmentation files must have the same dimensions', 'shape_mismatch')
+
+    labels = _get_seg_derivatives(seg_file, seg_array)['labels']
+    quantification = quantify_labels(seg_array, volume_array, labels, volume_image.GetSpacing())
+    result_cache.put(key, quantification, 256 * (len(labels) + 1))
+    return quantification
+
+
+def _get_metrics(seg1, seg2) -> dict:
+    """
+    Get the metrics comparing two segmentations, see `compute_metrics`.
+    Results are memoized per pair of file contents.
+
+    :param seg1: Girder file object of the first segmentation
+    :param seg2: Girder file object of the second segmentation
+    :return: per-label and overall metrics
+    :raises RuntimeError: if a file is not readable by SimpleITK
+    :raises ValidationException: if the files do not have the same dimensions
+    """
+    key = file_cache_key(seg1) + file_cache_key(seg2, 'metrics')
+    metrics = result_cache.get(key)
+    if metrics is not None:
+        return metrics
+
+    seg1_image, seg1_array = _read_image_with_sitk(seg1)
+    _, seg2_array = _read_image_with_sitk(seg2)
+    if seg1_array.shape != seg2_array.shape:
+        raise ValidationException(
+            'Segmentation files must have the same dimensions', 'shape_mismatch')
+
+    derivatives1 = _get_seg_derivatives(seg1, seg1_array)
+    derivatives2 = _get_seg_derivatives(seg2, seg2_array)
+    metrics = compute_metrics(
+        seg1_array, seg2_array, seg1_image.GetSpacing(), derivatives1, derivatives2)
+    result_cache.put(key, metrics, 256 * (len(metrics['labels']) + 1))
+    return metrics
+
+
+def _get_sparse_diff(seg1, seg2, seg1_array, seg2_array, label=None) -> tuple:
+    """
+    Get the changed voxels between two segmentations as runs, see `run_lengths`.
+    Results are memoized per pair of file contents and label.
+
+    :param seg1: Girder file object of the first segmentation
+    :param seg2: Girder file object of the second segmentation
+    :param seg1_array: first segmentation array
+    :param seg2_array: second segmentation array
+    :param label: if given, only differences involving this label are reported
+    :return: tuple (runs, counts) with the runs array and the voxel count of
+        each category
+    """
+    key = file_cache_key(seg1) + file_cache_key(seg2, 'sparse_diff', label)
+    sparse_diff = result_cache.get(key)
+    if sparse_diff is None:
+        indices, categories = changed_voxels(seg1_array, seg2_array, label)
+        runs = run_lengths(indices, categories, int(np.prod(seg1_array.shape[1:])))
+        sparse_diff = (runs, category_counts(categories))
+        result_cache.put(key, sparse_diff, runs.nbytes + 256)
+    return sparse_diff
+
+
+def _invalidate_derived_data(file, stored: bool = True) -> None:
+    """
+    Drop everything derived from the content of a file.
+
+    :param file: Girder file object
+    :param stored: whether to also drop the data stored on the file document
+    """
+    volume_cache.invalidate(file['_id'])
+    result_cache.invalidate(file['_id'])
+    brick_cache.invalidate(file['_id'])
+    _remove_bricks(file)
+    if stored and 'segverviewer' in file:
+        File().update({'_id': file['_id']}, {'$unset': {'segverviewer': ''}}, multi=False)
+        del file['segverviewer']
 
-    return files
+
+def _label_color(label) -> list:
+    """
+    Get a stable RGB color for a label value, so a label keeps its color
+    across slices, requests and segmentation versions.
+
+    :param label: label value
+    :return: RGB color with components between 0 and 1
+    """
+    # Golden ratio hue steps keep neighbouring labels visually distinct
+    hue = (int(label) * 0.618033988749895) % 1.0
+    return list(colorsys.hsv_to_rgb(hue, 0.75, 1.0))
 
 
 def _read_image_with_sitk(file) -> tuple:
     """
     Read a Girder file using SimpleITK and return the image and array.
+    Decoded volumes are kept in the process-wide volume cache, so the returned
+    array is a read-only view shared between requests.
     
     :param file: Girder file object
     :return: tuple (sitk_image, numpy_array)
     :raises RuntimeError: if file is not readable by SimpleITK
     """
-    exts = f'.{'.'.join(file['exts'])}'
-    
+    key = file_cache_key(file)
+    cached = volume_cache.get(key)
+    if cached is not None:
+        return cached
+
+    image = _decode_image_with_sitk(file)
+    # The view shares the image buffer, so the voxels are only held once
+    array = sitk.GetArrayViewFromImage(image)
+
+    volume_cache.put(key, (image, array), array.nbytes)
+    return image, array
+
+
+def _decode_image_with_sitk(file) -> sitk.Image:
+    """
+    Decode a Girder file using SimpleITK, bypassing the volume cache.
+
+    Files in a filesystem assetstore are read in place, NIfTI and NRRD files
+    in other assetstores are decoded from memory. Only other formats are
+    copied to a temporary file.
+
+    :param file: Girder file object
+    :return: SimpleITK image
+    :raises RuntimeError: if file is not readable by SimpleITK
+    """
+    exts = '.' + '.'.join(file['exts'])
+
+    try:
+        path = File().getLocalFilePath(file)
+    except FilePathException:
+        path = None
+    if path:
+        return read_local_image(path, exts)
+
+    if can_read_from_buffer(exts):
+        with File().open(file) as fp:
+            image = read_image_from_buffer(fp.read(), exts)
+        if image is not None:
+            return image
+
     # Create a temporary file with the same extension as the original
     with tempfile.NamedTemporaryFile(suffix=exts, delete=True) as tmp:
         # Download file from Girder into temp file
@@ -774,53 +2621,363 @@ def _read_image_with_sitk(file) -> tuple:
             tmp.flush()  # Ensure all data is written
         
         # Read image using SimpleITK
-        image = sitk.ReadImage(tmp.name)
-        array = sitk.GetArrayFromImage(image)
+        return sitk.ReadImage(tmp.name)
+
+
+def _read_volume_for_slicing(file) -> tuple:
+    """
+    Get a volume for reading parts of it. Bricked files are read from their
+    bricks, see `_build_bricks`, so they never have to be decoded whole. Other
+    files are read with `_read_image_with_sitk`.
+
+    :param file: Girder file object
+    :return: tuple (image, array), where the image holds the spatial metadata
+        and the array may be a `BrickedArray`
+    :raises RuntimeError: if file is not readable by SimpleITK
+    """
+    bricks = file.get('segverviewer', {}).get('bricks')
+    if bricks and bricks.get('version') == file_cache_key(file)[1]:
+        bricks_file = File().load(bricks['fileId'], force=True)
+        if bricks_file is not None:
+            return _read_bricked_volume(file, bricks_file)
+    return _read_image_with_sitk(file)
+
+
+def _read_bricked_volume(file, bricks_file) -> tuple:
+    """
+    Open the bricks of a volume. Bricks are only read and decompressed when
+    a slice or region touches them, and kept in the brick cache.
+
+    :param file: Girder file object of the volume
+    :param bricks_file: Girder file object holding its bricks
+    :return: tuple (BrickedImage, BrickedArray)
+    """
+    header_key = file_cache_key(bricks_file, 'header')
+    header = result_cache.get(header_key)
+    if header is None:
+        with File().open(bricks_file) as fp:
+            header = read_header(fp)
+        result_cache.put(header_key, header, 16 * len(header['lengths']) + 1024)
+
+    def load_brick(index):
+        key = file_cache_key(file, 'brick', index)
+        brick = brick_cache.get(key)
+        if brick is None:
+            with File().open(bricks_file) as fp:
+                brick = read_brick(fp, header, index)
+            brick_cache.put(key, brick, brick.nbytes)
+        return brick
+
+    return BrickedImage(header), BrickedArray(header, load_brick)
+
+
+def _build_bricks(file) -> dict:
+    """
+    Store a volume as compressed bricks, see `write_bricks`, in a file attached
+    to it. Previous bricks of the volume are replaced.
+
+    :param file: Girder file object of the volume
+    :return: the 'fileId' of the bricks and the 'version' of the volume they hold
+    :raises RuntimeError: if file is not readable by SimpleITK
+    :raises ValidationException: if the image is not a 3D scalar volume
+    """
+    version = file_cache_key(file)[1]
+    bricks = file.get('segverviewer', {}).get('bricks')
+    if bricks and bricks.get('version') == version:
+        return bricks
+
+    cached = volume_cache.get(file_cache_key(file))
+    image = cached[0] if cached is not None else _decode_image_with_sitk(file)
+    if image.GetDimension() != 3 or image.GetNumberOfComponentsPerPixel() != 1:
+        raise ValidationException('Only 3D scalar images can be stored as bricks', 'id')
+
+    with tempfile.TemporaryFile() as tmp:
+        size = write_bricks(
+            tmp, sitk.GetArrayViewFromImage(image),
+            spacing=image.GetSpacing(),
+            origin=image.GetOrigin(),
+            direction=image.GetDirection()
+        )
+        tmp.seek(0)
+        bricks_file = Upload().uploadFromFile(
+            tmp, size, file['name'] + '.bricks',
+            parentType='file',
+            parent=file,
+            user=User().load(file['creatorId'], force=True),
+            mimeType='application/octet-stream',
+            attachParent=True
+        )
+
+    _remove_bricks(file)
+    bricks = {'fileId': bricks_file['_id'], 'version': version}
+    File().update(
+        {'_id': file['_id']},
+        {'$set': {'segverviewer.bricks': bricks}},
+        multi=False
+    )
+    file.setdefault('segverviewer', {})['bricks'] = bricks
+    return bricks
+
+
+def _remove_bricks(file) -> None:
+    """
+    Remove the file holding the bricks of a volume, if it has any.
+
+    :param file: Girder file object of the volume
+    """
+    bricks = file.get('segverviewer', {}).get('bricks')
+    if bricks:
+        bricks_file = File().load(bricks['fileId'], force=True)
+        if bricks_file is not None:
+            File().remove(bricks_file)
+
+
+def _run_bricks_job(job) -> None:
+    """
+    Run a job storing a volume as bricks, see `_build_bricks`.
 
-        return image, array
+    :param job: job document
+    """
+    job_model = Job()
+    file = File().load(job['fileId'], force=True)
+    if file is None:
+        job_model.set_error(job, 'File was removed before it was bricked')
+        return
+
+    job_model.set_running(job)
+    try:
+        bricks = _build_bricks(file)
+    except Exception:
+        job_model.set_error(job, traceback.format_exc())
+        return
+    job_model.set_success(job, bricks)
 
 
 def _is_readable_by_sitk(file) -> bool:
     """
-    Check if a girder file is readable by SimpleITK or not.
+    Check if a girder file is readable by SimpleITK or not, from its header only.
     :param file: Girder file object
     :return: whether the file is readable by SimpleITK or not
     """
+    return _probe_image(file)['readable']
+
+
+def _probe_image(file) -> dict:
+    """
+    Get the image information of a Girder file without decoding its voxels.
+    It is read once per file content and stored on the file document.
+
+    NIfTI and NRRD headers are parsed from the first bytes of the file. Other
+    files recognized by their signature or extension have their header read by
+    SimpleITK's `ImageFileReader.ReadImageInformation`.
+
+    :param file: Girder file object
+    :return: dictionary telling whether the file is 'readable', with the
+        'format', 'size', 'spacing', 'origin', 'direction', 'dtype' and
+        'components' of the image when it is
+    """
+    version = file_cache_key(file)[1]
+    probe = file.get('segverviewer', {}).get('probe')
+    if probe and probe.get('version') == version:
+        return probe
+
+    exts = '.' + '.'.join(file.get('exts', []))
+    with File().open(file) as fp:
+        head = fp.read(PROBE_BYTES)
+
+    information = probe_image_header(head, exts)
+    if information is None and (
+            sniff_image_format(head) or exts.lower().endswith(IMAGE_EXTENSIONS)):
+        information = _read_image_information_with_sitk(file, exts)
+
+    probe = dict(information or {}, readable=information is not None, version=version)
+    File().update(
+        {'_id': file['_id']},
+        {'$set': {'segverviewer.probe': probe}},
+        multi=False
+    )
+    file.setdefault('segverviewer', {})['probe'] = probe
+    return probe
+
+
+def _read_image_information_with_sitk(file, exts: str):
+    """
+    Read the header of a Girder file using SimpleITK.
+
+    :param file: Girder file object
+    :param exts: extension of the file name, e.g. '.nii.gz'
+    :return: image information, or None if file is not readable by SimpleITK
+    """
     try:
-        # Try to read the image - if it succeeds, the file is readable
-        _read_image_with_sitk(file)
-        return True
+        try:
+            path = File().getLocalFilePath(file)
+        except FilePathException:
+            path = None
+        if path:
+            return read_local_image_information(path, exts)
+
+        with tempfile.NamedTemporaryFile(suffix=exts, delete=True) as tmp:
+            with File().open(file) as fp:
+                shutil.copyfileobj(fp, tmp)
+                tmp.flush()
+            return read_local_image_information(tmp.name, exts)
     except RuntimeError:
-        return False
+        return None
 
 # File handlers
 
 # Needed for the time being
 def _upload_handler(event):
     """
-    Whenever a new file is added to an item, check if the new file
-    is readable by SimpleITK. If it is, add it to the 'images' property.
+    Whenever a new file is added to an item, queue its ingestion, see
+    `_ingest_file`. The upload does not wait for it, unless the ingestion
+    queue is full.
     """
     # Get the ID of the file being added. If it even is a file
     file = event.info['file']
-    if not _is_readable_by_sitk(file):
+    # Files attached to other documents, e.g. bricks, are not images of an item
+    if file.get('itemId') is None:
         return
-
+    _invalidate_derived_data(file)
     item = Item().load(file['itemId'], force=True)
-    if 'segmentation' not in item:
-        item['segmentation'] = {}
+    # The file may be a new configuration or index of the collection
+    index_cache.invalidate(item['baseParentId'])
 
-    if 'images' not in item['segmentation']:
-        item['segmentation']['images'] = []
+    job = Job().create_job('ingest', fileId=file['_id'], itemId=file['itemId'])
+    if not ingest_queue.submit(_ingest_file, job):
+        _ingest_file(job)
 
-    item['segmentation']['images'].append({
-        'name': file['name'],
-        '_id': file['_id']
-    })
-    Item().save(item)
+
+def _ingest_file(job) -> None:
+    """
+    Ingest a new file: probe its header and, if it is readable by SimpleITK,
+    add it to the 'images' property of its item. The data the viewer needs
+    is then computed ahead of its first requests: the derivatives of
+    segmentations listed in the index of their collection, with the
+    ingest_warm_cache setting the decoded volume and its pyramid, and with
+    the ingest_bricks setting the bricks of 3D scalar volumes.
+
+    :param job: ingestion job document
+    """
+    job_model = Job()
+    file = File().load(job['fileId'], force=True)
+    if file is None:
+        job_model.set_error(job, 'File was removed before its ingestion')
+        return
+
+    job_model.set_running(job)
+    try:
+        probe = _probe_image(file)
+        if not probe['readable']:
+            job_model.set_success(job, {'readable': False})
+            return
+        job_model.set_progress(job, 1, 3)
+
+        # Concurrent ingestions may add images to the same item, and a file
+        # ingested again must not be listed twice
+        Item().update(
+            {'_id': file['itemId'], 'segmentation.images._id': {'$ne': file['_id']}},
+            {'$push': {'segmentation.images': {'name': file['name'], '_id': file['_id']}}},
+            multi=False
+        )
+        job_model.set_progress(job, 2, 3)
+
+        result = {'readable': True}
+        item = Item().load(file['itemId'], force=True)
+        plugin_config = config.getConfig().get('segverviewer', {})
+        if _is_index_segmentation(item):
+            derivatives = _get_seg_derivatives(file)
+            result['labels'] = derivatives['labels']
+            _index_segmentation(file, item, derivatives)
+        if plugin_config.get('ingest_warm_cache'):
+            _get_pyramid(file)
+        if plugin_config.get('ingest_bricks') and \
+                probe.get('components') == 1 and len(probe.get('size', ())) == 3:
+            result['bricks'] = _build_bricks(file)['fileId']
+        job_model.set_progress(job, 3, 3)
+    except Exception:
+        job_model.set_error(job, traceback.format_exc())
+        return
+    job_model.set_success(job, result)
     events.trigger('segmentation_viewer.upload.success')
 
 
+def _is_index_segmentation(item) -> bool:
+    """
+    Check whether an item is in the segmentation folder of the segVerHandler
+    index of its collection.
+
+    :param item: Girder item object
+    :return: whether the files of the item are segmentations
+    """
+    if item.get('baseParentType') != 'collection':
+        return False
+    collection = Collection().load(item['baseParentId'], force=True)
+    _, index, _ = _get_segverhandler_instance(collection)
+    if not index:
+        return False
+    try:
+        return _get_segmentation_folder(collection, index)['_id'] == item['folderId']
+    except ValidationException:
+        return False
+
+
+def _index_segmentation(file, item, derivatives: dict) -> None:
+    """
+    Store the search record of a segmentation file, see `SegmentationRecord`.
+
+    :param file: Girder file object of the segmentation
+    :param item: Girder item object of the file, in the segmentation folder
+        of the index of its collection
+    :param derivatives: derivatives of the segmentation
+    """
+    collection = Collection().load(item['baseParentId'], force=True)
+    index = _get_index(collection)
+    volume, version_id = version_file_names(index).get(file['name'], (None, None))
+    version = None
+    if volume is not None:
+        versions = list_versions(_get_index(collection, 'versions', volume), volume)
+        version = next(version for version in versions if version['id'] == version_id)
+    SegmentationRecord().set_file(file, collection['_id'], version, derivatives)
+
+
+def _run_search_index_job(job) -> None:
+    """
+    Rebuild the search records of the segmentation files listed in the index
+    of a collection. Records of files the index no longer lists are removed.
+
+    :param job: job document
+    """
+    job_model = Job()
+    job_model.set_running(job)
+    try:
+        collection = Collection().load(job['collectionId'], force=True)
+        if collection is None:
+            raise ValidationException('Collection was removed', 'collectionId')
+        index = _get_index(collection, 'versions')
+        versions = list_versions(index)
+        files = {
+            file['name']: file
+            for file in _find_files_by_name(
+                _get_segmentation_folder(collection, index),
+                [version['name'] for version in versions])
+        }
+        versions = [version for version in versions if version['name'] in files]
+        for position, version in enumerate(versions):
+            file = files[version['name']]
+            SegmentationRecord().set_file(
+                file, collection['_id'], version, _get_seg_derivatives(file))
+            job_model.set_progress(job, position + 1, len(versions))
+        SegmentationRecord().removeWithQuery({
+            'collectionId': collection['_id'],
+            'fileId': {'$nin': [file['_id'] for file in files.values()]}
+        })
+    except Exception:
+        job_model.set_error(job, traceback.format_exc())
+        return
+    job_model.set_success(job, {'indexed': len(versions)})
+
+
 # Needed for the time being
 def _deletion_handler(event):
     """
@@ -828,7 +2985,13 @@ def _deletion_handler(event):
     within the 'images' property. If it is, remove it.
     """
     file = event.info
+    if file.get('itemId') is None:
+        return
+    # The file document itself is about to be removed
+    _invalidate_derived_data(file, stored=False)
+    SegmentationRecord().removeWithQuery({'fileId': file['_id']})
     item = Item().load(file['itemId'], force=True)
+    index_cache.invalidate(item['baseParentId'])
 
     # Check if 'images' property even exists
     if 'segmentation' not in item or 'images' not in item['segmentation']:
@@ -846,17 +3009,3 @@ def _deletion_handler(event):
 
     Item().save(item)
     events.trigger('segmentation_viewer.file.remove.success')
-
-def _file_get_handler(event):
-    """
-    Handle file get requests.
-    """
-    file = File().load(event.info['id'], force=True)
-
-    if file is not None:
-        if 'tag' in file:
-            event.info['returnVal']['tag'] = file['tag']
-        if 'comment' in file:
-            event.info['returnVal']['comment'] = file['comment']
-
-    events.trigger('segmentation_viewer.file.get.success', event)
@@ -0,0 +1,199 @@
+import itertools
+import json
+import operator
+import struct
+import zlib
+
+import numpy as np
+
+# Edge length of the cubic blocks volumes are split into
+BRICK_SIZE = 64
+
+# Bricks are decompressed on every cache miss, so favour speed over ratio
+ZLIB_LEVEL = 3
+
+_MAGIC = b'SVBRICK1'
+
+
+def write_bricks(fp, array: np.ndarray, brick: int = BRICK_SIZE, **metadata) -> int:
+    """
+    Write a volume as independently compressed bricks, so that any region
+    can later be read by decompressing only the bricks it touches.
+
+    The file holds a magic string, the length of a JSON header as a
+    little-endian uint32, the header, and the zlib compressed bricks in C
+    order of the brick grid.
+
+    :param fp: binary file object to write to
+    :param array: volume array
+    :param brick: edge length of the bricks
+    :param metadata: additional JSON serializable header fields, e.g. the
+        spacing, origin and direction of the image
+    :return: number of bytes written
+    """
+    array = np.ascontiguousarray(array)
+    grid = _grid(array.shape, brick)
+    chunks = []
+    for position in itertools.product(*(range(n) for n in grid)):
+        region = tuple(slice(p * brick, (p + 1) * brick) for p in position)
+        chunks.append(zlib.compress(np.ascontiguousarray(array[region]).tobytes(), ZLIB_LEVEL))
+
+    header = dict(
+        metadata,
+        shape=list(array.shape),
+        dtype=array.dtype.str,
+        brick=brick,
+        compression='zlib',
+        lengths=[len(chunk) for chunk in chunks],
+    )
+    header_bytes = json.dumps(header).encode('utf-8')
+    fp.write(_MAGIC)
+    fp.write(struct.pack('<I', len(header_bytes)))
+    fp.write(header_bytes)
+    for chunk in chunks:
+        fp.write(chunk)
+    return len(_MAGIC) + 4 + len(header_bytes) + sum(header['lengths'])
+
+
+def read_header(fp) -> dict:
+    """
+    Read the header of a bricked volume.
+
+    :param fp: binary file object positioned at the start of the file
+    :return: header, with the 'offsets' of the bricks from the start of the file
+    :raises ValueError: if the file is not a bricked volume
+    """
+    if fp.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError('Not a bricked volume')
+    header_length = struct.unpack('<I', fp.read(4))[0]
+    header = json.loads(fp.read(header_length).decode('utf-8'))
+
+    offset = len(_MAGIC) + 4 + header_length
+    header['offsets'] = []
+    for length in header['lengths']:
+        header['offsets'].append(offset)
+        offset += length
+    return header
+
+
+def read_brick(fp, header: dict, index: int) -> np.ndarray:
+    """
+    Read and decompress one brick.
+
+    :param fp: seekable binary file object of the bricked volume
+    :param header: header of the volume, see `read_header`
+    :param index: flat index of the brick in the brick grid
+    :return: brick array, smaller than the brick size on the volume edges
+    """
+    fp.seek(header['offsets'][index])
+    data = zlib.decompress(fp.read(header['lengths'][index]))
+
+    shape = header['shape']
+    brick = header['brick']
+    position = np.unravel_index(index, _grid(shape, brick))
+    brick_shape = [min(brick, size - p * brick) for p, size in zip(position, shape)]
+    return np.frombuffer(data, dtype=np.dtype(header['dtype'])).reshape(brick_shape)
+
+
+class BrickedImage:
+    """
+    Spatial metadata of a bricked volume, with the getters of a SimpleITK
+    image the slicing code relies on.
+    """
+
+    def __init__(self, header: dict):
+        """
+        :param header: header of the volume holding its 'spacing', 'origin'
+            and 'direction', see `write_bricks`
+        """
+        self._header = header
+
+    def GetSize(self) -> tuple:
+        return tuple(reversed(self._header['shape']))
+
+    def GetSpacing(self) -> tuple:
+        return tuple(self._header['spacing'])
+
+    def GetOrigin(self) -> tuple:
+        return tuple(self._header['origin'])
+
+    def GetDirection(self) -> tuple:
+        return tuple(self._header['direction'])
+
+
+class BrickedArray:
+    """
+    Read-only array-like view of a bricked volume. Indexing it with integers
+    and contiguous slices reads only the bricks the selection touches.
+    """
+
+    def __init__(self, header: dict, load_brick):
+        """
+        :param header: header of the volume, see `read_header`
+        :param load_brick: callable returning a brick array from its flat index
+        """
+        self.shape = tuple(header['shape'])
+        self.dtype = np.dtype(header['dtype'])
+        self.ndim = len(self.shape)
+        self.brick = header['brick']
+        self._grid = _grid(self.shape, self.brick)
+        self._load_brick = load_brick
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > self.ndim:
+            raise IndexError('too many indices for array')
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        starts, stops, selection = [], [], []
+        for k, size in zip(key, self.shape):
+            if isinstance(k, slice):
+                start, stop, step = k.indices(size)
+                if step != 1:
+                    raise IndexError('only contiguous slices can be read from bricks')
+                starts.append(start)
+                stops.append(max(start, stop))
+                selection.append(slice(None))
+            else:
+                k = operator.index(k)
+                if k < 0:
+                    k += size
+                if not 0 <= k < size:
+                    raise IndexError(f'index {k} is out of bounds for size {size}')
+                starts.append(k)
+                stops.append(k + 1)
+                selection.append(0)
+        return self.read_region(starts, stops)[tuple(selection)]
+
+    def read_region(self, starts, stops) -> np.ndarray:
+        """
+        Read a box of the volume.
+
+        :param starts: first index of the box along each axis
+        :param stops: index after the last one of the box along each axis
+        :return: array holding the box
+        """
+        region = np.empty([stop - start for start, stop in zip(starts, stops)], dtype=self.dtype)
+        if not region.size:
+            return region
+
+        ranges = [
+            range(start // self.brick, (stop - 1) // self.brick + 1)
+            for start, stop in zip(starts, stops)
+        ]
+        for position in itertools.product(*ranges):
+            data = self._load_brick(int(np.ravel_multi_index(position, self._grid)))
+            origins = [p * self.brick for p in position]
+            lows = [max(start, origin) for start, origin in zip(starts, origins)]
+            highs = [min(stop, origin + size)
+                     for stop, origin, size in zip(stops, origins, data.shape)]
+            region[tuple(slice(low - start, high - start)
+                         for low, high, start in zip(lows, highs, starts))] = \
+                data[tuple(slice(low - origin, high - origin)
+                           for low, high, origin in zip(lows, highs, origins))]
+        return region
+
+
+def _grid(shape, brick: int) -> tuple:
+    return tuple(-(-size // brick) for size in shape)
@@ -0,0 +1,152 @@
+import numpy as np
+
+# Edges of a marching squares cell crossed by the contour, for each case of its
+# corners: top left (8), top right (4), bottom right (2) and bottom left (1).
+# Saddles keep diagonal corners apart, so labels are 4-connected.
+_TOP, _RIGHT, _BOTTOM, _LEFT = range(4)
+_CASES = {
+    1: [(_LEFT, _BOTTOM)],
+    2: [(_BOTTOM, _RIGHT)],
+    3: [(_LEFT, _RIGHT)],
+    4: [(_TOP, _RIGHT)],
+    5: [(_TOP, _RIGHT), (_LEFT, _BOTTOM)],
+    6: [(_TOP, _BOTTOM)],
+    7: [(_TOP, _LEFT)],
+    8: [(_TOP, _LEFT)],
+    9: [(_TOP, _BOTTOM)],
+    10: [(_TOP, _LEFT), (_BOTTOM, _RIGHT)],
+    11: [(_TOP, _RIGHT)],
+    12: [(_LEFT, _RIGHT)],
+    13: [(_RIGHT, _BOTTOM)],
+    14: [(_LEFT, _BOTTOM)],
+}
+# Position of the middle of each edge, in half pixels from the top left corner of the cell
+_EDGE_OFFSETS = {_TOP: (0, 1), _RIGHT: (1, 2), _BOTTOM: (2, 1), _LEFT: (1, 0)}
+
+
+def mask_contours(mask: np.ndarray) -> list:
+    """
+    Extract the outlines of a 2D mask with marching squares. Vertices lie
+    halfway between the pixels inside and outside of the mask.
+
+    :param mask: 2D boolean array, in (row, column) order
+    :return: list of closed polylines, each a float32 array of (column, row)
+        pixel coordinates whose last vertex connects back to the first
+    """
+    padded = np.pad(mask.astype(bool), 1)
+    cases = (padded[:-1, :-1].astype(np.uint8) << 3 | padded[:-1, 1:].astype(np.uint8) << 2
+             | padded[1:, 1:].astype(np.uint8) << 1 | padded[1:, :-1].astype(np.uint8))
+    # Edge midpoints are identified by their coordinates in half pixels
+    stride = 2 * padded.shape[1] + 1
+
+    segments = []
+    for case, edges in _CASES.items():
+        rows, columns = np.nonzero(cases == case)
+        if not len(rows):
+            continue
+        for start, end in edges:
+            segments.append(np.stack([
+                (2 * rows + _EDGE_OFFSETS[edge][0]) * stride + 2 * columns + _EDGE_OFFSETS[edge][1]
+                for edge in (start, end)
+            ], axis=-1))
+    if not segments:
+        return []
+
+    keys, ends = np.unique(np.concatenate(segments), return_inverse=True)
+    ends = ends.reshape(-1, 2)
+    # Every midpoint is the end of exactly two segments
+    incident = (np.argsort(ends.ravel(), kind='stable') // 2).reshape(-1, 2)
+    vertices = np.stack([keys % stride, keys // stride], axis=-1).astype(np.float32) / 2 - 1
+
+    ends_list = ends.tolist()
+    incident_list = incident.tolist()
+    visited = [False] * len(ends_list)
+    polylines = []
+    for first in range(len(ends_list)):
+        if visited[first]:
+            continue
+        points = []
+        segment = first
+        point = ends_list[first][0]
+        while not visited[segment]:
+            visited[segment] = True
+            points.append(point)
+            start, end = ends_list[segment]
+            point = end if start == point else start
+            before, after = incident_list[point]
+            segment = after if before == segment else before
+        polylines.append(vertices[points])
+    return polylines
+
+
+def label_contours(array: np.ndarray, labels=None) -> list:
+    """
+    Extract the outlines of the labels of a 2D label map, see `mask_contours`.
+
+    :param array: 2D label map, in (row, column) order
+    :param labels: labels to outline, every label but the background 0 by default
+    :return: list of (label, polylines) tuples
+    """
+    if labels is None:
+        labels = [label for label in np.unique(array).tolist() if label != 0]
+    return [(label, mask_contours(array == label)) for label in labels]
+
+
+def pack_polylines(contours: list) -> tuple:
+    """
+    Concatenate the vertices of the polylines of several labels into one buffer.
+
+    :param contours: list of (label, polylines) tuples, see `label_contours`
+    :return: tuple (vertices, description) with the float32 vertices as an
+        (N, 2) array and, for each label, its 'label' and the number of
+        vertices of each of its polylines in 'counts', in buffer order
+    """
+    description = []
+    buffers = []
+    for label, polylines in contours:
+        description.append({'label': label, 'counts': [len(polyline) for polyline in polylines]})
+        buffers.extend(polylines)
+    vertices = np.concatenate(buffers) if buffers else np.zeros((0, 2), dtype=np.float32)
+    return vertices, description
+
+
+def mask_surface(mask: np.ndarray) -> tuple:
+    """
+    Extract the surface of a 3D mask as the faces between voxels inside and
+    outside of it, two triangles per face. Triangles are counter-clockwise
+    seen from outside of the mask. Downsampling the mask first, e.g. with
+    `downsample`, decimates the surface.
+
+    :param mask: 3D boolean array, in (z, y, x) order
+    :return: tuple (vertices, triangles) with float32 (x, y, z) voxel index
+        coordinates and uint32 vertex indices
+    """
+    padded = np.pad(mask.astype(bool), 1)
+    corners_shape = tuple(size + 1 for size in padded.shape)
+
+    quads = []
+    for axis in range(3):
+        first = padded[tuple(slice(None, -1) if d == axis else slice(None) for d in range(3))]
+        second = padded[tuple(slice(1, None) if d == axis else slice(None) for d in range(3))]
+        b, c = (axis + 1) % 3, (axis + 2) % 3
+        for faces, outward in ((first & ~second, True), (~first & second, False)):
+            position = np.stack(np.nonzero(faces), axis=-1)
+            position[:, axis] += 1
+            corners = []
+            for offset_b, offset_c in ((0, 0), (1, 0), (1, 1), (0, 1)):
+                corner = position.copy()
+                corner[:, b] += offset_b
+                corner[:, c] += offset_c
+                corners.append(np.ravel_multi_index(corner.T, corners_shape))
+            # Corners in (b, c) order turn around +axis
+            quads.append(np.stack(corners if outward else corners[::-1], axis=-1))
+
+    quads = np.concatenate(quads)
+    if not len(quads):
+        return np.zeros((0, 3), dtype=np.float32), np.zeros((0, 3), dtype=np.uint32)
+    keys, indices = np.unique(quads, return_inverse=True)
+    indices = indices.reshape(-1, 4).astype(np.uint32)
+    # Reversing (z, y, x) into (x, y, z) mirrors the space, so the triangles are reversed as well
+    triangles = np.concatenate([indices[:, [0, 2, 1]], indices[:, [0, 3, 2]]])
+    vertices = np.stack(np.unravel_index(keys, corners_shape)[::-1], axis=-1) - 1.5
+    return vertices.astype(np.float32), triangles
@@ -0,0 +1,129 @@
+import numpy as np
+
+# Label value ranges up to this size are mapped through a lookup table
+# instead of a binary search
+_MAX_LOOKUP_RANGE = 1 << 20
+
+
+def compact_labels(array: np.ndarray) -> tuple:
+    """
+    Find the label values of a label map and map every voxel to the
+    position of its value in the sorted label list.
+
+    :param array: label map
+    :return: tuple (labels, indices) where labels is the sorted array of
+        values found and indices has the shape of the label map
+    """
+    if array.dtype == np.bool_:
+        array = array.view(np.uint8)
+    if array.dtype.kind in 'iu' and array.size:
+        low, high = int(array.min()), int(array.max())
+        if high - low < _MAX_LOOKUP_RANGE:
+            offset = array.astype(np.int64) - low if low else array
+            present = np.bincount(offset.ravel(), minlength=high - low + 1) > 0
+            labels = np.flatnonzero(present) + low
+            lookup = np.cumsum(present) - 1
+            return labels.astype(array.dtype), lookup[offset].astype(np.intp)
+
+    labels, indices = np.unique(array, return_inverse=True)
+    return labels, indices.reshape(array.shape)
+
+
+def find_labels(array: np.ndarray) -> np.ndarray:
+    """
+    Find the sorted label values of a label map, one slice of its leading
+    axis at a time so temporary arrays stay the size of a slice.
+
+    :param array: label map with at least one dimension
+    :return: sorted array of the values found
+    """
+    if array.dtype == np.bool_:
+        array = array.view(np.uint8)
+    if array.dtype.kind in 'iu' and array.size:
+        low, high = int(array.min()), int(array.max())
+        if high - low < _MAX_LOOKUP_RANGE:
+            present = np.zeros(high - low + 1, dtype=bool)
+            for array_slice in array:
+                offset = np.ravel(array_slice).astype(np.int64) - low
+                present |= np.bincount(offset, minlength=high - low + 1) > 0
+            return (np.flatnonzero(present) + low).astype(array.dtype)
+    return np.unique(np.concatenate(
+        [np.unique(array_slice) for array_slice in array] or [array.reshape(-1)]))
+
+
+def label_indices(array: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """
+    Map every voxel of a label map to the position of its value in a sorted
+    list of labels. Every value of the label map must be in the list.
+
+    :param array: label map, or any part of one
+    :param labels: sorted label values
+    :return: array of positions with the shape of the label map
+    """
+    labels = np.asarray(labels)
+    if array.dtype == np.bool_:
+        array = array.view(np.uint8)
+    if array.dtype.kind in 'iu' and labels.size:
+        low, high = int(labels[0]), int(labels[-1])
+        if high - low < _MAX_LOOKUP_RANGE:
+            lookup = np.zeros(high - low + 1, dtype=np.intp)
+            lookup[labels.astype(np.int64) - low] = np.arange(labels.size)
+            return lookup[array.astype(np.int64) - low if low else array]
+    return np.searchsorted(labels, array)
+
+
+def compute_label_derivatives(array: np.ndarray) -> dict:
+    """
+    Compute the label set, voxel counts, bounding boxes and per-slice label
+    presence of a label map in two passes over its slices, see `find_labels`.
+    Label positions are computed one slice at a time, so temporary arrays
+    stay the size of a slice. Label maps of any rank are supported, 3D ones
+    being sliced along z.
+
+    Bounding boxes and slices are given in NumPy (z, y, x) order, bounding
+    boxes as inclusive [min, max] index pairs for each axis.
+
+    :param array: label map in (z, y, x) order
+    :return: JSON serializable derivatives, the background label 0 excluded
+    """
+    array = np.atleast_1d(array)
+    labels = find_labels(array)
+    n_labels = len(labels)
+    shape = array.shape
+
+    counts = np.zeros(n_labels, dtype=np.int64)
+    presences = [np.zeros((size, n_labels), dtype=bool) for size in shape]
+    # Offsets of the positions along each axis of a slice, in the presence bincounts
+    offsets = [
+        (np.arange(size) * n_labels).reshape([-1 if a == axis else 1 for a in range(1, len(shape))])
+        for axis, size in enumerate(shape[1:], 1)
+    ]
+
+    for z in range(shape[0]):
+        slice_indices = label_indices(array[z], labels)
+        slice_counts = np.bincount(np.ravel(slice_indices), minlength=n_labels)
+        counts += slice_counts
+        presences[0][z] = slice_counts > 0
+        for axis, axis_offsets in enumerate(offsets, 1):
+            presences[axis] |= np.bincount(
+                (slice_indices + axis_offsets).ravel(), minlength=shape[axis] * n_labels
+            ).reshape(shape[axis], n_labels) > 0
+
+    foreground = labels != 0
+    bounding_boxes = [
+        [_presence_bounds(presence[:, i]) for presence in presences]
+        for i in np.flatnonzero(foreground)
+    ]
+    slice_labels = [labels[presence & foreground].tolist() for presence in presences[0]]
+
+    return {
+        'labels': labels[foreground].tolist(),
+        'counts': counts[foreground].tolist(),
+        'bounding_boxes': bounding_boxes,
+        'slice_labels': slice_labels,
+    }
+
+
+def _presence_bounds(presence: np.ndarray) -> list:
+    indices = np.flatnonzero(presence)
+    return [int(indices[0]), int(indices[-1])]
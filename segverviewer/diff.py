@@ -0,0 +1,91 @@
+import numpy as np
+
+# Categories of a label-aware difference
+AGREE = 0
+ONLY_IN_A = 1
+ONLY_IN_B = 2
+LABEL_CHANGED = 3
+
+CATEGORIES = [
+    {'value': ONLY_IN_A, 'name': 'only in A', 'color': [1.0, 0.55, 0.0]},
+    {'value': ONLY_IN_B, 'name': 'only in B', 'color': [0.0, 0.6, 1.0]},
+    {'value': LABEL_CHANGED, 'name': 'label changed', 'color': [1.0, 0.0, 1.0]},
+]
+
+
+def changed_voxels(seg1: np.ndarray, seg2: np.ndarray, label=None) -> tuple:
+    """
+    Find the voxels that differ between two label maps and categorize them.
+
+    :param seg1: first label map (A)
+    :param seg2: second label map (B), with the same shape
+    :param label: if given, only differences involving this label are reported
+    :return: tuple (indices, categories) with the flat indices of the changed
+        voxels in increasing order and their uint8 categories
+    """
+    seg1 = seg1.reshape(-1)
+    seg2 = seg2.reshape(-1)
+    if label is None:
+        indices = np.flatnonzero(seg1 != seg2)
+    else:
+        indices = np.flatnonzero((seg1 == label) != (seg2 == label))
+
+    # Only the changed voxels, usually very few, are looked at again
+    values1 = seg1[indices]
+    values2 = seg2[indices]
+    categories = np.full(indices.size, LABEL_CHANGED, dtype=np.uint8)
+    categories[values2 == 0] = ONLY_IN_A
+    categories[values1 == 0] = ONLY_IN_B
+    return indices, categories
+
+
+def category_volume(seg1: np.ndarray, seg2: np.ndarray, label=None) -> np.ndarray:
+    """
+    Compute the label-aware difference of two label maps as a uint8 volume
+    of categories: AGREE, ONLY_IN_A, ONLY_IN_B and LABEL_CHANGED.
+
+    :param seg1: first label map (A)
+    :param seg2: second label map (B), with the same shape
+    :param label: if given, only differences involving this label are reported
+    :return: category volume with the shape of the label maps
+    """
+    indices, categories = changed_voxels(seg1, seg2, label)
+    volume = np.zeros(seg1.shape, dtype=np.uint8)
+    volume.reshape(-1)[indices] = categories
+    return volume
+
+
+def run_lengths(indices: np.ndarray, categories: np.ndarray, slice_size: int) -> np.ndarray:
+    """
+    Encode changed voxels as runs of consecutive voxels of the same category
+    within a slice of the leading axis, so each slice is decoded from its own
+    runs.
+
+    :param indices: flat indices of the changed voxels, in increasing order
+    :param categories: categories of the changed voxels
+    :param slice_size: number of voxels of a slice of the leading axis
+    :return: (runs, 4) uint32 array of (slice, start index in the slice,
+        length, category), sorted by slice and start
+    """
+    if not indices.size:
+        return np.zeros((0, 4), dtype=np.uint32)
+
+    slices, offsets = np.divmod(indices, slice_size)
+    breaks = np.flatnonzero(
+        (np.diff(indices) != 1) | (np.diff(categories) != 0) | (np.diff(slices) != 0)) + 1
+    starts = np.concatenate(([0], breaks))
+    lengths = np.diff(np.concatenate((starts, [indices.size])))
+    return np.stack(
+        (slices[starts], offsets[starts], lengths, categories[starts]), axis=1
+    ).astype(np.uint32)
+
+
+def category_counts(categories: np.ndarray) -> dict:
+    """
+    Count the changed voxels of each category.
+
+    :param categories: categories of the changed voxels
+    :return: dictionary of voxel counts keyed by category name
+    """
+    counts = np.bincount(categories, minlength=LABEL_CHANGED + 1)
+    return {category['name']: int(counts[category['value']]) for category in CATEGORIES}
@@ -0,0 +1,456 @@
+import gzip
+import os
+import re
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+import SimpleITK as sitk
+
+# NIfTI-1 datatype codes and the NumPy types they map to
+_NIFTI_DTYPES = {
+    2: np.uint8,
+    4: np.int16,
+    8: np.int32,
+    16: np.float32,
+    64: np.float64,
+    256: np.int8,
+    512: np.uint16,
+    768: np.uint32,
+    1024: np.int64,
+    1280: np.uint64,
+}
+
+# NRRD type names and the NumPy types they map to
+_NRRD_DTYPES = {}
+for _dtype, _names in (
+    (np.int8, ('signed char', 'int8', 'int8_t')),
+    (np.uint8, ('uchar', 'unsigned char', 'uint8', 'uint8_t')),
+    (np.int16, ('short', 'short int', 'signed short', 'signed short int', 'int16', 'int16_t')),
+    (np.uint16, ('ushort', 'unsigned short', 'unsigned short int', 'uint16', 'uint16_t')),
+    (np.int32, ('int', 'signed int', 'int32', 'int32_t')),
+    (np.uint32, ('uint', 'unsigned int', 'uint32', 'uint32_t')),
+    (np.int64, ('longlong', 'long long', 'long long int', 'signed long long',
+                'signed long long int', 'int64', 'int64_t')),
+    (np.uint64, ('ulonglong', 'unsigned long long', 'unsigned long long int', 'uint64',
+                 'uint64_t')),
+    (np.float32, ('float',)),
+    (np.float64, ('double',)),
+):
+    for _name in _names:
+        _NRRD_DTYPES[_name] = _dtype
+
+# NRRD spaces whose first two axes point the opposite way of ITK's LPS space
+_NRRD_RAS_SPACES = ('right-anterior-superior', 'ras', 'scanner-xyz', '3d-right-handed')
+
+# Conversion between the RAS space used by NIfTI and the LPS space used by ITK
+_RAS_TO_LPS = np.diag([-1.0, -1.0, 1.0])
+
+# Number of bytes read from the start of a file to probe its header
+PROBE_BYTES = 64 * 1024
+
+# Extensions of the image formats SimpleITK can read
+IMAGE_EXTENSIONS = (
+    '.nii', '.nii.gz', '.nrrd', '.nhdr', '.mha', '.mhd', '.hdr', '.img', '.img.gz', '.nia',
+    '.dcm', '.dicom', '.gipl', '.gipl.gz', '.mnc', '.mgh', '.mgz', '.vtk', '.hdf5', '.h5',
+    '.tif', '.tiff', '.png', '.jpg', '.jpeg', '.bmp', '.lsm', '.pic', '.rec', '.par',
+)
+
+# SimpleITK pixel types and the NumPy types of their components
+_SITK_DTYPES = {}
+for _dtype, _name in (
+    ('int8', 'Int8'), ('uint8', 'UInt8'), ('int16', 'Int16'), ('uint16', 'UInt16'),
+    ('int32', 'Int32'), ('uint32', 'UInt32'), ('int64', 'Int64'), ('uint64', 'UInt64'),
+    ('float32', 'Float32'), ('float64', 'Float64'),
+):
+    for _prefix in ('sitk', 'sitkVector'):
+        _SITK_DTYPES[getattr(sitk, _prefix + _name)] = _dtype
+
+
+def read_local_image(path: str, exts: str) -> sitk.Image:
+    """
+    Read an image file that is already on the local disk, without copying it.
+
+    Assetstores usually name files by their hash, but SimpleITK picks the
+    image reader from the file extension, so files without the expected
+    extension are read through a symbolic link carrying it.
+
+    :param path: path of the file on the local disk
+    :param exts: extension of the original file name, e.g. '.nii.gz'
+    :return: SimpleITK image
+    :raises RuntimeError: if the file is not readable by SimpleITK
+    """
+    if path.endswith(exts):
+        return sitk.ReadImage(path)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        link = os.path.join(tmp_dir, f'image{exts}')
+        os.symlink(os.path.abspath(path), link)
+        return sitk.ReadImage(link)
+
+
+def read_local_image_information(path: str, exts: str) -> dict:
+    """
+    Read the header of an image file that is already on the local disk,
+    without decoding its voxels.
+
+    :param path: path of the file on the local disk
+    :param exts: extension of the original file name, e.g. '.nii.gz'
+    :return: image information, see `probe_image_header`
+    :raises RuntimeError: if the file is not readable by SimpleITK
+    """
+    reader = sitk.ImageFileReader()
+    if path.endswith(exts):
+        reader.SetFileName(path)
+        reader.ReadImageInformation()
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            link = os.path.join(tmp_dir, f'image{exts}')
+            os.symlink(os.path.abspath(path), link)
+            reader.SetFileName(link)
+            reader.ReadImageInformation()
+
+    return {
+        'format': exts.lstrip('.').lower(),
+        'size': reader.GetSize(),
+        'spacing': reader.GetSpacing(),
+        'origin': reader.GetOrigin(),
+        'direction': reader.GetDirection(),
+        'dtype': _SITK_DTYPES.get(
+            reader.GetPixelID(), sitk.GetPixelIDValueAsString(reader.GetPixelID())),
+        'components': reader.GetNumberOfComponents(),
+    }
+
+
+def sniff_image_format(head) -> str:
+    """
+    Recognize an image format from the signature at the start of a file.
+
+    :param head: first bytes of the file, gzip compressed or not
+    :return: 'nifti', 'nrrd', 'metaimage', 'dicom' or 'gzip' when compressed
+        content could not be inspected, or None for unknown signatures
+    """
+    head = bytes(head)
+    if head[:2] == b'\x1f\x8b':
+        head = _gunzip_head(head)
+        if head is None:
+            return 'gzip'
+    if head[344:347] in (b'n+1', b'ni1') or head[4:8] in (b'n+2\x00', b'ni2\x00'):
+        return 'nifti'
+    if head[:4] == b'NRRD':
+        return 'nrrd'
+    if head[:10] == b'ObjectType' or head[:5] == b'NDims':
+        return 'metaimage'
+    if head[128:132] == b'DICM':
+        return 'dicom'
+    return None
+
+
+def probe_image_header(head, exts: str):
+    """
+    Get the information of a NIfTI-1 or NRRD image from the start of its
+    file, without SimpleITK.
+
+    :param head: first bytes of the file, at least `PROBE_BYTES` of them
+        unless the file is shorter
+    :param exts: extension of the original file name, e.g. '.nii.gz'
+    :return: dictionary with the 'format', 'size', 'spacing', 'origin',
+        'direction', 'dtype' and 'components' of the image, or None if the
+        header is not supported and should be read by SimpleITK instead
+    """
+    head = bytes(head)
+    if exts.lower().endswith('.gz') and head[:2] == b'\x1f\x8b':
+        head = _gunzip_head(head)
+        if head is None:
+            return None
+
+    try:
+        header = read_nifti_header(head)
+        if header is not None:
+            dtype = header['dtype']
+            if header['scl_slope'] not in (0.0, 1.0) or header['scl_inter'] != 0.0:
+                dtype = np.float32
+            return _header_information('nifti', header, dtype)
+
+        header = read_nrrd_header(head)
+        if header is not None:
+            return _header_information('nrrd', header, header['dtype'])
+    except (ValueError, struct.error):
+        return None
+    return None
+
+
+def can_read_from_buffer(exts: str) -> bool:
+    """
+    Check whether images with a given extension can be decoded from memory.
+
+    :param exts: extension of the file name, e.g. '.nii.gz'
+    :return: whether `read_image_from_buffer` supports the extension
+    """
+    return exts.lower() in ('.nii', '.nii.gz', '.nrrd')
+
+
+def read_image_from_buffer(buffer, exts: str):
+    """
+    Decode a NIfTI-1 or NRRD image held in memory.
+
+    :param buffer: file content, as bytes or any object supporting the
+        buffer protocol such as a memory map
+    :param exts: extension of the original file name, e.g. '.nii.gz'
+    :return: SimpleITK image, or None if the image uses features this
+        decoder does not support and should be read by SimpleITK instead
+    """
+    exts = exts.lower()
+    try:
+        if exts == '.nii.gz':
+            return read_nifti(gzip.decompress(buffer))
+        if exts == '.nii':
+            return read_nifti(buffer)
+        if exts == '.nrrd':
+            return read_nrrd(buffer)
+    except (OSError, EOFError, ValueError, struct.error):
+        # Corrupt or truncated content, let SimpleITK report it
+        return None
+    return None
+
+
+def read_nifti(buffer):
+    """
+    Decode an uncompressed single-file NIfTI-1 image.
+
+    The orientation comes from the sform or the qform, whichever is set, and
+    from pixdim alone when neither is. Images whose sform and qform are both
+    set but disagree are left to SimpleITK, whose choice between them
+    depends on its version and settings.
+
+    :param buffer: file content
+    :return: SimpleITK image, or None if the image is not supported
+    """
+    header = read_nifti_header(buffer)
+    if header is None:
+        return None
+
+    dtype = np.dtype(header['dtype']).newbyteorder(header['endian'])
+    size = header['size']
+    array = np.frombuffer(
+        buffer, dtype=dtype, count=int(np.prod(size)), offset=header['vox_offset']
+    ).reshape(size[::-1])
+
+    slope, inter = header['scl_slope'], header['scl_inter']
+    if slope not in (0.0, 1.0) or inter != 0.0:
+        # Like SimpleITK, expose rescaled voxels as floating point values
+        array = (array.astype(np.float32) * np.float32(slope) + np.float32(inter))
+    else:
+        array = array.astype(dtype.newbyteorder('='), copy=False)
+
+    image = sitk.GetImageFromArray(array)
+    return _set_geometry(image, header)
+
+
+def read_nifti_header(buffer):
+    """
+    Decode the header of a single-file NIfTI-1 image.
+
+    :param buffer: file content, or at least its first 352 bytes
+    :return: dictionary with the size, spacing, origin, direction, dtype and
+        byte layout of the image, or None if the header is not supported
+    """
+    if len(buffer) < 348:
+        return None
+
+    for endian in ('<', '>'):
+        if struct.unpack_from(f'{endian}i', buffer, 0)[0] == 348:
+            break
+    else:
+        return None
+
+    if bytes(buffer[344:348]) != b'n+1\x00':
+        # Only single-file NIfTI-1 images are supported
+        return None
+
+    dim = struct.unpack_from(f'{endian}8h', buffer, 40)
+    datatype = struct.unpack_from(f'{endian}h', buffer, 70)[0]
+    pixdim = struct.unpack_from(f'{endian}8f', buffer, 76)
+    vox_offset = int(struct.unpack_from(f'{endian}f', buffer, 108)[0])
+    scl_slope, scl_inter = struct.unpack_from(f'{endian}2f', buffer, 112)
+    qform_code, sform_code = struct.unpack_from(f'{endian}2h', buffer, 252)
+    quatern = struct.unpack_from(f'{endian}6f', buffer, 256)
+    srow = np.array(struct.unpack_from(f'{endian}12f', buffer, 280)).reshape(3, 4)
+
+    ndim = dim[0]
+    if ndim not in (2, 3) or datatype not in _NIFTI_DTYPES:
+        return None
+
+    size = tuple(int(d) for d in dim[1:ndim + 1])
+    spacing = np.array([abs(p) if p else 1.0 for p in pixdim[1:4]])
+
+    geometries = []
+    if sform_code > 0:
+        sform_spacing = np.linalg.norm(srow[:, :3], axis=0)
+        sform_spacing[sform_spacing == 0] = 1.0
+        geometries.append((sform_spacing, srow[:, :3] / sform_spacing, srow[:, 3]))
+    if qform_code > 0:
+        b, c, d = quatern[:3]
+        a = np.sqrt(max(0.0, 1.0 - (b * b + c * c + d * d)))
+        rotation = np.array([
+            [a * a + b * b - c * c - d * d, 2 * (b * c - a * d), 2 * (b * d + a * c)],
+            [2 * (b * c + a * d), a * a + c * c - b * b - d * d, 2 * (c * d - a * b)],
+            [2 * (b * d - a * c), 2 * (c * d + a * b), a * a + d * d - c * c - b * b],
+        ])
+        qfac = -1.0 if pixdim[0] < 0 else 1.0
+        rotation[:, 2] *= qfac
+        geometries.append((spacing, rotation, np.array(quatern[3:6])))
+
+    if len(geometries) == 2:
+        (s_spacing, s_rotation, s_origin), (q_spacing, q_rotation, q_origin) = geometries
+        if not (np.allclose(s_spacing[:ndim], q_spacing[:ndim], atol=1e-4)
+                and np.allclose(s_rotation[:ndim, :ndim], q_rotation[:ndim, :ndim], atol=1e-4)
+                and np.allclose(s_origin[:ndim], q_origin[:ndim], atol=1e-4)):
+            return None
+    if geometries:
+        spacing, rotation, origin = geometries[0]
+    else:
+        rotation = np.eye(3)
+        origin = np.zeros(3)
+
+    direction = _RAS_TO_LPS @ rotation
+    origin = _RAS_TO_LPS @ origin
+
+    return {
+        'size': size,
+        'spacing': tuple(spacing[:ndim]),
+        'origin': tuple(origin[:ndim]),
+        'direction': tuple(direction[:ndim, :ndim].ravel()),
+        'dtype': _NIFTI_DTYPES[datatype],
+        'endian': endian,
+        'vox_offset': vox_offset,
+        'scl_slope': scl_slope,
+        'scl_inter': scl_inter,
+    }
+
+
+def read_nrrd(buffer):
+    """
+    Decode a single-file NRRD image with raw or gzip encoding.
+
+    :param buffer: file content
+    :return: SimpleITK image, or None if the image is not supported
+    """
+    header = read_nrrd_header(buffer)
+    if header is None:
+        return None
+
+    data = memoryview(buffer)[header['data_offset']:]
+    if header['encoding'] in ('gzip', 'gz'):
+        data = gzip.decompress(data)
+
+    dtype = np.dtype(header['dtype']).newbyteorder(header['endian'])
+    size = header['size']
+    array = np.frombuffer(data, dtype=dtype, count=int(np.prod(size))).reshape(size[::-1])
+
+    image = sitk.GetImageFromArray(array.astype(dtype.newbyteorder('='), copy=False))
+    return _set_geometry(image, header)
+
+
+def read_nrrd_header(buffer):
+    """
+    Decode the header of a single-file NRRD image.
+
+    :param buffer: file content, or at least its complete header
+    :return: dictionary with the size, spacing, origin, direction, dtype and
+        byte layout of the image, or None if the header is not supported
+    """
+    if bytes(buffer[:4]) != b'NRRD':
+        return None
+
+    end = bytes(buffer[:65536]).find(b'\n\n')
+    if end < 0:
+        return None
+
+    fields = {}
+    for line in bytes(buffer[:end]).decode('latin-1').splitlines()[1:]:
+        if line.startswith('#') or ':' not in line:
+            continue
+        key, _, value = line.partition(':')
+        fields[key.strip().lower()] = value.lstrip('=').strip()
+
+    dtype = _NRRD_DTYPES.get(fields.get('type', '').lower())
+    encoding = fields.get('encoding', '').lower()
+    ndim = int(fields.get('dimension', 0))
+    if (
+        dtype is None or encoding not in ('raw', 'gzip', 'gz') or ndim not in (2, 3)
+        or 'data file' in fields or 'datafile' in fields
+        or int(fields.get('byte skip', fields.get('byteskip', 0))) != 0
+        or int(fields.get('line skip', fields.get('lineskip', 0))) != 0
+    ):
+        return None
+
+    size = tuple(int(s) for s in fields['sizes'].split())
+
+    if 'space directions' in fields:
+        vectors = re.findall(r'\(([^)]*)\)', fields['space directions'])
+        if len(vectors) != ndim:
+            return None
+        axes = np.array([[float(v) for v in vector.split(',')] for vector in vectors]).T
+        spacing = np.linalg.norm(axes, axis=0)
+        spacing[spacing == 0] = 1.0
+        direction = axes / spacing
+    else:
+        spacing = np.array([
+            float(s) if s.lower() != 'nan' else 1.0
+            for s in fields.get('spacings', ' '.join(['1'] * ndim)).split()
+        ])
+        direction = np.eye(ndim)
+
+    origin = np.zeros(ndim)
+    if 'space origin' in fields:
+        origin = np.array([float(v) for v in fields['space origin'].strip('()').split(',')])
+
+    if fields.get('space', '').lower() in _NRRD_RAS_SPACES and ndim == 3:
+        direction = _RAS_TO_LPS @ direction
+        origin = _RAS_TO_LPS @ origin
+
+    return {
+        'size': size,
+        'spacing': tuple(spacing),
+        'origin': tuple(origin),
+        'direction': tuple(direction.ravel()),
+        'dtype': dtype,
+        'endian': '>' if fields.get('endian', 'little').lower() == 'big' else '<',
+        'encoding': encoding,
+        'data_offset': end + 2,
+    }
+
+
+def _header_information(format: str, header: dict, dtype) -> dict:
+    return {
+        'format': format,
+        'size': tuple(int(s) for s in header['size']),
+        'spacing': tuple(float(s) for s in header['spacing']),
+        'origin': tuple(float(o) for o in header['origin']),
+        'direction': tuple(float(d) for d in header['direction']),
+        'dtype': np.dtype(dtype).name,
+        'components': 1,
+    }
+
+
+def _gunzip_head(head: bytes):
+    """
+    Decompress the start of a gzip stream, up to `PROBE_BYTES`.
+    """
+    try:
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(head, PROBE_BYTES)
+    except zlib.error:
+        return None
+
+
+def _set_geometry(image: sitk.Image, header: dict):
+    image.SetSpacing([float(s) for s in header['spacing']])
+    image.SetOrigin([float(o) for o in header['origin']])
+    try:
+        image.SetDirection([float(d) for d in header['direction']])
+    except RuntimeError:
+        # Sheared orientations are left to SimpleITK to approximate
+        return None
+    return image
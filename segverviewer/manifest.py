@@ -0,0 +1,287 @@
+import json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+_START_EVENTS = ('start_map', 'start_array')
+
+# Parts of the index each view keeps, see `_select`: a dictionary keeps the
+# listed keys of a JSON object, None standing for any other key, a list keeps
+# every element of a JSON array, and True keeps a value whole
+_OUTLINE = {'volumes': {None: {'versions': [{'id': True}]}}, None: True}
+
+
+def load_index(fp) -> dict:
+    """
+    Parse a whole segVerHandler index.
+
+    :param fp: binary file object of the index
+    :return: index
+    :raises ValueError: if the index is not a JSON object
+    """
+    return _load(fp, True)
+
+
+def load_index_outline(fp) -> dict:
+    """
+    Parse the outline of a segVerHandler index: its top-level settings and,
+    for each volume, the IDs of its versions. Enough to count, list and find
+    the files of volumes and versions.
+
+    With ijson installed, only the outline is built while the file is read,
+    so the other fields of the volumes and versions never take memory.
+
+    :param fp: binary file object of the index
+    :return: index holding only its outline
+    :raises ValueError: if the index is not a JSON object
+    """
+    return _load(fp, _OUTLINE)
+
+
+def load_index_versions(fp, volume: str = None) -> dict:
+    """
+    Parse the top-level settings of a segVerHandler index and the versions of
+    its volumes, with all their fields. Other fields of the volumes are left
+    out, see `load_index_outline`.
+
+    :param fp: binary file object of the index
+    :param volume: if given, only the versions of this volume are parsed
+    :return: index holding only its settings and versions
+    :raises ValueError: if the index is not a JSON object
+    """
+    return _load(fp, {'volumes': {volume: {'versions': True}}, None: True})
+
+
+def summarize_index(index: dict) -> dict:
+    """
+    Summarize a segVerHandler index without listing its volumes.
+
+    :param index: segVerHandler index
+    :return: the top-level settings of the index, with the number of volumes
+        and versions it lists
+    """
+    summary = {key: value for key, value in index.items() if key != 'volumes'}
+    volumes = index.get('volumes', {})
+    summary['volumeCount'] = len(volumes)
+    summary['versionCount'] = sum(
+        len(volume_data.get('versions', [])) for volume_data in volumes.values())
+    return summary
+
+
+def list_volumes(index: dict, text: str = None, offset: int = 0, limit: int = 50) -> dict:
+    """
+    List a page of the volumes of a segVerHandler index.
+
+    :param index: segVerHandler index
+    :param text: if given, only volumes whose ID contains this text are listed
+    :param offset: number of matching volumes to skip
+    :param limit: maximum number of volumes to list, 0 for no limit
+    :return: dictionary with the 'total' number of matching volumes and the
+        'volumes' of the page, with their ID and number of versions
+    """
+    volume_ids = [
+        volume for volume in index.get('volumes', {})
+        if not text or text.lower() in volume.lower()
+    ]
+    return {
+        'total': len(volume_ids),
+        'volumes': [
+            {'id': volume, 'versionCount': len(index['volumes'][volume].get('versions', []))}
+            for volume in page(volume_ids, offset, limit)
+        ],
+    }
+
+
+def volume_file_names(index: dict) -> dict:
+    """
+    Get the expected file name of every volume listed in a segVerHandler index.
+
+    :param index: segVerHandler index
+    :return: dictionary mapping file names to volume IDs, in index order
+    """
+    extension = index.get('volume-extension', '')
+    return {f'{volume}{extension}': volume for volume in index['volumes']}
+
+
+def version_file_names(index: dict, volume: str = None) -> dict:
+    """
+    Get the expected file name of every segmentation version listed in a
+    segVerHandler index.
+
+    :param index: segVerHandler index
+    :param volume: if given, only the versions of this volume are listed
+    :return: dictionary mapping file names to (volume ID, version ID) tuples,
+        in index order
+    """
+    extension = index.get('label-extension', '')
+    volumes = index['volumes'].items()
+    if volume is not None:
+        volumes = [(volume, index['volumes'][volume])]
+    return {
+        f'{version["id"]}{extension}': (volume_id, version['id'])
+        for volume_id, volume_data in volumes
+        for version in volume_data['versions']
+    }
+
+
+def list_versions(index: dict, volume: str = None) -> list:
+    """
+    List the segmentation versions of a segVerHandler index.
+
+    :param index: segVerHandler index
+    :param volume: if given, only the versions of this volume are listed
+    :return: list of the versions in index order, each with its 'volume' ID
+        and the expected file 'name'
+    """
+    extension = index.get('label-extension', '')
+    volumes = index['volumes'].items()
+    if volume is not None:
+        volumes = [(volume, index['volumes'][volume])]
+    return [
+        dict(version, volume=volume_id, name=f'{version["id"]}{extension}')
+        for volume_id, volume_data in volumes
+        for version in volume_data['versions']
+    ]
+
+
+def page(values: list, offset: int, limit: int) -> list:
+    """
+    Get a page of a list, following Girder's paging parameters.
+
+    :param values: full list
+    :param offset: number of values to skip
+    :param limit: maximum number of values, 0 for no limit
+    :return: values of the page
+    """
+    return values[offset:offset + limit] if limit else values[offset:]
+
+
+def match_files(names, files) -> list:
+    """
+    Match files against expected names in a single pass over each.
+
+    :param names: expected file names, in the order of the result
+    :param files: iterable of file documents
+    :return: the file document of every expected name that was found
+    """
+    files_by_name = {file['name']: file for file in files}
+    return [files_by_name[name] for name in names if name in files_by_name]
+
+
+def _load(fp, spec) -> dict:
+    """
+    Parse the parts of a segVerHandler index picked by a view, see `_select`.
+    The file is parsed incrementally with ijson when it is installed.
+    """
+    if ijson is None:
+        index = _select_value(json.load(fp), spec)
+    else:
+        events = ((event, value) for _, event, value in ijson.parse(fp, use_float=True))
+        event, value = next(events)
+        index = _select(events, event, value, spec)
+    if not isinstance(index, dict):
+        raise ValueError('segVerHandler index must be a JSON object')
+    return index
+
+
+def _select(events, event, value, spec):
+    """
+    Build the parts of the JSON value starting with an event that a view
+    keeps, consuming its remaining events. Other parts are skipped without
+    being built.
+    """
+    if spec is True or event not in _START_EVENTS:
+        return _build(events, event, value)
+    if event == 'start_map' and isinstance(spec, dict):
+        result = {}
+        for key, event, value in _members(events):
+            member_spec = spec.get(key, spec.get(None))
+            if member_spec is None:
+                _skip(events, event)
+            else:
+                result[key] = _select(events, event, value, member_spec)
+        return result
+    if event == 'start_array' and isinstance(spec, list):
+        return [_select(events, event, value, spec[0]) for event, value in _elements(events)]
+    _skip(events, event)
+    return None
+
+
+def _select_value(value, spec):
+    """
+    Keep the parts of a parsed JSON value that a view keeps, see `_select`.
+    """
+    if spec is True:
+        return value
+    if isinstance(value, dict) and isinstance(spec, dict):
+        return {
+            key: _select_value(member, spec.get(key, spec.get(None)))
+            for key, member in value.items() if spec.get(key, spec.get(None)) is not None
+        }
+    if isinstance(value, list) and isinstance(spec, list):
+        return [_select_value(element, spec[0]) for element in value]
+    return None if isinstance(value, (dict, list)) else value
+
+
+def _members(events):
+    """
+    Iterate over the members of a JSON object whose start was consumed,
+    yielding the key and first event of each value. Each value must be
+    consumed before the next one is read.
+    """
+    for event, key in events:
+        if event == 'end_map':
+            return
+        event, value = next(events)
+        yield key, event, value
+
+
+def _elements(events):
+    """
+    Iterate over the elements of a JSON array whose start was consumed,
+    yielding the first event of each. Each element must be consumed before
+    the next one is read.
+    """
+    for event, value in events:
+        if event == 'end_array':
+            return
+        yield event, value
+
+
+def _build(events, event, value):
+    """
+    Build the JSON value starting with an event, consuming its remaining events.
+    """
+    if event not in _START_EVENTS:
+        return value
+    builder = ijson.ObjectBuilder()
+    builder.event(event, value)
+    depth = 1
+    for event, value in events:
+        builder.event(event, value)
+        if event in _START_EVENTS:
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+            if not depth:
+                break
+    return builder.value
+
+
+def _skip(events, event) -> None:
+    """
+    Consume the remaining events of the JSON value starting with an event.
+    """
+    if event not in _START_EVENTS:
+        return
+    depth = 1
+    for event, _ in events:
+        if event in _START_EVENTS:
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+            if not depth:
+                return
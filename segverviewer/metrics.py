@@ -0,0 +1,162 @@
+import numpy as np
+import SimpleITK as sitk
+
+from .derivatives import label_indices
+
+
+def overlap_counts(seg1: np.ndarray, seg2: np.ndarray, labels) -> tuple:
+    """
+    Count the voxels of each label in two label maps and in their intersection.
+
+    :param seg1: first label map
+    :param seg2: second label map, with the same shape
+    :param labels: sorted label values found in either label map
+    :return: tuple (counts1, counts2, intersection) of arrays indexed like labels
+    """
+    n_labels = len(labels)
+    indices1 = label_indices(seg1, labels).ravel()
+    indices2 = label_indices(seg2, labels).ravel()
+    counts1 = np.bincount(indices1, minlength=n_labels)
+    counts2 = np.bincount(indices2, minlength=n_labels)
+    intersection = np.bincount(indices1[indices1 == indices2], minlength=n_labels)
+    return counts1, counts2, intersection
+
+
+def surface_distances(mask1: np.ndarray, mask2: np.ndarray, spacing) -> dict:
+    """
+    Compute the Hausdorff distance, its 95th percentile and the average
+    symmetric surface distance between two binary masks, in physical units.
+
+    Only surface voxels are measured, using distance transforms of each
+    surface, so callers should crop the masks to the region they occupy.
+
+    :param mask1: first binary mask in (z, y, x) order
+    :param mask2: second binary mask, with the same shape
+    :param spacing: voxel spacing in (x, y, z) order
+    :return: dictionary with 'hausdorff', 'hd95' and 'assd', which are None
+        when either mask is empty
+    """
+    surface1 = _surface(mask1)
+    surface2 = _surface(mask2)
+    if not surface1.any() or not surface2.any():
+        return {'hausdorff': None, 'hd95': None, 'assd': None}
+
+    distances1 = _distance_map(surface2, spacing)[surface1]
+    distances2 = _distance_map(surface1, spacing)[surface2]
+
+    return {
+        'hausdorff': float(max(distances1.max(), distances2.max())),
+        'hd95': float(max(np.percentile(distances1, 95), np.percentile(distances2, 95))),
+        'assd': float(
+            (distances1.sum() + distances2.sum()) / (distances1.size + distances2.size)),
+    }
+
+
+def compute_metrics(seg1: np.ndarray, seg2: np.ndarray, spacing,
+                    derivatives1: dict, derivatives2: dict) -> dict:
+    """
+    Compare two versions of a segmentation, label by label and over their
+    whole foreground.
+
+    Surface distances are computed within the union of the bounding boxes of
+    the compared labels, as found in the precomputed derivatives.
+
+    :param seg1: first label map in (z, y, x) order
+    :param seg2: second label map, with the same shape
+    :param spacing: voxel spacing in (x, y, z) order
+    :param derivatives1: derivatives of the first label map
+    :param derivatives2: derivatives of the second label map
+    :return: dictionary with a 'labels' list holding the Dice, Jaccard,
+        Hausdorff, HD95 and ASSD of each non-background label, and an
+        'overall' entry with the same metrics for the whole foreground
+    """
+    boxes1 = dict(zip(derivatives1['labels'], derivatives1['bounding_boxes']))
+    boxes2 = dict(zip(derivatives2['labels'], derivatives2['bounding_boxes']))
+    labels = np.union1d(np.union1d(list(boxes1), list(boxes2)), [0]).astype(seg1.dtype)
+    counts1, counts2, intersection = overlap_counts(seg1, seg2, labels)
+
+    per_label = []
+    for i, label in enumerate(labels):
+        if label == 0:
+            continue
+        label = label.item()
+        metrics = _overlap(counts1[i], counts2[i], intersection[i])
+        box = _union_box([boxes1.get(label), boxes2.get(label)], seg1.shape)
+        if label in boxes1 and label in boxes2:
+            crop = tuple(slice(low, high + 1) for low, high in box)
+            metrics.update(surface_distances(seg1[crop] == label, seg2[crop] == label, spacing))
+        else:
+            metrics.update({'hausdorff': None, 'hd95': None, 'assd': None})
+        per_label.append(dict(label=label, **metrics))
+
+    foreground = labels != 0
+    overall = _overlap(
+        counts1[foreground].sum(), counts2[foreground].sum(), intersection[foreground].sum())
+    if len(per_label) == 1:
+        # The foreground is the only label, its distances were just computed
+        overall.update({key: per_label[0][key] for key in ('hausdorff', 'hd95', 'assd')})
+    elif boxes1 and boxes2:
+        box = _union_box(list(boxes1.values()) + list(boxes2.values()), seg1.shape)
+        crop = tuple(slice(low, high + 1) for low, high in box)
+        overall.update(surface_distances(seg1[crop] != 0, seg2[crop] != 0, spacing))
+    else:
+        overall.update({'hausdorff': None, 'hd95': None, 'assd': None})
+
+    return {
+        'labels': per_label,
+        'overall': overall,
+    }
+
+
+def _overlap(count1, count2, intersection) -> dict:
+    total = int(count1) + int(count2)
+    if not total:
+        return {'dice': None, 'jaccard': None}
+    return {
+        'dice': float(2 * intersection / total),
+        'jaccard': float(intersection / (total - intersection)),
+    }
+
+
+def _union_box(boxes, shape) -> list:
+    """
+    Get the union of bounding boxes, grown by one voxel so that surfaces
+    touching the box are still detected.
+    """
+    boxes = np.array([box for box in boxes if box is not None])
+    return [
+        [max(int(boxes[:, axis, 0].min()) - 1, 0), min(int(boxes[:, axis, 1].max()) + 1, size - 1)]
+        for axis, size in enumerate(shape)
+    ]
+
+
+def _surface(mask: np.ndarray) -> np.ndarray:
+    """
+    Get the voxels of a mask with at least one face neighbour outside of it.
+    Voxels on the border of the array count as surface voxels.
+    """
+    interior = mask.copy()
+    for axis in range(mask.ndim):
+        before = [slice(None)] * mask.ndim
+        after = [slice(None)] * mask.ndim
+        before[axis] = slice(None, -1)
+        after[axis] = slice(1, None)
+        interior[tuple(after)] &= mask[tuple(before)]
+        interior[tuple(before)] &= mask[tuple(after)]
+
+        border = [slice(None)] * mask.ndim
+        for index in (0, -1):
+            border[axis] = index
+            interior[tuple(border)] = False
+    return mask & ~interior
+
+
+def _distance_map(surface: np.ndarray, spacing) -> np.ndarray:
+    """
+    Get the physical distance from every voxel to the nearest surface voxel.
+    """
+    image = sitk.GetImageFromArray(surface.astype(np.uint8))
+    image.SetSpacing([float(s) for s in spacing])
+    distances = sitk.SignedMaurerDistanceMap(
+        image, insideIsPositive=False, squaredDistance=False, useImageSpacing=True)
+    return np.abs(sitk.GetArrayViewFromImage(distances))
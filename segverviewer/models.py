@@ -0,0 +1,140 @@
+import datetime
+
+from girder.models.model_base import Model
+from pymongo import UpdateOne
+
+from .search import search_query, search_record
+
+# Job statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCESS = 'success'
+ERROR = 'error'
+
+
+class Job(Model):
+    """
+    Persistent record of a background computation of the plugin: its
+    status, progress, and result or error once it is done.
+    """
+
+    def initialize(self):
+        self.name = 'segverviewer_job'
+        self.ensureIndices([
+            'status',
+            ([('type', 1), ('collectionId', 1), ('volume', 1), ('created', -1)], {}),
+            ([('type', 1), ('fileId', 1), ('created', -1)], {}),
+        ])
+
+    def validate(self, doc):
+        return doc
+
+    def create_job(self, type, user=None, **fields) -> dict:
+        """
+        Create a queued job.
+
+        :param type: kind of job, e.g. 'version_matrix'
+        :param user: user requesting the job
+        :param fields: additional fields describing the job
+        :return: the job document
+        """
+        now = datetime.datetime.utcnow()
+        job = dict(
+            fields,
+            type=type,
+            userId=user['_id'] if user else None,
+            status=QUEUED,
+            progress={'current': 0, 'total': None},
+            result=None,
+            error=None,
+            created=now,
+            updated=now,
+        )
+        return self.save(job)
+
+    def set_running(self, job) -> None:
+        self._set(job, status=RUNNING)
+
+    def set_progress(self, job, current: int, total: int) -> None:
+        self._set(job, progress={'current': current, 'total': total})
+
+    def set_success(self, job, result) -> None:
+        self._set(job, status=SUCCESS, result=result)
+
+    def set_error(self, job, error: str) -> None:
+        self._set(job, status=ERROR, error=error)
+
+    def _set(self, job, **fields) -> None:
+        # Partial updates, so progress reports never overwrite other fields
+        fields['updated'] = datetime.datetime.utcnow()
+        self.update({'_id': job['_id']}, {'$set': fields}, multi=False)
+        job.update(fields)
+
+
+class SegmentationRecord(Model):
+    """
+    Searchable fields of a segmentation file listed by the segVerHandler
+    index of its collection: its volume, version, tag, label set and label
+    voxel counts, see `search_record`.
+    """
+
+    def initialize(self):
+        self.name = 'segverviewer_segmentation'
+        self.ensureIndices([
+            ([('fileId', 1)], {'unique': True}),
+            ([('collectionId', 1), ('volume', 1), ('version', 1)], {}),
+            ([('collectionId', 1), ('volume', 1), ('tag', 1), ('labels', 1)], {}),
+            ([('collectionId', 1), ('tag', 1), ('labels', 1)], {}),
+            ([('collectionId', 1), ('labels', 1)], {}),
+        ])
+
+    def validate(self, doc):
+        return doc
+
+    def set_file(self, file, collection_id, version: dict = None,
+                 derivatives: dict = None) -> None:
+        """
+        Create or replace the record of a segmentation file.
+
+        :param file: Girder file object of the segmentation
+        :param collection_id: ID of the collection of the file
+        :param version: version of the file as listed by `list_versions`
+        :param derivatives: derivatives of the segmentation
+        """
+        record = search_record(file, version, derivatives)
+        record['collectionId'] = collection_id
+        record['updated'] = datetime.datetime.utcnow()
+        self.collection.replace_one({'fileId': file['_id']}, record, upsert=True)
+
+    def set_tags(self, tags: dict) -> None:
+        """
+        Update the tag of the records of several files in one bulk write.
+        Files without a record are skipped.
+
+        :param tags: dictionary mapping file IDs to their new tag
+        """
+        if not tags:
+            return
+        now = datetime.datetime.utcnow()
+        self.collection.bulk_write([
+            UpdateOne({'fileId': file_id}, {'$set': {'tag': tag, 'updated': now}})
+            for file_id, tag in tags.items()
+        ], ordered=False)
+
+    def search(self, collection_id, offset: int = 0, limit: int = 0, sort=None,
+               **filters) -> tuple:
+        """
+        Search the records of a collection, see `search_query`.
+
+        :param collection_id: ID of the collection
+        :param offset: number of records to skip
+        :param limit: maximum number of records, 0 for no limit
+        :param sort: list of (field, direction) tuples
+        :param filters: filters of `search_query`
+        :return: tuple (total, records) with the number of matching records
+            and the records of the page
+        """
+        query = search_query(collection_id, **filters)
+        total = self.collection.count_documents(query)
+        records = self.find(query, offset=offset, limit=limit, sort=sort)
+        return total, list(records)
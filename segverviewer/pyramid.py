@@ -0,0 +1,106 @@
+import numpy as np
+
+# Levels are added until the largest side of the volume is at most this size
+MIN_LEVEL_SIZE = 32
+
+
+def downsample(array: np.ndarray, labels: bool = False) -> np.ndarray:
+    """
+    Halve a volume along every axis. Odd sizes are padded by repeating the
+    last voxel.
+
+    :param array: volume array
+    :param labels: whether the volume is a label map, whose 2x2x2 blocks are
+        reduced to their most frequent label instead of their mean
+    :return: downsampled array, of the same dtype
+    """
+    pad = [(0, size % 2) for size in array.shape]
+    if any(after for _, after in pad):
+        array = np.pad(array, pad, mode='edge')
+
+    block_shape = []
+    for size in array.shape:
+        block_shape += [size // 2, 2]
+    blocks = array.reshape(block_shape)
+    block_axes = tuple(range(1, 2 * array.ndim, 2))
+
+    if labels:
+        # Move the voxels of each block to the last axis
+        order = tuple(range(0, 2 * array.ndim, 2)) + block_axes
+        return _mode(blocks.transpose(order).reshape(block_shape[::2] + [-1]))
+
+    mean = blocks.mean(axis=block_axes)
+    if np.issubdtype(array.dtype, np.integer):
+        mean = np.rint(mean)
+    return mean.astype(array.dtype)
+
+
+def build_pyramid(array: np.ndarray, labels: bool = False,
+                  min_size: int = MIN_LEVEL_SIZE) -> list:
+    """
+    Build the downsampled levels of a volume, each half the size of the
+    previous one, see `downsample`.
+
+    :param array: volume array
+    :param labels: whether the volume is a label map
+    :param min_size: size of the largest side below which no level is added
+    :return: list of arrays, from level 1 on
+    """
+    levels = []
+    while max(array.shape) > min_size:
+        array = downsample(array, labels)
+        levels.append(array)
+    return levels
+
+
+def pyramid_level(shape, axis: int, max_size: int, levels: int) -> int:
+    """
+    Choose the finest level whose slices fit in a given size.
+
+    :param shape: shape of the full resolution volume
+    :param axis: NumPy axis the volume is sliced along
+    :param max_size: maximum number of rows and columns of the slices
+    :param levels: number of downsampled levels available
+    :return: level, 0 being the full resolution
+    """
+    size = max(size for dim, size in enumerate(shape) if dim != axis)
+    level = 0
+    while size > max_size and level < levels:
+        size = -(-size // 2)
+        level += 1
+    return level
+
+
+def level_geometry(spacing, origin, direction, level: int) -> tuple:
+    """
+    Get the spatial metadata of a pyramid level. Voxels are 2^level times
+    larger and centered on the blocks of voxels they were pooled from.
+
+    :param spacing: image spacing in (x, y, z) order, as returned by SimpleITK
+    :param origin: image origin in (x, y, z) order
+    :param direction: flattened image direction matrix
+    :param level: pyramid level
+    :return: tuple (spacing, origin) of the level
+    """
+    factor = 2 ** level
+    spacing = np.asarray(spacing, dtype=float)
+    matrix = np.asarray(direction, dtype=float).reshape(len(spacing), len(spacing))
+    shift = matrix @ (spacing * (factor - 1) / 2)
+    return tuple((spacing * factor).tolist()), tuple((np.asarray(origin) + shift).tolist())
+
+
+def _mode(values: np.ndarray) -> np.ndarray:
+    values = np.sort(values, axis=-1)
+    result = values[..., -1].copy()
+
+    # Most blocks hold a single label, only count the others
+    mixed = values[..., 0] != values[..., -1]
+    candidates = values[mixed]
+    counts = np.stack([
+        (candidates == candidates[:, [i]]).sum(axis=-1)
+        for i in range(candidates.shape[-1])
+    ], axis=-1)
+    # Candidates are sorted, so ties go to the largest label rather than to background
+    best = candidates.shape[-1] - 1 - np.argmax(counts[:, ::-1], axis=-1)
+    result[mixed] = candidates[np.arange(len(candidates)), best]
+    return result
@@ -0,0 +1,88 @@
+import numpy as np
+
+from .derivatives import label_indices
+
+# Number of voxels processed at once, bounds the size of temporary arrays
+_CHUNK_VOXELS = 1 << 22
+
+
+def quantify_labels(seg_array: np.ndarray, image_array: np.ndarray, labels, spacing) -> dict:
+    """
+    Compute the statistics of the image intensities under each label of a
+    segmentation in a single vectorized pass, regardless of the number of labels.
+
+    Sums are accumulated with weighted `np.bincount` calls, minimums and
+    maximums with reductions over the voxels grouped by label.
+
+    :param seg_array: label map
+    :param image_array: image with the same shape as the label map
+    :param labels: label values present in the label map, the background label
+        0 may be omitted
+    :param spacing: voxel spacing in mm
+    :return: dictionary with a 'labels' list holding the min, max, mean, SD,
+        voxel count and volume in mm³ of each non-background label, and an
+        'overall' entry with the same statistics over the whole foreground
+    """
+    labels = np.union1d(np.asarray(labels, dtype=seg_array.dtype), [0])
+    n_labels = len(labels)
+
+    counts = np.zeros(n_labels, dtype=np.int64)
+    sums = np.zeros(n_labels)
+    squares = np.zeros(n_labels)
+    minimums = np.full(n_labels, np.inf)
+    maximums = np.full(n_labels, -np.inf)
+
+    # Accumulating around a typical intensity keeps the variance accurate
+    shift = float(image_array.flat[image_array.size // 2]) if image_array.size else 0.0
+    # Small integer keys let NumPy group the voxels with a linear radix sort
+    key_dtype = np.uint16 if n_labels <= np.iinfo(np.uint16).max else np.intp
+
+    seg_flat = seg_array.reshape(-1)
+    image_flat = image_array.reshape(-1)
+    for start in range(0, seg_flat.size, _CHUNK_VOXELS):
+        indices = label_indices(seg_flat[start:start + _CHUNK_VOXELS], labels)
+        values = image_flat[start:start + _CHUNK_VOXELS]
+        shifted = values.astype(np.float64) - shift
+
+        chunk_counts = np.bincount(indices, minlength=n_labels)
+        counts += chunk_counts
+        sums += np.bincount(indices, weights=shifted, minlength=n_labels)
+        squares += np.bincount(indices, weights=shifted * shifted, minlength=n_labels)
+
+        present = chunk_counts > 0
+        grouped = values[np.argsort(indices.astype(key_dtype), kind='stable')]
+        starts = (np.cumsum(chunk_counts) - chunk_counts)[present]
+        minimums[present] = np.minimum(minimums[present], np.minimum.reduceat(grouped, starts))
+        maximums[present] = np.maximum(maximums[present], np.maximum.reduceat(grouped, starts))
+
+    voxel_volume = float(np.prod(spacing))
+    foreground = labels != 0
+
+    def statistics(count, total, square_total, minimum, maximum):
+        if not count:
+            return {'count': 0, 'volume': 0.0, 'min': None, 'max': None,
+                    'mean': None, 'sd': None}
+        mean = total / count
+        variance = max(square_total / count - mean * mean, 0.0)
+        return {
+            'count': int(count),
+            'volume': float(count * voxel_volume),
+            'min': float(minimum),
+            'max': float(maximum),
+            'mean': float(mean + shift),
+            'sd': float(np.sqrt(variance)),
+        }
+
+    per_label = [
+        dict(label=labels[i].item(), **statistics(
+            counts[i], sums[i], squares[i], minimums[i], maximums[i]))
+        for i in np.flatnonzero(foreground)
+    ]
+    overall = statistics(
+        counts[foreground].sum(), sums[foreground].sum(), squares[foreground].sum(),
+        minimums[foreground].min(initial=np.inf), maximums[foreground].max(initial=-np.inf))
+
+    return {
+        'labels': per_label,
+        'overall': overall,
+    }
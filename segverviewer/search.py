@@ -0,0 +1,61 @@
+# Fields the search results can be sorted on
+SORT_FIELDS = ('volume', 'version', 'name', 'tag', 'updated')
+
+
+def search_record(file: dict, version: dict = None, derivatives: dict = None) -> dict:
+    """
+    Build the searchable fields of a segmentation file.
+
+    :param file: Girder file object of the segmentation
+    :param version: version of the file as listed by `list_versions`, if the
+        index lists it
+    :param derivatives: derivatives of the segmentation, see
+        `compute_label_derivatives`
+    :return: record fields, the tag of the file taking precedence over the
+        tag of the version
+    """
+    version = version or {}
+    derivatives = derivatives or {'labels': [], 'counts': []}
+    return {
+        'fileId': file['_id'],
+        'name': file['name'],
+        'volume': version.get('volume'),
+        'version': version.get('id'),
+        'tag': file.get('tag') or version.get('tag'),
+        'labels': derivatives['labels'],
+        'labelCounts': [
+            {'label': label, 'count': count}
+            for label, count in zip(derivatives['labels'], derivatives['counts'])
+        ],
+    }
+
+
+def search_query(collection_id, volume: str = None, version: str = None, tag: str = None,
+                 labels=None, min_count: int = None) -> dict:
+    """
+    Build the Mongo query of a search over the segmentation records of a
+    collection. Every given filter must match.
+
+    :param collection_id: ID of the collection
+    :param volume: volume ID
+    :param version: version ID
+    :param tag: tag of the segmentation
+    :param labels: labels that must all be present
+    :param min_count: minimum number of voxels of each of the labels
+    :return: query document
+    :raises ValueError: if a minimum count is given without labels
+    """
+    query = {'collectionId': collection_id}
+    for field, value in (('volume', volume), ('version', version), ('tag', tag)):
+        if value is not None:
+            query[field] = value
+    if labels:
+        query['labels'] = {'$all': list(labels)}
+        if min_count is not None:
+            query['$and'] = [
+                {'labelCounts': {'$elemMatch': {'label': label, 'count': {'$gte': min_count}}}}
+                for label in labels
+            ]
+    elif min_count is not None:
+        raise ValueError('a minimum voxel count needs labels')
+    return query
@@ -0,0 +1,128 @@
+import itertools
+
+import numpy as np
+
+
+def slice_count(array: np.ndarray, axis: int) -> int:
+    """
+    Get the number of slices of a volume along a NumPy axis.
+
+    :param array: volume array in (z, y, x) order, as returned by SimpleITK
+    :param axis: NumPy axis the volume is sliced along
+    :return: number of slices
+    """
+    return int(array.shape[axis])
+
+
+def extract_slice(array: np.ndarray, spacing: tuple, axis: int, index: int) -> tuple:
+    """
+    Extract a 2D slice of a volume along a NumPy axis without copying it.
+
+    :param array: volume array in (z, y, x) order, as returned by SimpleITK
+    :param spacing: image spacing in (x, y, z) order, as returned by SimpleITK
+    :param axis: NumPy axis the volume is sliced along
+    :param index: index of the slice along that axis
+    :return: tuple (slice_array, shape, spacing) where shape and spacing are given
+        as (columns, rows, 1) and (column spacing, row spacing, slice spacing)
+    """
+    slice_array = array[(slice(None),) * axis + (index,)]
+
+    # SimpleITK dimensions of the slice columns, rows and normal
+    column_dim, row_dim = {0: (0, 1), 1: (0, 2), 2: (1, 2)}[axis]
+    normal_dim = 2 - axis
+
+    shape = (int(slice_array.shape[1]), int(slice_array.shape[0]), 1)
+    slice_spacing = (spacing[column_dim], spacing[row_dim], spacing[normal_dim])
+    return slice_array, shape, slice_spacing
+
+
+# Patient axis normal to each plane, in the LPS physical space of SimpleITK
+PLANES = {'sagittal': 0, 'coronal': 1, 'axial': 2}
+
+# Patient axis and sign of the columns then rows of each plane, as shown in the
+# radiological convention: patient left on the right, anterior and superior on top
+_DISPLAY_AXES = {
+    'axial': ((0, 1), (1, 1)),
+    'coronal': ((0, 1), (2, -1)),
+    'sagittal': ((1, 1), (2, -1)),
+}
+
+
+def plane_orientation(direction, plane: str) -> dict:
+    """
+    Find how to cut a plane through a volume, from the direction matrix of
+    the image. Each image axis is matched to the patient axis it is closest to.
+
+    :param direction: flattened image direction matrix, as returned by SimpleITK
+    :param plane: 'axial', 'coronal' or 'sagittal'
+    :return: dictionary with the NumPy 'axis' normal to the plane, whether
+        the slice must be transposed ('transpose') and flipped along its rows
+        and columns ('flip') to be shown in the radiological convention, and
+        the SimpleITK dimensions of its columns, rows and normal ('dims')
+    """
+    matrix = np.asarray(direction, dtype=float).reshape(3, 3)
+    # Patient axis of each image dimension, the permutation closest to the direction
+    patient_axes = max(
+        itertools.permutations(range(3)),
+        key=lambda axes: sum(abs(matrix[axis, dim]) for dim, axis in enumerate(axes))
+    )
+    dims = {axis: dim for dim, axis in enumerate(patient_axes)}
+    signs = [np.sign(matrix[axis, dim]) for dim, axis in enumerate(patient_axes)]
+
+    (column_axis, column_sign), (row_axis, row_sign) = _DISPLAY_AXES[plane]
+    column_dim, row_dim, normal_dim = dims[column_axis], dims[row_axis], dims[PLANES[plane]]
+    return {
+        'axis': 2 - normal_dim,
+        # The remaining NumPy axes are rows then columns, slower varying first
+        'transpose': row_dim < column_dim,
+        'flip': (bool(signs[row_dim] != row_sign), bool(signs[column_dim] != column_sign)),
+        'dims': (column_dim, row_dim, normal_dim),
+    }
+
+
+def extract_plane(array: np.ndarray, spacing: tuple, origin: tuple, direction: tuple,
+                  plane: str, index: int) -> tuple:
+    """
+    Extract a 2D slice of a volume along a patient plane, reoriented to the
+    radiological convention, without copying it.
+
+    :param array: volume array in (z, y, x) order, as returned by SimpleITK
+    :param spacing: image spacing in (x, y, z) order, as returned by SimpleITK
+    :param origin: image origin in (x, y, z) order
+    :param direction: flattened image direction matrix
+    :param plane: 'axial', 'coronal' or 'sagittal'
+    :param index: index of the slice along the NumPy axis normal to the plane
+    :return: tuple (slice_array, geometry) where geometry holds the 'shape'
+        and 'spacing' of the slice as in `extract_slice`, the 'origin' of its
+        first voxel, its 'direction' and the NumPy 'axis' it was cut along
+    """
+    orientation = plane_orientation(direction, plane)
+    axis = orientation['axis']
+    slice_array = array[(slice(None),) * axis + (index,)]
+    if orientation['transpose']:
+        slice_array = slice_array.T
+    flip_rows, flip_columns = orientation['flip']
+    slice_array = slice_array[::-1 if flip_rows else 1, ::-1 if flip_columns else 1]
+
+    # Physical position of the first voxel shown, and axes of the shown slice
+    column_dim, row_dim, normal_dim = orientation['dims']
+    size = array.shape[::-1]
+    first = np.zeros(3)
+    first[normal_dim] = index
+    first[row_dim] = size[row_dim] - 1 if flip_rows else 0
+    first[column_dim] = size[column_dim] - 1 if flip_columns else 0
+    matrix = np.asarray(direction, dtype=float).reshape(3, 3)
+    slice_origin = np.asarray(origin, dtype=float) + matrix @ (np.asarray(spacing) * first)
+    axes = np.stack([
+        matrix[:, column_dim] * (-1 if flip_columns else 1),
+        matrix[:, row_dim] * (-1 if flip_rows else 1),
+        matrix[:, normal_dim],
+    ], axis=1)
+
+    return slice_array, {
+        'shape': (int(slice_array.shape[1]), int(slice_array.shape[0]), 1),
+        'spacing': (spacing[column_dim], spacing[row_dim], spacing[normal_dim]),
+        'origin': tuple(slice_origin.tolist()),
+        'direction': tuple(axes.ravel().tolist()),
+        'axis': axis,
+    }
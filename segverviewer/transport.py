@@ -0,0 +1,260 @@
+import hashlib
+import io
+import json
+import struct
+import zlib
+
+import cherrypy
+import numpy as np
+
+from girder.api.rest import setRawResponse, setResponseHeader
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMATS = ('json', 'raw', 'npy')
+
+# Size of the pieces a voxel buffer is streamed in
+CHUNK_SIZE = 1024 ** 2
+
+# Favour speed over ratio, voxel data compresses well even at low levels
+GZIP_LEVEL = 3
+ZSTD_LEVEL = 3
+
+# Changing the layout of responses must change their entity tags as well
+ETAG_SCHEME = 1
+
+# Typed arrays require their byte offset to be a multiple of the element size
+_ALIGNMENT = 8
+
+
+def to_transport_array(array: np.ndarray) -> np.ndarray:
+    """
+    Convert an array to a C-contiguous little-endian array whose dtype has a
+    JavaScript typed array counterpart. Copies only when needed.
+
+    :param array: array to convert
+    :return: converted array
+    """
+    if array.dtype == np.bool_:
+        array = array.view(np.uint8)
+    elif array.dtype.kind in 'iu' and array.dtype.itemsize == 8:
+        # There are no 64 bit integer typed arrays usable as VTK scalars
+        narrow = np.int32 if array.dtype.kind == 'i' else np.uint32
+        info = np.iinfo(narrow)
+        if array.size and (array.min() < info.min or array.max() > info.max):
+            narrow = np.float64
+        array = array.astype(narrow)
+    array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+    return np.ascontiguousarray(array)
+
+
+def pack_mask(array: np.ndarray, labels) -> tuple:
+    """
+    Pack the voxels holding any of the given labels into a bitmask, one bit
+    per voxel in C order, the first voxel of each byte in its least
+    significant bit.
+
+    :param array: label map
+    :param labels: labels of the mask
+    :return: tuple (packed, mask) with the packed uint8 array and the JSON
+        serializable description of the mask
+    """
+    mask = np.isin(array, labels)
+    packed = np.packbits(mask, axis=None, bitorder='little')
+    return packed, {
+        'labels': [int(label) for label in labels],
+        'voxels': int(mask.size),
+        'encoding': 'packbits',
+        'bitorder': 'little',
+    }
+
+
+def encode_header(header: dict) -> bytes:
+    """
+    Encode the JSON header of a raw response: its length as a little-endian
+    uint32 followed by the JSON text, padded so the voxel buffer starts at an
+    8 byte aligned offset.
+
+    :param header: JSON serializable header
+    :return: encoded header
+    """
+    text = json.dumps(header, default=_json_default).encode('utf-8')
+    padding = -(4 + len(text)) % _ALIGNMENT
+    text += b' ' * padding
+    return struct.pack('<I', len(text)) + text
+
+
+def iter_raw(header: dict, array: np.ndarray):
+    """
+    Iterate over the pieces of a raw response.
+
+    :param header: metadata describing the array, the dtype is added to it
+    :param array: array to send, as returned by `to_transport_array`
+    """
+    header = dict(header, dtype=array.dtype.name)
+    yield encode_header(header)
+    yield from _iter_buffer(array)
+
+
+def iter_npy(array: np.ndarray):
+    """
+    Iterate over the pieces of an array serialized in the NPY format.
+
+    :param array: array to send, as returned by `to_transport_array`
+    """
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header, np.lib.format.header_data_from_array_1_0(array))
+    yield header.getvalue()
+    yield from _iter_buffer(array)
+
+
+def negotiate_encoding(accept_encoding: str):
+    """
+    Choose a content encoding from an Accept-Encoding request header.
+
+    :param accept_encoding: value of the Accept-Encoding header
+    :return: 'zstd', 'gzip' or None if the response should not be compressed
+    """
+    accepted = set()
+    for token in (accept_encoding or '').split(','):
+        coding, _, params = token.partition(';')
+        quality = 1.0
+        name, _, value = params.partition('=')
+        if name.strip() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                pass
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+
+    if zstandard is not None and 'zstd' in accepted:
+        return 'zstd'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(chunks, encoding):
+    """
+    Compress a stream of byte chunks.
+
+    :param chunks: iterable of bytes
+    :param encoding: 'zstd', 'gzip' or None to leave the stream untouched
+    """
+    if encoding is None:
+        yield from chunks
+        return
+
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def binary_response(header: dict, array: np.ndarray, response_format: str):
+    """
+    Stream an array as the body of the current response.
+
+    :param header: JSON serializable metadata describing the array
+    :param array: array to send
+    :param response_format: 'raw' for a JSON header followed by the voxel
+        buffer, or 'npy' for the NPY format with the metadata in a response header
+    :return: generator function Girder streams the response from
+    """
+    array = to_transport_array(array)
+    if response_format == 'npy':
+        chunks = iter_npy(array)
+        setResponseHeader('Segmentation-Metadata', json.dumps(header, default=_json_default))
+    else:
+        chunks = iter_raw(header, array)
+
+    setResponseHeader('Content-Type', 'application/octet-stream')
+
+    encoding = negotiate_encoding(cherrypy.request.headers.get('Accept-Encoding'))
+    if encoding:
+        setResponseHeader('Content-Encoding', encoding)
+    setResponseHeader('Vary', 'Accept-Encoding')
+    setRawResponse()
+
+    def stream():
+        yield from compress(chunks, encoding)
+
+    return stream
+
+
+def content_etag(*parts) -> str:
+    """
+    Build an entity tag from everything a response derives from, e.g. the
+    versions of its files and the request parameters shaping it. Tags are
+    weak, the same content being sent with different content encodings.
+
+    :param parts: JSON serializable values the response derives from
+    :return: entity tag
+    """
+    text = json.dumps([ETAG_SCHEME, parts], default=str, sort_keys=True)
+    return 'W/"%s"' % hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def etag_matches(tag: str, if_none_match: str) -> bool:
+    """
+    Compare an entity tag with an If-None-Match request header, using the
+    weak comparison of RFC 9110.
+
+    :param tag: entity tag of the response
+    :param if_none_match: value of the If-None-Match header
+    :return: whether the client already holds the response
+    """
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.split(',')}
+    return '*' in candidates or _opaque_tag(tag) in {_opaque_tag(c) for c in candidates}
+
+
+def not_modified(tag: str, max_age: int = 0) -> bool:
+    """
+    Tag the current response and check it against the copy cached by the
+    client. Responses are private, as they require authentication, and are
+    revalidated on every use unless a maximum age is given: the tag follows
+    the content, but the URL of a response does not.
+
+    :param tag: entity tag of the response, see `content_etag`
+    :param max_age: seconds the client may use its copy without revalidating it
+    :return: whether the client copy is current, the response is then an empty
+        304 the endpoint should return right away
+    """
+    setResponseHeader('ETag', tag)
+    setResponseHeader(
+        'Cache-Control', f'private, max-age={max_age}' if max_age else 'private, no-cache')
+    if etag_matches(tag, cherrypy.request.headers.get('If-None-Match')):
+        cherrypy.response.status = 304
+        setRawResponse()
+        return True
+    return False
+
+
+def _opaque_tag(tag: str) -> str:
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def _iter_buffer(array: np.ndarray):
+    buffer = memoryview(array).cast('B')
+    for start in range(0, len(buffer), CHUNK_SIZE):
+        yield bytes(buffer[start:start + CHUNK_SIZE])
+
+
+def _json_default(value):
+    # NumPy scalars found in metadata, e.g. label values or statistics
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
@@ -0,0 +1,130 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Label maps attached by a worker process, see `_init_worker`
+_worker_arrays = []
+_worker_blocks = []
+
+
+def pairwise_matrix(arrays, workers: int = 1, progress=None) -> dict:
+    """
+    Compare every pair of versions of a segmentation, computing the Dice
+    coefficient of their foregrounds and the number of voxels whose label changed.
+
+    With more than one worker, each label map is copied once into shared
+    memory and the pairs are computed in a process pool, one row of the
+    matrix per task. Label maps may then be produced lazily, so that only
+    their shared copies are held at once.
+
+    :param arrays: label maps of the versions, in matrix order
+    :param workers: number of worker processes
+    :param progress: optional callable receiving the number of pairs done and
+        the total number of pairs whenever a row of the matrix is completed
+    :return: dictionary with the symmetric 'dice' and 'changed' matrices as
+        lists of lists, with None for pairs of different shapes or empty
+        foregrounds, and the 'foreground' voxel count of each version
+    """
+    if workers <= 1:
+        arrays = list(arrays)
+        foreground = [int(np.count_nonzero(array)) for array in arrays]
+        rows = ((i, _compare_row(arrays, i)) for i in range(len(arrays) - 1))
+        return _assemble(foreground, rows, progress)
+
+    blocks = []
+    try:
+        specs = []
+        foreground = []
+        for array in arrays:
+            foreground.append(int(np.count_nonzero(array)))
+            block = _share(array)
+            blocks.append(block)
+            specs.append((block.name, array.shape, array.dtype.str))
+
+        # Forking a threaded server is unsafe, workers start from a clean interpreter
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=max(min(workers, len(specs) - 1), 1),
+                                 mp_context=context, initializer=_init_worker,
+                                 initargs=(specs,)) as pool:
+            futures = {pool.submit(_worker_row, i): i for i in range(len(specs) - 1)}
+            rows = ((futures[future], future.result()) for future in as_completed(futures))
+            return _assemble(foreground, rows, progress)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _assemble(foreground, rows, progress) -> dict:
+    """
+    Fill the matrices from the rows computed by `_compare_row`, in any order.
+    """
+    n = len(foreground)
+    dice = [[None] * n for _ in range(n)]
+    changed = [[None] * n for _ in range(n)]
+    for i in range(n):
+        changed[i][i] = 0
+        if foreground[i]:
+            dice[i][i] = 1.0
+
+    total = n * (n - 1) // 2
+    done = 0
+    for i, row in rows:
+        for j, changed_count, intersection in row:
+            if changed_count is None:
+                continue
+            changed[i][j] = changed[j][i] = changed_count
+            if foreground[i] + foreground[j]:
+                dice[i][j] = dice[j][i] = 2 * intersection / (foreground[i] + foreground[j])
+        done += len(row)
+        if progress:
+            progress(done, total)
+
+    return {
+        'dice': dice,
+        'changed': changed,
+        'foreground': foreground,
+    }
+
+
+def _compare_row(arrays, i) -> list:
+    """
+    Compare a version with every later version.
+
+    :return: list of (j, changed voxels, foreground intersection) tuples,
+        with None counts when the shapes differ
+    """
+    array = arrays[i]
+    mask = array != 0
+    row = []
+    for j in range(i + 1, len(arrays)):
+        other = arrays[j]
+        if other.shape != array.shape:
+            row.append((j, None, None))
+            continue
+        row.append((
+            j,
+            int(np.count_nonzero(array != other)),
+            int(np.count_nonzero(mask & (other != 0))),
+        ))
+    return row
+
+
+def _share(array: np.ndarray) -> shared_memory.SharedMemory:
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block
+
+
+def _init_worker(specs) -> None:
+    for name, shape, dtype in specs:
+        # Blocks are unlinked by the parent process, which created them
+        block = shared_memory.SharedMemory(name=name)
+        _worker_blocks.append(block)
+        _worker_arrays.append(np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf))
+
+
+def _worker_row(i) -> list:
+    return _compare_row(_worker_arrays, i)
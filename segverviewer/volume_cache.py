@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+
+
+class VolumeCache:
+    """
+    Process-wide LRU cache of decoded volumes.
+
+    Entries are bounded both by count and by the total number of bytes they
+    hold, the least recently used entries are evicted first once either limit
+    is exceeded.
+    """
+
+    def __init__(self, max_bytes: int = 2 * 1024 ** 3, max_entries: int = 64):
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_bytes: int = None, max_entries: int = None) -> None:
+        """
+        Change the cache limits, evicting entries if the new limits are lower.
+
+        :param max_bytes: maximum number of bytes held by the cache
+        :param max_entries: maximum number of entries held by the cache
+        """
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = int(max_bytes)
+            if max_entries is not None:
+                self.max_entries = int(max_entries)
+            self._evict()
+
+    def get(self, key):
+        """
+        Get a cached value, marking it as the most recently used.
+
+        :param key: cache key, holding the ID of every file the value derives from
+        :return: the cached value or None if it is not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes: int) -> None:
+        """
+        Store a value in the cache. Values larger than the whole byte budget
+        are not stored.
+
+        :param key: cache key, holding the ID of every file the value derives from
+        :param value: value to store
+        :param nbytes: number of bytes accounted for this value
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            self._evict()
+
+    def invalidate(self, file_id) -> int:
+        """
+        Remove every entry related to a file.
+
+        :param file_id: ID of the file whose entries are removed
+        :return: number of removed entries
+        """
+        file_id = str(file_id)
+        with self._lock:
+            keys = [key for key in self._entries if file_id in key]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _remove(self, key) -> None:
+        _, nbytes = self._entries.pop(key)
+        self.current_bytes -= nbytes
+
+    def _evict(self) -> None:
+        while self._entries and (
+            self.current_bytes > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+
+def file_cache_key(file, *extra) -> tuple:
+    """
+    Build a cache key for a Girder file that changes whenever its content does.
+
+    :param file: Girder file object
+    :param extra: additional key components, e.g. a pyramid level
+    :return: hashable cache key
+    """
+    version = file.get('sha512') or str(file.get('updated') or file.get('created', ''))
+    return (str(file['_id']), version) + extra
+
+
+volume_cache = VolumeCache()
+
+# Results computed from decoded volumes, e.g. statistics or metrics
+result_cache = VolumeCache(max_bytes=256 * 1024 ** 2, max_entries=4096)
+
+# Parsed segVerHandler configurations and indices, keyed by collection
+index_cache = VolumeCache(max_bytes=512 * 1024 ** 2, max_entries=64)
+
+# Decompressed bricks of bricked volumes, keyed by source file and brick index
+brick_cache = VolumeCache(max_bytes=512 * 1024 ** 2, max_entries=16384)
@@ -0,0 +1,93 @@
+import { getCurrentToken } from '@girder/core/auth';
+import { getApiRoot } from '@girder/core/rest';
+
+// Typed array constructors for the dtype names sent by the server
+const TYPED_ARRAYS = {
+    int8: Int8Array,
+    uint8: Uint8Array,
+    int16: Int16Array,
+    uint16: Uint16Array,
+    int32: Int32Array,
+    uint32: Uint32Array,
+    float32: Float32Array,
+    float64: Float64Array
+};
+
+/**
+ * Parse a raw response: a little-endian uint32 with the header length, the
+ * JSON header, and the voxel buffer starting at an 8 byte aligned offset.
+ *
+ * The voxels are wrapped in a typed array view, nothing is copied.
+ *
+ * @param {ArrayBuffer} buffer The response body.
+ * @returns {Object} The header, with the voxels as its `data` property.
+ */
+function parseRawResponse(buffer) {
+    const headerLength = new DataView(buffer).getUint32(0, true);
+    const headerBytes = new Uint8Array(buffer, 4, headerLength);
+    const header = JSON.parse(new TextDecoder('utf-8').decode(headerBytes));
+
+    const TypedArray = TYPED_ARRAYS[header.dtype];
+    if (!TypedArray) {
+        throw new Error(`Unsupported voxel type: ${header.dtype}`);
+    }
+    const offset = 4 + headerLength;
+    header.data = new TypedArray(buffer, offset, (buffer.byteLength - offset) / TypedArray.BYTES_PER_ELEMENT);
+    return header;
+}
+
+/**
+ * Expand a bitmask sent for a `labels` request into voxels holding `value`
+ * where the mask is set and 0 elsewhere, ready to be used as VTK scalars.
+ *
+ * @param {Uint8Array} packed The packed bits, least significant bit first.
+ * @param {Object} mask The `mask` field of the response header.
+ * @param {number} value Value of the voxels in the mask, e.g. their label.
+ * @returns {Uint8Array|Uint16Array|Int32Array} The voxels.
+ */
+function unpackMask(packed, mask, value) {
+    const VoxelArray = value < 256 ? Uint8Array : value < 65536 ? Uint16Array : Int32Array;
+    const voxels = new VoxelArray(mask.voxels);
+    for (let byte = 0; byte < packed.length; byte++) {
+        const bits = packed[byte];
+        if (bits) {
+            const first = byte * 8;
+            for (let bit = 0; bit < 8; bit++) {
+                if (bits & (1 << bit)) {
+                    voxels[first + bit] = value;
+                }
+            }
+        }
+    }
+    return voxels;
+}
+
+/**
+ * Request voxel data from the Girder API in the raw binary format.
+ *
+ * Compression is negotiated by the browser through `Accept-Encoding`.
+ *
+ * @param {string} path The API path, relative to the API root.
+ * @param {AbortSignal} [signal] Signal used to cancel the request.
+ * @returns {Promise<Object>} The parsed response.
+ */
+function requestRaw(path, signal) {
+    const separator = path.includes('?') ? '&' : '?';
+    return fetch(`${getApiRoot()}/${path.replace(/^\//, '')}${separator}format=raw`, {
+        method: 'GET',
+        credentials: 'same-origin',
+        headers: { 'Girder-Token': getCurrentToken() },
+        signal: signal
+    }).then((resp) => {
+        if (!resp.ok) {
+            throw new Error(`Request to ${path} failed with status ${resp.status}`);
+        }
+        return resp.arrayBuffer();
+    }).then(parseRawResponse);
+}
+
+export {
+    parseRawResponse,
+    requestRaw,
+    unpackMask
+};
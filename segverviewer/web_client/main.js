@@ -12,31 +12,22 @@ import SegItemView from './views/SegView';
 wrap(CollectionView, 'render', function (render) {
     render.call(this);
 
+    // One request for everything the viewer needs, instead of a chain of them
     restRequest({
-        url: `segmentation/${this.model.id}/is_segverhandler_instance`,
+        url: `segmentation/${this.model.id}/bootstrap`,
         method: 'GET'
     }).then((resp) => {
-        console.log(resp)
-        if (!resp) {
+        if (!resp.isSegverhandlerInstance) {
             return;
         }
-        restRequest({
-            url: `segmentation/${this.model.id}/get_index`,
-            method: 'GET'
-        }).then((index) => {
-            restRequest({
-                url: `segmentation/${this.model.id}/get_seg_files`,
-                method: 'GET'
-            }).then((segFiles) => {
-                new SegItemView({
-                    parentView: this,
-                    model: this.model,
-                    index: index,
-                    segFiles: segFiles
-                }).render()
-                    .$el.insertAfter(this.$('.g-hierarchy-widget'));
-            });
-        });
+        new SegItemView({
+            parentView: this,
+            model: this.model,
+            index: resp.index,
+            volumeFiles: resp.volumeFiles,
+            segFiles: resp.segFiles
+        }).render()
+            .$el.insertAfter(this.$('.g-hierarchy-widget'));
     }, this);
 
     return this;
@@ -0,0 +1,113 @@
+/**
+ * LRU cache of slice responses and of the data they are decoded from, shared
+ * by every file model of the page.
+ *
+ * Entries are bounded by the total number of bytes they hold, the least
+ * recently used entries are evicted first once the budget is exceeded. The
+ * size of an entry is only known once its promise resolves.
+ */
+class SliceCache {
+    constructor(maxBytes = 256 * 1024 * 1024) {
+        this._entries = new Map();
+        this.maxBytes = maxBytes;
+        this.bytes = 0;
+        this.hits = 0;
+        this.misses = 0;
+        this.evictions = 0;
+    }
+
+    /**
+     * @param {number} [options.maxBytes] Maximum number of bytes held by the cache.
+     */
+    configure(options) {
+        if (options.maxBytes !== undefined) {
+            this.maxBytes = options.maxBytes;
+        }
+        this._evict();
+        return this;
+    }
+
+    /**
+     * Get a cached value, loading it on a miss.
+     *
+     * @param {string} key Cache key, see `sliceCacheKey`.
+     * @param {Function} load Returns a promise of the value.
+     * @param {Function} sizeOf Returns the number of bytes of the resolved value.
+     * @returns {Promise} The cached promise.
+     */
+    fetch(key, load, sizeOf) {
+        const entry = this._entries.get(key);
+        if (entry) {
+            // Mark as the most recently used
+            this._entries.delete(key);
+            this._entries.set(key, entry);
+            this.hits++;
+            return entry.promise;
+        }
+        this.misses++;
+        const promise = load();
+        const newEntry = { promise: promise, bytes: 0 };
+        this._entries.set(key, newEntry);
+        promise.then((value) => {
+            if (this._entries.get(key) === newEntry) {
+                newEntry.bytes = sizeOf(value);
+                this.bytes += newEntry.bytes;
+                this._evict();
+            }
+        }, () => {
+            // Failed requests are retried the next time the value is needed
+            if (this._entries.get(key) === newEntry) {
+                this._entries.delete(key);
+            }
+        });
+        return promise;
+    }
+
+    clear() {
+        this._entries.clear();
+        this.bytes = 0;
+    }
+
+    stats() {
+        return {
+            entries: this._entries.size,
+            bytes: this.bytes,
+            maxBytes: this.maxBytes,
+            hits: this.hits,
+            misses: this.misses,
+            evictions: this.evictions
+        };
+    }
+
+    _evict() {
+        for (const [key, entry] of this._entries) {
+            if (this.bytes <= this.maxBytes) {
+                break;
+            }
+            this._entries.delete(key);
+            this.bytes -= entry.bytes;
+            this.evictions++;
+        }
+    }
+}
+
+/**
+ * Build the cache key of a slice.
+ *
+ * @param {string} fileId ID of the file, or of the pair of files of a difference.
+ * @param {string|number} axis Patient plane or NumPy axis the slice is cut along.
+ * @param {number} slice Index of the slice.
+ * @param {number} [level] Pyramid level or maximum size of the slice.
+ * @param {number} [label] Label the slice is filtered on.
+ */
+function sliceCacheKey(fileId, axis, slice, level, label) {
+    return [fileId, axis, slice, level === undefined ? '' : level, label === undefined ? '' : label].join('/');
+}
+
+const sliceCache = new SliceCache();
+
+export {
+    SliceCache,
+    sliceCache,
+    sliceCacheKey
+};
@@ -1,8 +1,11 @@
+import vtkActor from 'vtk.js/Sources/Rendering/Core/Actor';
 import vtkImageSlice from 'vtk.js/Sources/Rendering/Core/ImageSlice';
 import vtkImageData from 'vtk.js/Sources/Common/DataModel/ImageData';
 import vtkPiecewiseFunction from 'vtk.js/Sources/Common/DataModel/PiecewiseFunction';
 import vtkDataArray from 'vtk.js/Sources/Common/Core/DataArray';
 import vtkImageMapper from 'vtk.js/Sources/Rendering/Core/ImageMapper';
+import vtkMapper from 'vtk.js/Sources/Rendering/Core/Mapper';
+import vtkPolyData from 'vtk.js/Sources/Common/DataModel/PolyData';
 import vtkColorTransferFunction from 'vtk.js/Sources/Rendering/Core/ColorTransferFunction';
 import vtkInteractorStyleImage from 'vtk.js/Sources/Interaction/Style/InteractorStyleImage';
 import vtkOpenGLRenderWindow from 'vtk.js/Sources/Rendering/OpenGL/RenderWindow';
@@ -15,74 +18,248 @@ import FileModel from '@girder/core/models/FileModel';
 import FileCollection from '@girder/core/collections/FileCollection';
 import View from '@girder/core/views/View';
 
+import { requestRaw, unpackMask } from '../binaryTransport';
+import { sliceCache, sliceCacheKey } from '../sliceCache';
 import SegItemTemplate from '../templates/segItem.pug';
 import '../stylesheets/segItem.styl';
 
 const ImageFileModel = FileModel.extend({
     getFileInfo: function () {
-        if (!this._tag || !this._comment) {
-            return restRequest({
-                url: `/file/${this.id}`,
-                method: 'GET',
-            })
-                .then((resp) => {
-                    this._tag = resp.tag;
-                    this._comment = resp.comment;
-                    return resp;
-                });
+        if (this._tag === undefined && this.has('tag')) {
+            // Listed with its tag and comment by the bootstrap endpoint
+            this._tag = this.get('tag');
+            this._comment = this.get('comment');
         }
-        return Promise.resolve({ tag: this._tag, comment: this._comment });
-    },
-    getImage: function (slice, isSeg, diffInfo, volume_id) {
-        if (!this._image) {
-            // Cache the slice on the model
-            if (isSeg) {
-                return restRequest({
-                    url: `/segmentation/segmentation_data/?seg_id=${this.id}&volume_id=${volume_id}`,
+        if (this._tag === undefined) {
+            if (!this._fileInfoRequest) {
+                // Other files of the collection are looked up in the same request,
+                // which they share until it completes
+                const files = this.collection
+                    ? this.collection.filter((file) => (
+                        file._tag === undefined && !file.has('tag') && !file._fileInfoRequest))
+                    : [this];
+                const request = Promise.resolve(restRequest({
+                    url: 'segmentation/file_info',
                     method: 'GET',
-                })
-                    .then((resp) => {
-                        this._image = resp;
-                        const slicedResp = Object.assign({}, resp);
-                        slicedResp.data = resp.data[slice];
-                        return slicedResp;
+                    data: { ids: JSON.stringify(files.map((file) => file.id)), skip_missing: true }
+                })).then((resp) => {
+                    files.forEach((file) => {
+                        // Files removed or no longer readable are left out of the response
+                        const info = resp[file.id] || { tag: null, comment: null };
+                        file._tag = info.tag;
+                        file._comment = info.comment;
                     });
-            } else if (diffInfo) {
-                // diffInfo should contain seg1_id and seg2_id
-                return restRequest({
-                    url: `/segmentation/diff_data/?seg1_id=${diffInfo.seg1_id}&seg2_id=${diffInfo.seg2_id}`,
-                    method: 'GET',
-                })
-                    .then((resp) => {
-                        console.log('[ImageFileModel::getImage] diff called with response: ', resp);
-                        this._image = resp;
-                        const slicedResp = Object.assign({}, resp);
-                        slicedResp.data = resp.data[slice];
-                        return slicedResp;
+                }).finally(() => {
+                    files.forEach((file) => {
+                        if (file._fileInfoRequest === request) {
+                            delete file._fileInfoRequest;
+                        }
                     });
+                });
+                files.forEach((file) => {
+                    file._fileInfoRequest = request;
+                });
+            }
+            return this._fileInfoRequest.then(() => ({ tag: this._tag, comment: this._comment }));
+        }
+        return Promise.resolve({ tag: this._tag, comment: this._comment });
+    },
+    /**
+     * Get the metadata of this file, without any voxels. Segmentations are
+     * described relative to their source volume, which adds labels and
+     * quantification to the response.
+     */
+    getInfo: function (isSeg, volume_id) {
+        if (!this._info) {
+            this._info = new Map();
+        }
+        const key = isSeg ? volume_id : '';
+        if (!this._info.has(key)) {
+            const query = isSeg ? `?volume_id=${volume_id}` : '';
+            this._info.set(key, restRequest({
+                url: `/segmentation/${this.id}/volume_info${query}`,
+                method: 'GET',
+            }));
+        }
+        return Promise.resolve(this._info.get(key));
+    },
+    /**
+     * Get the intensity statistics of a source volume under each label of
+     * this segmentation.
+     */
+    getQuantification: function (volume_id) {
+        if (!this._quantification) {
+            this._quantification = new Map();
+        }
+        if (!this._quantification.has(volume_id)) {
+            this._quantification.set(volume_id, restRequest({
+                url: `/segmentation/quantification?seg_id=${this.id}&volume_id=${volume_id}`,
+                method: 'GET',
+            }));
+        }
+        return Promise.resolve(this._quantification.get(volume_id));
+    },
+    /**
+     * Get a single slice, merged with the file metadata. Neighbouring slices
+     * are prefetched so scrubbing through the volume does not wait on the server.
+     *
+     * When `maxSize` is given, the slice comes from the finest level of the
+     * volume pyramid whose rows and columns fit in it. When `plane` is given,
+     * the slice is cut along that patient plane and shown in the radiological
+     * convention, whatever the orientation of the image.
+     *
+     * When a `label` other than -1 is given, only the voxels of that label are
+     * kept. The server sends them as a bitmask, expanded here.
+     */
+    getImage: function (slice, isSeg, diffInfo, volume_id, maxSize, plane, signal, label) {
+        const infoPromise = diffInfo ? Promise.resolve({}) : this.getInfo(isSeg, volume_id);
+        return Promise.all([infoPromise, this._fetchSlice(slice, diffInfo, maxSize, plane, signal, label)])
+            .then(([info, sliceResp]) => {
+                this._sliceCount = sliceResp.sliceCount;
+                for (let offset = 1; offset <= ImageFileModel.prefetchDistance; offset++) {
+                    [slice - offset, slice + offset]
+                        .filter((neighbour) => neighbour >= 0 && neighbour < this._sliceCount)
+                        .forEach((neighbour) => {
+                            this._fetchSlice(neighbour, diffInfo, maxSize, plane, signal, label).catch(() => {});
+                        });
+                }
+                return Object.assign({}, info, sliceResp);
+            });
+    },
+    /**
+     * Requests made with an aborted `signal` are cancelled, they are then
+     * dropped from the slice cache.
+     */
+    _fetchSlice: function (slice, diffInfo, maxSize, plane, signal, label) {
+        if (diffInfo || label === -1) {
+            label = undefined;
+        }
+        // Differences are decoded locally at full resolution
+        const cacheKey = diffInfo
+            ? [`${diffInfo.seg1_id}:${diffInfo.seg2_id}`, plane || 0, slice, undefined]
+            : [this.id, plane || 0, slice, maxSize, label];
+        return sliceCache.fetch(sliceCacheKey(...cacheKey), () => {
+            // diffInfo should contain seg1_id and seg2_id
+            if (diffInfo) {
+                return this._getDiffRuns(diffInfo).then((diff) => this._getDiffSlice(diff, diffInfo, slice, plane, signal));
+            }
+            const query = [
+                maxSize ? `maxSize=${maxSize}` : '',
+                plane ? `plane=${plane}` : '',
+                label !== undefined ? `labels=${label}` : ''
+            ].filter((param) => param).join('&');
+            return requestRaw(`/segmentation/${this.id}/slice/${slice}${query ? `?${query}` : ''}`, signal)
+                .then((sliceResp) => {
+                    if (sliceResp.mask) {
+                        sliceResp.data = unpackMask(sliceResp.data, sliceResp.mask, label);
+                    }
+                    return sliceResp;
+                });
+        }, (sliceResp) => sliceResp.data.byteLength);
+    },
+    /**
+     * Slices across the leading axis of the volume are decoded from the runs
+     * and reoriented locally, other planes are requested from the server.
+     */
+    _getDiffSlice: function (diff, diffInfo, slice, plane, signal) {
+        const orientation = plane ? diff.planes[plane] : null;
+        if (orientation && orientation.axis !== 0) {
+            return requestRaw(
+                `/segmentation/diff_slice/${slice}?seg1_id=${diffInfo.seg1_id}&seg2_id=${diffInfo.seg2_id}&mode=category&plane=${plane}`,
+                signal);
+        }
+        const image = this._decodeDiffSlice(diff, slice);
+        return orientation ? this._reorientSlice(image, diff, orientation) : image;
+    },
+    /**
+     * Get the voxels that differ between two segmentations, as runs of
+     * (slice, start index in the slice, length, category). They are fetched once per pair,
+     * every slice of the difference is then decoded locally.
+     */
+    _getDiffRuns: function (diffInfo) {
+        return sliceCache.fetch(
+            sliceCacheKey(`${diffInfo.seg1_id}:${diffInfo.seg2_id}`, 'runs', ''),
+            () => requestRaw(
+                `/segmentation/diff_data?seg1_id=${diffInfo.seg1_id}&seg2_id=${diffInfo.seg2_id}&mode=sparse`),
+            (diff) => diff.data.byteLength);
+    },
+    _decodeDiffSlice: function (diff, slice) {
+        const [cols, rows, sliceCount] = diff.shape;
+        const data = new Uint8Array(cols * rows);
+        const runs = diff.data;
+        // Runs are sorted by slice, find the first one of the slice
+        let low = 0;
+        let high = runs.length / 4;
+        while (low < high) {
+            const mid = (low + high) >> 1;
+            if (runs[4 * mid] < slice) {
+                low = mid + 1;
             } else {
-                return restRequest({
-                    url: `/segmentation/${this.id}/base_image_data`,
-                    method: 'GET',
-                })
-                    .then((resp) => {
-                        console.log('[ImageFileModel::getImage] base called with response of length: ', resp);
-                        this._image = resp;
-                        const slicedResp = Object.assign({}, resp);
-                        slicedResp.data = resp.data[slice];
-                        return slicedResp;
-                    });
+                high = mid;
             }
         }
-        
-        // When image is cached, return a resolved Promise to maintain consistency
-        console.log('[ImageFileModel::getImage] this._image: ', this._image);
-        const slicedResp = Object.assign({}, this._image);
-        slicedResp.data = this._image.data[slice];
-        return Promise.resolve(slicedResp);
+        for (let i = 4 * low; i < runs.length && runs[i] === slice; i += 4) {
+            data.fill(runs[i + 3], runs[i + 1], runs[i + 1] + runs[i + 2]);
+        }
+        return {
+            shape: [cols, rows, 1],
+            spacing: diff.spacing,
+            origin: diff.origin,
+            direction: diff.direction,
+            axis: 0,
+            slice: slice,
+            sliceCount: sliceCount,
+            type: diff.type,
+            labels: diff.categories,
+            data: data
+        };
+    },
+    /**
+     * Transpose and flip a decoded slice as the server does for a plane,
+     * see `plane_orientation`.
+     */
+    _reorientSlice: function (image, diff, orientation) {
+        const [cols, rows] = image.shape;
+        const outRows = orientation.transpose ? cols : rows;
+        const outCols = orientation.transpose ? rows : cols;
+        const [flipRows, flipCols] = orientation.flip;
+        const data = new Uint8Array(image.data.length);
+        for (let row = 0; row < outRows; row++) {
+            const r = flipRows ? outRows - 1 - row : row;
+            for (let col = 0; col < outCols; col++) {
+                const c = flipCols ? outCols - 1 - col : col;
+                data[row * outCols + col] = orientation.transpose
+                    ? image.data[c * cols + r]
+                    : image.data[r * cols + c];
+            }
+        }
+        const dims = orientation.dims;
+        return Object.assign({}, image, {
+            shape: [outCols, outRows, 1],
+            spacing: dims.map((dim) => diff.spacing[dim]),
+            data: data
+        });
+    },
+    /**
+     * Get the outlines of the labels of a slice of this segmentation, as
+     * polylines in the pixel coordinates of the slice with the same `maxSize`
+     * and `plane`. Only `label` is outlined when it is not -1.
+     */
+    getContours: function (slice, maxSize, plane, signal, label) {
+        if (label === -1) {
+            label = undefined;
+        }
+        return sliceCache.fetch(sliceCacheKey(this.id, `contours:${plane || 0}`, slice, maxSize, label), () => {
+            const query = [
+                maxSize ? `maxSize=${maxSize}` : '',
+                plane ? `plane=${plane}` : '',
+                label !== undefined ? `labels=${label}` : ''
+            ].filter((param) => param).join('&');
+            return requestRaw(`/segmentation/${this.id}/contours/${slice}${query ? `?${query}` : ''}`, signal);
+        }, (contours) => contours.data.byteLength);
     },
     getSliceCount: function () {
-        return this._image.data.length;
+        return this._sliceCount;
     },
     setTag: function (tag) {
         restRequest({
@@ -102,6 +279,9 @@ const ImageFileModel = FileModel.extend({
             this._comment = comment;
         });
     }
+}, {
+    // Number of slices fetched ahead on each side of the displayed slice
+    prefetchDistance: 2
 });
 
 const ImageFileCollection = FileCollection.extend({
@@ -147,14 +327,19 @@ const SegImageWidget = View.extend({
     initialize: function (settings) {
         console.log('[SegImageWidget::initialize] settings: ', settings);
         this._image = null;
-        this._labelValue = -1; // Initialize on all labels
         this._slice = 0;
         this.vtk = {
             renderer: null,
             actor: null,
+            mapper: null,
+            imageData: null,
             camera: null,
-            interactor: null
+            interactor: null,
+            outlineActors: []
         };
+        // Labels the transfer functions were built for
+        this._transferLabels = null;
+        this._outlines = [];
     },
     destroy: function () {
         if (this.vtk.interactor) {
@@ -162,13 +347,25 @@ const SegImageWidget = View.extend({
         }
         View.prototype.destroy.apply(this, arguments);
     },
-    setImage: function (image) {
-        this._image = image;
+    /**
+     * Draw label outlines over the image.
+     *
+     * @param {Object[]} outlines The `contours` of a contours response and
+     *     the RGB `color` of their lines, for each segmentation outlined.
+     */
+    setOutlines: function (outlines) {
+        this._outlines = outlines;
+        if (this.vtk.renderer) {
+            this._updateOutlines();
+            this.vtk.interactor.render();
+        }
         return this;
     },
-    setLabelValue: function (labelValue) {
-        console.log('[SegImageWidget::setLabelValue] labelValue: ', labelValue);
-        this._labelValue = labelValue;
+    setImage: function (image) {
+        // Another pyramid level of the same slice keeps the camera, e.g. after zooming in
+        this._keepCamera = Boolean(this._image && image &&
+            this._image.slice === image.slice && this._image.level !== image.level);
+        this._image = image;
         return this;
     },
     /**
@@ -185,7 +382,7 @@ const SegImageWidget = View.extend({
 
         const glWin = vtkOpenGLRenderWindow.newInstance();
         glWin.setContainer(this.el);
-        glWin.setSize(256, 256);
+        glWin.setSize(SegImageWidget.size, SegImageWidget.size);
         renWin.addView(glWin);
 
         this.vtk.interactor = vtkRenderWindowInteractor.newInstance();
@@ -196,23 +393,18 @@ const SegImageWidget = View.extend({
         this.vtk.actor = vtkImageSlice.newInstance();
         this.vtk.renderer.addActor(this.vtk.actor);
 
+        // The pipeline is built once, slice changes only swap the scalars
+        this.vtk.imageData = vtkImageData.newInstance();
+        this.vtk.mapper = vtkImageMapper.newInstance();
+        this.vtk.mapper.setInputData(this.vtk.imageData);
+        this.vtk.actor.setMapper(this.vtk.mapper);
+        this._transferLabels = null;
+        this.vtk.outlineActors = [];
+        this._updateOutlines();
+
         if (this._image) {
-            const mapper = vtkImageMapper.newInstance();
-            if (this._image.labels) {
-                console.log('[SegImageWidget::render] getProperty: ', this.vtk.actor.getProperty());
-                console.log('[SegImageWidget::render] getProperty.getRGBTransferFunction: before', this.vtk.actor.getProperty().getRGBTransferFunction());
-                this.vtk.actor.getProperty().setRGBTransferFunction(0, this._getColorFun());
-                console.log('[SegImageWidget::render] getProperty.getRGBTransferFunction: after', this.vtk.actor.getProperty().getRGBTransferFunction());
-                this.vtk.actor.getProperty().getRGBTransferFunction();
-                this.vtk.actor.getProperty().setScalarOpacity(0, this._getOpacityFun());
-                // this.vtk.actor.getProperty().setUseLookupTableScalarRange(true);
-                this.vtk.actor.getProperty().setInterpolationTypeToLinear();
-                // this.vtk.actor.getProperty().setUseLabelOutline(true);
-            }
-            mapper.setInputData(this._getImageData());
-            console.log('[SegImageWidget::render] mapper: ', mapper);
-            this.vtk.actor.setMapper(mapper);
-            console.log('[SegImageWidget::render] this.vtk.actor: ', this.vtk.actor);
+            this._updateTransferFunctions();
+            this._updateImageData();
         }
 
         this.vtk.camera = this.vtk.renderer.getActiveCameraAndResetIfCreated();
@@ -232,19 +424,13 @@ const SegImageWidget = View.extend({
     rerenderSlice: function () {
         if (this.vtk.renderer) {
             if (this._image) {
-                const mapper = vtkImageMapper.newInstance();
-                mapper.setInputData(this._getImageData());
-                this.vtk.actor.setMapper(mapper);
-                if (this._image.labels) {
-                    this.vtk.actor.getProperty().setRGBTransferFunction(0, this._getColorFun());
-                    this.vtk.actor.getProperty().setScalarOpacity(0, this._getOpacityFun());
-                    // this.vtk.actor.getProperty().setUseLookupTableScalarRange(true);
-                    this.vtk.actor.getProperty().setInterpolationTypeToNearest();
-                    // this.vtk.actor.getProperty().setUseLabelOutline(true);
-                }
+                this._updateTransferFunctions();
+                this._updateImageData();
             }
             this.autoLevels(false);
-            this.autoZoom(false);
+            if (!this._keepCamera) {
+                this.autoZoom(false);
+            }
             this.vtk.interactor.render();
         } else {
             this.render();
@@ -255,7 +441,11 @@ const SegImageWidget = View.extend({
      * Requires `render` to be called first.
      */
     autoLevels: function (rerender = true) {
-        const range = this._getImageData().getPointData().getScalars().getRange();
+        const scalars = this.vtk.imageData.getPointData().getScalars();
+        if (!scalars) {
+            return this;
+        }
+        const range = scalars.getRange();
         const ww = range[1] - range[0];
         const wc = (range[0] + range[1]) / 2;
         this.vtk.actor.getProperty().setColorWindow(ww);
@@ -326,50 +516,105 @@ const SegImageWidget = View.extend({
         }
         return opacityFun;
     },
-    _getImageData: function () {
-        let tags;
-        if (!SegImageWidget.imageDataCache.has(this._image)) {
-            tags = this._extractImageData();
-            console.log('[SegImageWidget::_getImageData] caching tags for image: ', this._image);
-            SegImageWidget.imageDataCache.set(this._image, new Map());
-            SegImageWidget.imageDataCache.get(this._image).set(this._labelValue, tags);
-        } else if (!SegImageWidget.imageDataCache.get(this._image).has(this._labelValue)) {
-            tags = this._extractImageData();
-            console.log('[SegImageWidget::_getImageData] caching tags for label: ', this._labelValue);
-            SegImageWidget.imageDataCache.get(this._image).set(this._labelValue, tags);
-        } else {
-            tags = SegImageWidget.imageDataCache.get(this._image).get(this._labelValue);
+    /**
+     * Rebuild the color and opacity functions, only when the labels change.
+     */
+    _updateTransferFunctions: function () {
+        if (!this._image.labels || this._image.labels === this._transferLabels) {
+            return;
         }
-        return tags;
+        this._transferLabels = this._image.labels;
+        this.vtk.actor.getProperty().setRGBTransferFunction(0, this._getColorFun());
+        this.vtk.actor.getProperty().setScalarOpacity(0, this._getOpacityFun());
+        // this.vtk.actor.getProperty().setUseLookupTableScalarRange(true);
+        this.vtk.actor.getProperty().setInterpolationTypeToNearest();
+        // this.vtk.actor.getProperty().setUseLabelOutline(true);
     },
-    _extractImageData: function () {
-        console.log('[SegImageWidget::_extractImageData] this._image: ', this._image);
-
-        const imageData = vtkImageData.newInstance();
+    /**
+     * Show the current image by updating the scalars of the image data in place.
+     */
+    _updateImageData: function () {
+        const imageData = this.vtk.imageData;
+        const [cols, rows] = this._image.shape;
+        const extent = imageData.getExtent();
+        if (extent[1] !== cols - 1 || extent[3] !== rows - 1) {
+            imageData.setExtent(0, cols - 1, 0, rows - 1, 0, 0);
+        }
         imageData.setOrigin(0, 0, 0);
         imageData.setSpacing(this._image.spacing);
-        imageData.setExtent(0, this._image.shape[0] -1, 0, this._image.shape[1] - 1, 0, 1);
-        let filteredImage = this._image.data;
-        if(this._labelValue !== -1) {
-            filteredImage = filteredImage.map(
-                (value) => value !== this._labelValue ? 0 : value
-            );
-        }
-        console.log('[SegImageWidget::_extractImageData] filtered image unique values: ', new Set(filteredImage), 'with label: ', this._labelValue, 'and size: ', filteredImage.length);
-
-        const dataArray = vtkDataArray.newInstance({
-            values: filteredImage,
+        imageData.getPointData().setScalars(this._getScalars());
+        imageData.modified();
+    },
+    /**
+     * Update the polylines of the outline actors in place, adding actors as
+     * more segmentations are outlined.
+     */
+    _updateOutlines: function () {
+        const actors = this.vtk.outlineActors;
+        this._outlines.forEach((outline, index) => {
+            if (!actors[index]) {
+                const mapper = vtkMapper.newInstance();
+                mapper.setInputData(vtkPolyData.newInstance());
+                const actor = vtkActor.newInstance();
+                actor.setMapper(mapper);
+                actor.getProperty().setLineWidth(2);
+                this.vtk.renderer.addActor(actor);
+                actors.push(actor);
+            }
+            const polyData = actors[index].getMapper().getInputData();
+            const { points, lines } = outlinePolyData(outline.contours);
+            polyData.getPoints().setData(points, 3);
+            polyData.getLines().setData(lines);
+            polyData.modified();
+            actors[index].getProperty().setColor(...outline.color);
+            actors[index].setVisibility(true);
+        });
+        actors.slice(this._outlines.length).forEach((actor) => actor.setVisibility(false));
+    },
+    _getScalars: function () {
+        // Typed arrays are used by VTK as they are, the voxels are never copied.
+        // Slices of a single label are filtered by the server.
+        return vtkDataArray.newInstance({
+            values: this._image.data,
             numberOfComponents: 1 // Handle grayscale or RGB images
         });
-        
-        imageData.getPointData().setScalars(dataArray);
-        return imageData;
     }
 }, {
-    // This weakmap will contain other weakmaps to reference images for specific labels
-    imageDataCache: new WeakMap()
+    // Width and height of the render window, in pixels
+    size: 256
 });
 
+/**
+ * Build the points and closed line cells of the polylines of a contours
+ * response, in the coordinates of the image data of the slice. Lines are
+ * drawn slightly in front of the slice, on the side of the camera.
+ */
+function outlinePolyData(contours) {
+    const [columnSpacing, rowSpacing] = contours.spacing;
+    const vertices = contours.data;
+    const points = new Float32Array(vertices.length / 2 * 3);
+    for (let i = 0; i < vertices.length / 2; i++) {
+        points[3 * i] = vertices[2 * i] * columnSpacing;
+        points[3 * i + 1] = vertices[2 * i + 1] * rowSpacing;
+        points[3 * i + 2] = -0.01;
+    }
+
+    const counts = [].concat(...contours.contours.map((label) => label.counts));
+    // Each cell holds its size, its vertices and the first vertex again
+    const lines = new Uint32Array(counts.reduce((size, count) => size + count + 2, 0));
+    let offset = 0;
+    let first = 0;
+    counts.forEach((count) => {
+        lines[offset++] = count + 1;
+        for (let i = 0; i < count; i++) {
+            lines[offset++] = first + i;
+        }
+        lines[offset++] = first;
+        first += count;
+    });
+    return { points, lines };
+}
+
 const SegItemView = View.extend({
     className: 'g-view',
     events: {
@@ -433,7 +678,10 @@ const SegItemView = View.extend({
             const slice = parseInt($(event.target).val());
             this._slice = slice;
             this.$('.g-slice-value').val(slice);
-            this._rerender();
+            // Scrubbing shows coarse slices, refined once the slider rests
+            this._maxSize = SegItemView.coarseSize;
+            this._requestShowSlice();
+            this._scheduleRefine();
         },
         'change .g-slice-value': function (event) {
             let slice = parseInt($(event.target).val());
@@ -444,7 +692,19 @@ const SegItemView = View.extend({
             this._slice = slice;
             this.$('.g-slice-slider').val(slice);
             this.$('.g-slice-value').val(slice);
-            this._rerender();
+            this._requestShowSlice();
+        },
+        'change .g-outline-toggle': function (event) {
+            this._showOutlines = $(event.target).is(':checked');
+            this._updateOutlines();
+        },
+        'change .g-plane-select': function (event) {
+            this._plane = $(event.target).val();
+            // Slice counts differ between planes
+            this._slice = 0;
+            this.$('.g-slice-slider').val(0);
+            this.$('.g-slice-value').val(0);
+            this._requestShowSlice();
         },
         'click .g-seg-zoom-in': function (event) {
             event.preventDefault();
@@ -452,6 +712,8 @@ const SegItemView = View.extend({
             this._seg2View.zoomIn();
             this._baseImageView.zoomIn();
             this._diffView.zoomIn();
+            this._zoom *= 9 / 8;
+            this._scheduleRefine();
         },
         'click .g-seg-zoom-out': function (event) {
             event.preventDefault();
@@ -459,6 +721,7 @@ const SegItemView = View.extend({
             this._seg2View.zoomOut();
             this._baseImageView.zoomOut();
             this._diffView.zoomOut();
+            this._zoom *= 8 / 9;
         },
         'click .g-seg-reset-zoom': function (event) {
             event.preventDefault();
@@ -466,6 +729,7 @@ const SegItemView = View.extend({
             this._seg2View.autoZoom();
             this._baseImageView.autoZoom();
             this._diffView.autoZoom();
+            this._zoom = 1;
         },
         'click .g-seg-auto-levels': function (event) {
             event.preventDefault();
@@ -480,10 +744,15 @@ const SegItemView = View.extend({
      * @param {CollectionModel} settings.model A collection model.
      */
     initialize: function (settings) {
+        if (settings.sliceCacheBytes) {
+            sliceCache.configure({ maxBytes: settings.sliceCacheBytes });
+        }
         this._id = settings.model.id;
         this._index = settings.index || null;
         this._files = new ImageFileCollection(settings.segFiles || []);
 
+        // Given by the bootstrap endpoint, requested on render otherwise
+        this._volumeFilesList = settings.volumeFiles || null;
         this._volumeFiles = new ImageFileCollection([]);
         this._baseImageFile = null;
         this._seg1File = null;
@@ -496,6 +765,23 @@ const SegItemView = View.extend({
 
         this._sliceCount = null;
         this._slice = 0;
+        // Slices are first shown from a coarse pyramid level, see `_scheduleRefine`
+        this._maxSize = SegItemView.coarseSize;
+        this._zoom = 1;
+        this._plane = 'axial';
+        // Outlines of both segmentations drawn over the source volume
+        this._showOutlines = false;
+        this._refineTimeout = null;
+        // Slider ticks are coalesced into one slice change per animation frame
+        this._sliceFrame = null;
+        // Controllers of the slice requests still worth waiting for, oldest first
+        this._sliceControllers = [];
+        // Responses may arrive out of order, a view never goes back to an older request
+        this._requestCount = 0;
+        this._outlineRequestCount = 0;
+        this._metricsKey = null;
+        // Difference models by pair of segmentations, to reuse their decoded runs
+        this._diffModels = new Map();
 
         this.listenTo(this._volumeFiles, 'g:selected-volume', this._onBaseImageSelectionChanged);
         this.listenTo(this._files, 'g:selected-seg-1', this._onSeg1SelectionChanged);
@@ -512,10 +798,11 @@ const SegItemView = View.extend({
             parentView: this
         });
 
-        restRequest({
+        const volumeFilesRequest = this._volumeFilesList ? Promise.resolve(this._volumeFilesList) : restRequest({
             url: `segmentation/${this._id}/get_volume_files`,
             method: 'GET'
-        }).then((resp) => {
+        });
+        volumeFilesRequest.then((resp) => {
             console.log('[SegItemView::render] volume files response: ', resp);
             this._volumeFiles.add(resp, { merge: true });
             console.log('[SegItemView::render] volume files collection: ', this._volumeFiles);
@@ -553,10 +840,129 @@ const SegItemView = View.extend({
             });
 
             this._setDiffImage();
+            this._scheduleRefine();
         });
 
         return this;
     },
+    destroy: function () {
+        window.clearTimeout(this._refineTimeout);
+        window.cancelAnimationFrame(this._sliceFrame);
+        this._sliceControllers.forEach((controller) => controller.abort());
+        View.prototype.destroy.apply(this, arguments);
+    },
+    _requestShowSlice: function () {
+        if (this._sliceFrame === null) {
+            this._sliceFrame = window.requestAnimationFrame(() => {
+                this._sliceFrame = null;
+                this._showSlice();
+            });
+        }
+    },
+    /**
+     * Show the current slice in every view. Only slices are requested, the
+     * selections, labels, statistics and VTK pipelines are left as they are.
+     */
+    _showSlice: function () {
+        // Requests for slices the user scrolled past are cancelled, except
+        // the previous one, so something is still shown while scrubbing
+        const controller = new AbortController();
+        this._sliceControllers.push(controller);
+        while (this._sliceControllers.length > SegItemView.pendingSlices) {
+            this._sliceControllers.shift().abort();
+        }
+        const signal = controller.signal;
+
+        if (this._baseImageFile) {
+            this._showImage(this._baseImageView, this._baseImageFile.getImage(
+                this._slice, false, null, null, this._maxSize, this._plane, signal), (image) => {
+                if (image.sliceCount !== this._sliceCount) {
+                    this._setSliceCount();
+                }
+            });
+            if (this._seg1File) {
+                this._showImage(this._seg1View, this._seg1File.getImage(
+                    this._slice, true, null, this._baseImageFile.id, this._maxSize, this._plane, signal,
+                    this._files._selectedLabel1));
+            }
+            if (this._seg2File) {
+                this._showImage(this._seg2View, this._seg2File.getImage(
+                    this._slice, true, null, this._baseImageFile.id, this._maxSize, this._plane, signal,
+                    this._files._selectedLabel2));
+            }
+        }
+        this._updateDiffImageIfReady(signal);
+        this._updateOutlines(signal);
+        this._updateCacheStats();
+    },
+    _updateOutlines: function (signal) {
+        if (!this._baseImageView) {
+            return;
+        }
+        if (!this._showOutlines || !this._baseImageFile) {
+            this._baseImageView.setOutlines([]);
+            return;
+        }
+        const outlined = [
+            [this._seg1File, this._files._selectedLabel1, SegItemView.outlineColors[0]],
+            [this._seg2File, this._files._selectedLabel2, SegItemView.outlineColors[1]]
+        ].filter(([file]) => file);
+        const request = ++this._outlineRequestCount;
+        Promise.all(outlined.map(([file, label, color]) => file
+            .getContours(this._slice, this._maxSize, this._plane, signal, label)
+            .then((contours) => ({ contours: contours, color: color }))
+        )).then((outlines) => {
+            // Only the latest outlines are shown, whatever order they arrive in
+            if (request === this._outlineRequestCount) {
+                this._baseImageView.setOutlines(outlines);
+            }
+        }).catch((error) => {
+            if (error.name !== 'AbortError') {
+                console.error('[SegItemView::_updateOutlines] failed to load contours:', error);
+            }
+        });
+    },
+    _showImage: function (view, imagePromise, callback) {
+        const request = ++this._requestCount;
+        imagePromise.then((image) => {
+            if (callback) {
+                callback(image);
+            }
+            if (this._claimView(view, request)) {
+                view.setImage(image).rerenderSlice();
+            }
+        }).catch((error) => {
+            if (error.name !== 'AbortError') {
+                console.error('[SegItemView::_showImage] failed to load slice:', error);
+            }
+        });
+    },
+    /**
+     * Once the slider and zoom rest, request slices matching the displayed
+     * size, up to the full resolution.
+     */
+    _scheduleRefine: function () {
+        window.clearTimeout(this._refineTimeout);
+        this._refineTimeout = window.setTimeout(() => {
+            const maxSize = Math.ceil(SegImageWidget.size * this._zoom);
+            if (maxSize > this._maxSize) {
+                this._maxSize = maxSize;
+                this._showSlice();
+            }
+        }, SegItemView.refineDelay);
+    },
+    /**
+     * Record that a view is about to show the response of a request.
+     *
+     * @returns {boolean} Whether the view does not show a more recent one.
+     */
+    _claimView: function (view, request) {
+        if (view._request > request) {
+            return false;
+        }
+        view._request = request;
+        return true;
+    },
     _onSeg1SelectionChanged: function (selectedFile, labelValue) {
         let isNewFile = false;
         if (selectedFile != this._seg1File) {
@@ -564,8 +970,10 @@ const SegItemView = View.extend({
             isNewFile = true;
             this._seg1File = selectedFile;
         }
+        const request = ++this._requestCount;
         // selectedFile.getImage(this._slice, true, null, this._baseImageFile.id)
-        selectedFile.getImage(this._slice, true, null, this._baseImageFile.id)
+        selectedFile.getImage(
+            this._slice, true, null, this._baseImageFile.id, this._maxSize, this._plane, undefined, labelValue)
             .then((image) => {
                 if (isNewFile) {
                     this._populateSegDropdowns();
@@ -573,19 +981,18 @@ const SegItemView = View.extend({
                     this._seg1View.$('.g-filename').text(selectedFile.name()).attr('title', selectedFile.name());
                     // this._seg1View.$('.g-seg1-tag').text(selectedFile.tag()).attr('title', selectedFile.tag());
 
-                    // update seg quantification
-                    this.$('.g-quant1-min').text(image['quantification']['min']);
-                    this.$('.g-quant1-max').text(image['quantification']['max']);
-                    this.$('.g-quant1-mean').text(image['quantification']['mean']);
-                    this.$('.g-quant1-sd').text(image['quantification']['sd']);
-                    this.$('.g-quant1-volume').text(image['quantification']['volume']);
+                }
+                if (!this._claimView(this._seg1View, request)) {
+                    return;
                 }
 
                 this._seg1View
                     .setImage(image)
-                    .setLabelValue(labelValue)
                     .rerenderSlice();
 
+                this._updateQuantification(selectedFile, labelValue, '.g-quant1');
+                this._updateOutlines();
+
                 this._updateDiffImageIfReady();
             });
         if (isNewFile) {
@@ -598,9 +1005,11 @@ const SegItemView = View.extend({
             isNewFile = true;
             this._seg2File = selectedFile;
         }
+        const request = ++this._requestCount;
         // selectedFile.getImage(this._slice, true, null, this._baseImageFile.id)
         console.log("8780", this._baseImageFile);
-        selectedFile.getImage(this._slice, true, null, this._baseImageFile.id)
+        selectedFile.getImage(
+            this._slice, true, null, this._baseImageFile.id, this._maxSize, this._plane, undefined, labelValue)
             .then((image) => {
                 if (isNewFile) {
                     // update only if a new file is selected
@@ -608,19 +1017,18 @@ const SegItemView = View.extend({
                     this._populateLabelDropdowns(image, '.g-label2-options', '.g-label2-dropdown');
                     this._seg2View.$('.g-filename').text(selectedFile.name()).attr('title', selectedFile.name());
                     
-                    // update seg quantification
-                    this.$('.g-quant2-min').text(image['quantification']['min']);
-                    this.$('.g-quant2-max').text(image['quantification']['max']);
-                    this.$('.g-quant2-mean').text(image['quantification']['mean']);
-                    this.$('.g-quant2-sd').text(image['quantification']['sd']);
-                    this.$('.g-quant2-volume').text(image['quantification']['volume']);
+                }
+                if (!this._claimView(this._seg2View, request)) {
+                    return;
                 }
 
                 this._seg2View
                     .setImage(image)
-                    .setLabelValue(labelValue)
                     .rerenderSlice();
 
+                this._updateQuantification(selectedFile, labelValue, '.g-quant2');
+                this._updateOutlines();
+
                 this._updateDiffImageIfReady();
             });
         if (isNewFile) {
@@ -634,13 +1042,19 @@ const SegItemView = View.extend({
             this._baseImageFile = selectedFile;
             console.log('[SegItemView::_onBaseImageSelectionChanged] calling with new file: ', selectedFile);
         }
-        selectedFile.getImage(this._slice)
+        const request = ++this._requestCount;
+        selectedFile.getImage(this._slice, false, null, null, this._maxSize, this._plane)
             .then((image) => {
                 if (isNewFile){
                     // Only update if base image has changed
                     this._baseImageView.$('.g-filename').text(selectedFile.name()).attr('title', selectedFile.name());
+                }
+                if (isNewFile || image.sliceCount !== this._sliceCount) {
                     this._setSliceCount();
                 }
+                if (!this._claimView(this._baseImageView, request)) {
+                    return;
+                }
 
                 this._baseImageView
                     .setImage(image)
@@ -650,7 +1064,7 @@ const SegItemView = View.extend({
     _setDiffImage: function () {
         this._updateDiffImageIfReady();
     },
-    _updateDiffImageIfReady: function () {
+    _updateDiffImageIfReady: function (signal) {
         // Only proceed if both segmentation files are selected
         if (!this._seg1File || !this._seg2File) {
             return;
@@ -662,19 +1076,38 @@ const SegItemView = View.extend({
             seg2_id: this._seg2File.id
         };
 
-        // Create a temporary file model to handle the diff request
-        const diffFileModel = new ImageFileModel();
-        diffFileModel.getImage(this._slice, false, diffInfo)
-            .then((diffImage) => {
-                this.$('.g-seg-diff-filename').text('Difference').attr('title', 'Difference');
-                this._diffView
-                    .setImage(diffImage)
-                    .rerenderSlice();
-                // update metrics
-                this.$('.g-seg-metrics-dice').text('0.804');
-                this.$('.g-seg-metrics-hausdorff').text('1.3');
-                this.$('.g-seg-metrics-assd').text('0.2');
+        const key = `${diffInfo.seg1_id}/${diffInfo.seg2_id}`;
+        if (!this._diffModels.has(key)) {
+            this._diffModels.set(key, new ImageFileModel());
+        }
+        const diffFileModel = this._diffModels.get(key);
+        this._showImage(
+            this._diffView,
+            diffFileModel.getImage(this._slice, false, diffInfo, null, null, this._plane, signal),
+            () => this.$('.g-seg-diff-filename').text('Difference').attr('title', 'Difference'));
+        this._updateMetrics(diffInfo);
+    },
+    _updateMetrics: function (diffInfo) {
+        const key = `${diffInfo.seg1_id}/${diffInfo.seg2_id}`;
+        if (key === this._metricsKey) {
+            return;
+        }
+        this._metricsKey = key;
+        const names = ['dice', 'jaccard', 'hausdorff', 'hd95', 'assd'];
+        names.forEach((name) => this.$(`.g-seg-metrics-${name}`).text('…'));
+        restRequest({
+            url: `/segmentation/metrics?seg1_id=${diffInfo.seg1_id}&seg2_id=${diffInfo.seg2_id}`,
+            method: 'GET',
+        }).then((metrics) => {
+            if (key !== this._metricsKey) {
+                // Another pair was selected in the meantime
+                return;
+            }
+            names.forEach((name) => {
+                const value = metrics.overall[name];
+                this.$(`.g-seg-metrics-${name}`).text(value === null ? '-' : Number(value).toFixed(3));
             });
+        });
     },
     _setSliceCount: function () {
         let sliceCount = 0;
@@ -689,6 +1122,22 @@ const SegItemView = View.extend({
         this.$('.g-slice-slider').attr('max', this._sliceCount - 1).val(this._slice);
         this.$('.g-slice-value').attr('max', this._sliceCount - 1).val(this._slice);
     },
+    /**
+     * Show the statistics of the base image under the selected label, or
+     * under the whole segmentation when all labels are selected.
+     */
+    _updateQuantification: function (selectedFile, labelValue, selectorPrefix) {
+        selectedFile.getQuantification(this._baseImageFile.id).then((quantification) => {
+            let stats = quantification.overall;
+            if (labelValue !== -1) {
+                stats = quantification.labels.find((entry) => entry.label === labelValue) || stats;
+            }
+            ['min', 'max', 'mean', 'sd', 'volume'].forEach((key) => {
+                const value = stats[key];
+                this.$(`${selectorPrefix}-${key}`).text(value === null ? '-' : Number(value).toFixed(2));
+            });
+        });
+    },
     _updateSegmentationInfo: function (selectedFile, tagSelector, commentSelector) {
         selectedFile.getFileInfo().then((info) => {
             console.log('[SegItemView::_updateSegmentationInfo] file info: ', info);
@@ -696,11 +1145,14 @@ const SegItemView = View.extend({
             this.$(commentSelector).val(info.comment);
         });
     },
-    _rerender: function () {
-        this._volumeFiles.selectVolumeIndex(this._volumeFiles._selectedVolume);
-        this._files.selectSeg1Index(this._files._selectedSeg1);
-        this._files.selectSeg2Index(this._files._selectedSeg2);
-        this._updateDiffImageIfReady();
+    _updateCacheStats: function () {
+        const stats = sliceCache.stats();
+        const requests = stats.hits + stats.misses;
+        this.$('.g-slice-cache-stats').text(
+            `Cache: ${stats.entries} entries, ${(stats.bytes / 1024 / 1024).toFixed(1)} / ` +
+            `${(stats.maxBytes / 1024 / 1024).toFixed(0)} MB, ` +
+            `${requests ? Math.round(100 * stats.hits / requests) : 0}% hits`
+        ).attr('title', `${stats.evictions} evictions`);
     },
     _populateSegDropdowns: function () {
         // Clear existing options
@@ -779,6 +1231,15 @@ const SegItemView = View.extend({
         }).remove();
         $button.prepend(text + ' ');
     },
+}, {
+    // Maximum rows and columns of the slices shown while scrubbing
+    coarseSize: 64,
+    // Time the slider and zoom must rest before full detail slices are requested, in ms
+    refineDelay: 200,
+    // Number of slice changes whose requests are kept in flight
+    pendingSlices: 2,
+    // RGB colors of the outlines of segmentations 1 and 2
+    outlineColors: [[1, 0.8, 0], [0, 0.8, 1]]
 });
 
 export default SegItemView;
@@ -0,0 +1,104 @@
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class WorkQueue:
+    """
+    Bounded pool of daemon threads running tasks in submission order.
+
+    Worker threads are started on the first submission. Tasks beyond the
+    maximum number of pending tasks are rejected, so callers can apply
+    backpressure instead of queueing without limit.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 10000):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.workers = workers
+        self.max_pending = max_pending
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def configure(self, workers: int = None, max_pending: int = None) -> None:
+        """
+        Change the queue limits. Fewer workers only take effect for threads
+        started afterwards.
+
+        :param workers: number of worker threads
+        :param max_pending: maximum number of tasks waiting for a worker
+        """
+        with self._lock:
+            if workers is not None:
+                self.workers = max(int(workers), 1)
+            if max_pending is not None:
+                self.max_pending = int(max_pending)
+
+    def submit(self, fn, *args) -> bool:
+        """
+        Queue a task.
+
+        :param fn: callable to run in a worker thread
+        :param args: arguments of the callable
+        :return: whether the task was queued, False if the queue is full
+        """
+        with self._lock:
+            if self._queue.qsize() >= self.max_pending:
+                self.rejected += 1
+                return False
+            self._queue.put((fn, args))
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return True
+
+    def join(self) -> None:
+        """
+        Wait until every queued task is done.
+        """
+        self._queue.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'pending': self._queue.qsize(),
+                'running': self.running,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+            }
+
+    def _work(self) -> None:
+        while True:
+            fn, args = self._queue.get()
+            with self._lock:
+                self.running += 1
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception('Queued task %r failed', fn)
+                with self._lock:
+                    self.failed += 1
+            else:
+                with self._lock:
+                    self.completed += 1
+            finally:
+                with self._lock:
+                    self.running -= 1
+                self._queue.task_done()
+
+
+# Post-upload processing of new files
+ingest_queue = WorkQueue(workers=2)
+
+# Long computations requested by users, e.g. version matrices
+job_queue = WorkQueue(workers=1)
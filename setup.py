@@ -10,6 +10,13 @@ requirements = [
     'tomli>=2.2.1',
 ]
 
+extras_requirements = {
+    # Parses large segVerHandler indexes incrementally
+    'streaming': ['ijson>=3.1'],
+    # Compresses binary responses with zstd for clients accepting it
+    'zstd': ['zstandard>=0.15'],
+}
+
 setup(
     author='Daniel Restrepo, Pablo Mesa, William A. Romero',
     author_email='drones9182@gmail.com',
@@ -24,6 +31,7 @@ setup(
     ],
     description='Girder plugin to visualize different versions of segmentations for a certain volume',
     install_requires=requirements,
+    extras_require=extras_requirements,
     license='Apache Software License 2.0',
     long_description=readme,
     long_description_content_type='text/x-rst',
@@ -0,0 +1,55 @@
+import io
+
+import numpy as np
+import pytest
+
+from segverviewer.bricks import (
+    BrickedArray, BrickedImage, read_brick, read_header, write_bricks
+)
+
+
+def _bricked(array, brick):
+    fp = io.BytesIO()
+    size = write_bricks(
+        fp, array, brick,
+        spacing=[0.5, 0.5, 2.0], origin=[0.0, 0.0, 0.0], direction=[1, 0, 0, 0, 1, 0, 0, 0, 1])
+    assert size == len(fp.getvalue())
+    fp.seek(0)
+    header = read_header(fp)
+    loaded = []
+
+    def load_brick(index):
+        loaded.append(index)
+        return read_brick(fp, header, index)
+    return header, BrickedArray(header, load_brick), loaded
+
+
+def test_bricked_slices():
+    array = np.random.default_rng(0).integers(-100, 100, size=(9, 10, 11)).astype(np.int16)
+    header, bricked, loaded = _bricked(array, 4)
+
+    image = BrickedImage(header)
+    assert image.GetSpacing() == (0.5, 0.5, 2.0)
+    assert image.GetSize() == (11, 10, 9)
+    assert bricked.shape == array.shape
+    assert bricked.dtype == array.dtype
+    for axis in range(3):
+        for index in (0, 5, -1):
+            key = (slice(None),) * axis + (index,)
+            assert np.array_equal(bricked[key], array[key])
+    assert np.array_equal(bricked[2:7, 3, 1:10], array[2:7, 3, 1:10])
+
+    # An axial slice only touches one layer of the 3x3x3 brick grid
+    loaded.clear()
+    bricked[5]
+    assert len(loaded) == 9
+
+
+def test_bricked_errors():
+    _, bricked, _ = _bricked(np.zeros((3, 3, 3), dtype=np.uint8), 2)
+    with pytest.raises(IndexError):
+        bricked[3]
+    with pytest.raises(IndexError):
+        bricked[::2]
+    with pytest.raises(ValueError):
+        read_header(io.BytesIO(b'not bricks'))
@@ -0,0 +1,52 @@
+import numpy as np
+
+from segverviewer.contours import label_contours, mask_contours, mask_surface, pack_polylines
+
+
+def test_mask_contours():
+    mask = np.zeros((5, 6), dtype=bool)
+    mask[1:3, 1:4] = True
+    mask[4, 5] = True
+    polylines = sorted(mask_contours(mask), key=len)
+    assert [len(polyline) for polyline in polylines] == [4, 10]
+
+    # A single pixel is surrounded by the middles of its edges
+    assert sorted(map(tuple, polylines[0].tolist())) == [
+        (4.5, 4.0), (5.0, 3.5), (5.0, 4.5), (5.5, 4.0)]
+    rectangle = polylines[1]
+    assert rectangle.min(axis=0).tolist() == [0.5, 0.5]
+    assert rectangle.max(axis=0).tolist() == [3.5, 2.5]
+    # Consecutive vertices are neighbouring edge middles
+    steps = np.abs(np.diff(np.vstack([rectangle, rectangle[:1]]), axis=0)).sum(axis=1)
+    assert np.all(steps <= 1)
+
+    # Diagonal pixels are separate
+    assert len(mask_contours(np.eye(2, dtype=bool))) == 2
+    assert mask_contours(np.zeros((3, 3), dtype=bool)) == []
+
+
+def test_label_contours():
+    array = np.array([[0, 3, 3], [7, 0, 0]], dtype=np.uint8)
+    contours = label_contours(array)
+    assert [label for label, _ in contours] == [3, 7]
+
+    vertices, description = pack_polylines(contours)
+    assert vertices.shape == (sum(map(sum, (d['counts'] for d in description))), 2)
+    assert description == [{'label': 3, 'counts': [6]}, {'label': 7, 'counts': [4]}]
+
+
+def test_mask_surface():
+    mask = np.zeros((3, 4, 5), dtype=bool)
+    mask[0, 1:3, 1:4] = True
+    mask[2, 0, 0] = True
+    vertices, triangles = mask_surface(mask)
+    assert vertices.dtype == np.float32
+    assert triangles.dtype == np.uint32
+    # 2 triangles for each of the 22 faces of the box and 6 of the voxel
+    assert len(triangles) == 2 * (22 + 6)
+    assert vertices.min(axis=0).tolist() == [-0.5, -0.5, -0.5]
+
+    # The enclosed volume is positive, so triangles face outwards
+    v0, v1, v2 = (vertices[triangles[:, i]].astype(float) for i in range(3))
+    volume = np.einsum('ij,ij->', v0, np.cross(v1, v2)) / 6
+    assert np.isclose(volume, mask.sum())
@@ -0,0 +1,61 @@
+import numpy as np
+
+from segverviewer.derivatives import compact_labels, compute_label_derivatives, find_labels
+
+
+def test_label_derivatives():
+    array = np.zeros((6, 8, 10), dtype=np.uint8)
+    array[1:3, 2:5, 4:6] = 3
+    array[4, 0, 9] = 200
+
+    derivatives = compute_label_derivatives(array)
+    assert derivatives['labels'] == [3, 200]
+    assert derivatives['counts'] == [12, 1]
+    assert derivatives['bounding_boxes'] == [
+        [[1, 2], [2, 4], [4, 5]],
+        [[4, 4], [0, 0], [9, 9]],
+    ]
+    assert derivatives['slice_labels'] == [[], [3], [3], [], [200], []]
+
+
+def test_label_derivatives_other_ranks():
+    image = np.array([[0, 5, 5], [0, 0, 2]], dtype=np.int16)
+    derivatives = compute_label_derivatives(image)
+    assert derivatives['labels'] == [2, 5]
+    assert derivatives['counts'] == [1, 2]
+    assert derivatives['bounding_boxes'] == [[[1, 1], [2, 2]], [[0, 0], [1, 2]]]
+    assert derivatives['slice_labels'] == [[5], [2]]
+
+    volumes = np.zeros((2, 3, 4, 5), dtype=np.uint8)
+    volumes[1, 0, 2:4, 1] = 9
+    derivatives = compute_label_derivatives(volumes)
+    assert derivatives['bounding_boxes'] == [[[1, 1], [0, 0], [2, 3], [1, 1]]]
+    assert derivatives['slice_labels'] == [[], [9]]
+
+    assert compute_label_derivatives(np.array([0, 4, 4]))['bounding_boxes'] == [[[1, 2]]]
+
+
+def test_compact_labels():
+    array = np.array([[-4, 7], [7, 0]], dtype=np.int32)
+    labels, indices = compact_labels(array)
+    assert labels.tolist() == [-4, 0, 7]
+    assert np.array_equal(labels[indices], array)
+
+    floats = np.array([0.5, 0.25, 0.5])
+    labels, indices = compact_labels(floats)
+    assert np.array_equal(labels[indices], floats)
+
+
+def test_find_labels():
+    array = np.array([[[-4, 7]], [[7, 0]]], dtype=np.int32)
+    assert find_labels(array).tolist() == [-4, 0, 7]
+    assert find_labels(array).dtype == np.int32
+    assert find_labels(np.array([[0.5], [0.25]])).tolist() == [0.25, 0.5]
+    assert find_labels(np.array([[True, False]])).tolist() == [0, 1]
+    assert find_labels(np.zeros((0, 3), dtype=np.uint8)).size == 0
+
+    # Values too far apart for a lookup table
+    assert find_labels(np.array([[0], [1 << 30]])).tolist() == [0, 1 << 30]
+    derivatives = compute_label_derivatives(np.array([[0.5, 0.0], [0.0, 0.25]]))
+    assert derivatives['labels'] == [0.25, 0.5]
+    assert derivatives['bounding_boxes'] == [[[1, 1], [1, 1]], [[0, 0], [0, 0]]]
@@ -0,0 +1,49 @@
+import numpy as np
+
+from segverviewer.diff import (
+    LABEL_CHANGED, ONLY_IN_A, ONLY_IN_B, category_counts, category_volume, changed_voxels,
+    run_lengths
+)
+
+
+def test_category_volume():
+    seg1 = np.array([[0, 1, 1, 2], [2, 0, 0, 3]], dtype=np.uint8)
+    seg2 = np.array([[1, 1, 0, 3], [2, 0, 2, 3]], dtype=np.uint8)
+
+    volume = category_volume(seg1, seg2)
+    assert volume.tolist() == [[ONLY_IN_B, 0, ONLY_IN_A, LABEL_CHANGED], [0, 0, ONLY_IN_B, 0]]
+
+    # Only the changes of label 2 are reported
+    volume = category_volume(seg1, seg2, label=2)
+    assert volume.tolist() == [[0, 0, 0, LABEL_CHANGED], [0, 0, ONLY_IN_B, 0]]
+
+
+def test_run_lengths():
+    seg1 = np.zeros((4, 5, 6), dtype=np.uint16)
+    seg2 = seg1.copy()
+    seg1[1, 2, 1:4] = 5
+    seg2[2, 0:2, :] = 7
+    seg2[2, 1, 3] = 5
+
+    indices, categories = changed_voxels(seg1, seg2)
+    runs = run_lengths(indices, categories, 5 * 6)
+
+    assert runs.dtype == np.uint32
+    decoded = np.zeros((4, 5 * 6), dtype=np.uint8)
+    for slice_index, start, length, category in runs:
+        assert start + length <= 5 * 6
+        decoded[slice_index, start:start + length] = category
+    assert np.array_equal(decoded.reshape(seg1.shape), category_volume(seg1, seg2))
+    assert category_counts(categories) == {'only in A': 3, 'only in B': 12, 'label changed': 0}
+
+    # Runs do not cross slices
+    seg = np.zeros((2, 2, 2), dtype=np.uint8)
+    indices, categories = changed_voxels(seg, seg + 1)
+    assert run_lengths(indices, categories, 4).tolist() == [[0, 0, 4, 2], [1, 0, 4, 2]]
+
+
+def test_no_changes():
+    seg = np.ones((3, 3), dtype=np.uint8)
+    indices, categories = changed_voxels(seg, seg)
+    assert run_lengths(indices, categories, 3).shape == (0, 4)
+    assert category_counts(categories) == {'only in A': 0, 'only in B': 0, 'label changed': 0}
@@ -0,0 +1,38 @@
+import io
+import json
+
+import pytest
+
+from girder.models.file import File
+from girder.models.folder import Folder
+from girder.models.upload import Upload
+from pytest_girder.assertions import assertStatus, assertStatusOk
+
+
+def _upload(folder, user, name):
+    content = b'not an image'
+    return Upload().uploadFromFile(
+        io.BytesIO(content), len(content), name, parentType='folder', parent=folder, user=user)
+
+
+@pytest.mark.plugin('segverviewer')
+def test_file_info_skips_missing_files(server, admin, user, fsAssetstore):
+    public = Folder().createFolder(admin, 'public', parentType='user', public=True, creator=admin)
+    private = Folder().createFolder(
+        admin, 'private', parentType='user', public=False, creator=admin)
+
+    kept = _upload(public, admin, 'kept.nii.gz')
+    kept['tag'] = 'approved'
+    File().save(kept)
+    removed = _upload(public, admin, 'removed.nii.gz')
+    File().remove(removed)
+    forbidden = _upload(private, admin, 'forbidden.nii.gz')
+    ids = json.dumps([str(file['_id']) for file in (kept, removed, forbidden)])
+
+    resp = server.request('/segmentation/file_info', user=user, params={'ids': ids})
+    assertStatus(resp, 400)
+
+    resp = server.request(
+        '/segmentation/file_info', user=user, params={'ids': ids, 'skip_missing': 'true'})
+    assertStatusOk(resp)
+    assert resp.json == {str(kept['_id']): {'tag': 'approved', 'comment': None}}
@@ -0,0 +1,133 @@
+import gzip
+import os
+import struct
+
+import numpy as np
+import pytest
+import SimpleITK as sitk
+
+from segverviewer.image_io import (
+    PROBE_BYTES, probe_image_header, read_image_from_buffer, read_local_image_information,
+    sniff_image_format
+)
+
+# Rotation of 30 degrees around the z axis, as a NIfTI quaternion and rotation matrix
+_QUATERN = (0.0, 0.0, np.sin(np.pi / 12))
+_ROTATION = np.array([[np.cos(np.pi / 6), -np.sin(np.pi / 6), 0],
+                      [np.sin(np.pi / 6), np.cos(np.pi / 6), 0],
+                      [0, 0, 1]])
+
+
+def _nifti_bytes(array, endian='<', slope=0.0, inter=0.0, qform=True, sform=True,
+                 sform_offset=(0.0, 0.0, 0.0)):
+    spacing = np.array([0.5, 0.75, 2.0])
+    origin = np.array([10.0, -3.0, 4.5])
+    header = bytearray(352)
+    struct.pack_into(f'{endian}i', header, 0, 348)
+    struct.pack_into(f'{endian}8h', header, 40, 3, *array.shape[::-1], 1, 1, 1, 1)
+    datatype, bitpix = {np.dtype(np.int16): (4, 16), np.dtype(np.float32): (16, 32)}[array.dtype]
+    struct.pack_into(f'{endian}2h', header, 70, datatype, bitpix)
+    struct.pack_into(f'{endian}8f', header, 76, 1.0, *spacing, 1, 1, 1, 1)
+    struct.pack_into(f'{endian}3f', header, 108, 352.0, slope, inter)
+    header[123] = 10
+    struct.pack_into(f'{endian}2h', header, 252, int(qform), int(sform))
+    struct.pack_into(f'{endian}6f', header, 256, *_QUATERN, *origin)
+    srow = np.hstack([_ROTATION * spacing, (origin + sform_offset)[:, None]])
+    struct.pack_into(f'{endian}12f', header, 280, *srow.ravel())
+    header[344:348] = b'n+1\x00'
+    return bytes(header) + array.astype(array.dtype.newbyteorder(endian)).tobytes()
+
+
+def _nrrd_bytes(array):
+    header = (
+        'NRRD0004\n'
+        'type: short\n'
+        'dimension: 3\n'
+        'space: right-anterior-superior\n'
+        f'sizes: {" ".join(str(s) for s in array.shape[::-1])}\n'
+        'space directions: (0.5,0,0) (0,0,0.75) (0,-2,0)\n'
+        'endian: little\n'
+        'encoding: raw\n'
+        'space origin: (10,-3,4.5)\n'
+        '\n'
+    )
+    return header.encode('ascii') + array.astype('<i2').tobytes()
+
+
+@pytest.mark.parametrize('name, exts, content', [
+    ('scaled', '.nii', lambda array: _nifti_bytes(array, slope=2.5, inter=-7.0)),
+    ('qform_only', '.nii', lambda array: _nifti_bytes(array, sform=False)),
+    ('sform_only', '.nii', lambda array: _nifti_bytes(array, qform=False)),
+    ('qform_sform_differ', '.nii',
+     lambda array: _nifti_bytes(array, sform_offset=(5.0, 0.0, 0.0))),
+    ('big_endian', '.nii', lambda array: _nifti_bytes(array, endian='>')),
+    ('float_big_endian', '.nii',
+     lambda array: _nifti_bytes(array.astype(np.float32) / 3, endian='>')),
+    ('compressed', '.nii.gz', lambda array: gzip.compress(_nifti_bytes(array))),
+    ('ras_space', '.nrrd', _nrrd_bytes),
+])
+def test_read_image_from_buffer_matches_simpleitk(tmp_path, name, exts, content):
+    array = (np.arange(4 * 5 * 6, dtype=np.int16) - 50).reshape(4, 5, 6)
+    buffer = content(array)
+    path = str(tmp_path / f'{name}{exts}')
+    with open(path, 'wb') as fp:
+        fp.write(buffer)
+    expected = sitk.ReadImage(path)
+
+    image = read_image_from_buffer(buffer, exts)
+    if name == 'qform_sform_differ':
+        # Left to SimpleITK, like any image the decoder does not support
+        assert image is None
+        assert probe_image_header(buffer, exts) is None
+        return
+
+    assert image.GetPixelID() == expected.GetPixelID()
+    assert np.array_equal(sitk.GetArrayViewFromImage(image), sitk.GetArrayViewFromImage(expected))
+    assert np.allclose(image.GetSpacing(), expected.GetSpacing())
+    assert np.allclose(image.GetOrigin(), expected.GetOrigin(), atol=1e-4)
+    assert np.allclose(image.GetDirection(), expected.GetDirection(), atol=1e-5)
+
+    information = probe_image_header(buffer[:PROBE_BYTES], exts)
+    assert information['dtype'] == sitk.GetArrayViewFromImage(expected).dtype.name
+    assert np.allclose(information['origin'], expected.GetOrigin(), atol=1e-4)
+
+
+@pytest.mark.parametrize('exts', ['.nii', '.nii.gz', '.nrrd'])
+def test_probe_image_header(tmp_path, exts):
+    array = np.arange(4 * 5 * 6, dtype=np.int16).reshape(4, 5, 6)
+    image = sitk.GetImageFromArray(array)
+    image.SetSpacing((0.5, 0.75, 2.0))
+    image.SetOrigin((10.0, -3.0, 4.5))
+    path = str(tmp_path / f'image{exts}')
+    sitk.WriteImage(image, path)
+
+    with open(path, 'rb') as fp:
+        head = fp.read(PROBE_BYTES)
+    information = probe_image_header(head, exts)
+    expected = read_local_image_information(path, exts)
+
+    assert information['dtype'] == expected['dtype'] == 'int16'
+    assert information['size'] == expected['size'] == (6, 5, 4)
+    assert np.allclose(information['spacing'], expected['spacing'])
+    assert np.allclose(information['origin'], expected['origin'])
+    assert np.allclose(information['direction'], expected['direction'])
+    assert sniff_image_format(head) == ('nrrd' if exts == '.nrrd' else 'nifti')
+
+
+def test_read_information_without_extension(tmp_path):
+    path = str(tmp_path / 'image.mha')
+    sitk.WriteImage(sitk.Image([3, 2], sitk.sitkVectorFloat32, 3), path)
+    # Assetstores name files by their hash, without extension
+    os.rename(path, str(tmp_path / 'blob'))
+
+    information = read_local_image_information(str(tmp_path / 'blob'), '.mha')
+    assert information['size'] == (3, 2)
+    assert information['dtype'] == 'float32'
+    assert information['components'] == 3
+
+
+def test_unknown_content():
+    head = gzip.compress(b'not an image')
+    assert sniff_image_format(b'plain text') is None
+    assert sniff_image_format(head) is None
+    assert probe_image_header(head, '.nii.gz') is None
@@ -0,0 +1,122 @@
+import io
+import json
+
+import pytest
+
+from segverviewer import manifest
+from segverviewer.manifest import match_files, version_file_names, volume_file_names
+
+INDEX = {
+    'volume-extension': '.nrrd',
+    'label-extension': '.nii.gz',
+    'volumes': {
+        'a': {'versions': [{'id': 'a-1'}, {'id': 'a-2'}]},
+        'b': {'versions': [{'id': 'b-1'}]},
+    },
+}
+
+
+def test_file_names():
+    assert volume_file_names(INDEX) == {'a.nrrd': 'a', 'b.nrrd': 'b'}
+    assert list(version_file_names(INDEX)) == ['a-1.nii.gz', 'a-2.nii.gz', 'b-1.nii.gz']
+    assert version_file_names(INDEX, 'b') == {'b-1.nii.gz': ('b', 'b-1')}
+
+
+def test_match_files():
+    files = [{'name': 'b-1.nii.gz'}, {'name': 'other.nii.gz'}, {'name': 'a-1.nii.gz'}]
+    matched = match_files(version_file_names(INDEX), files)
+    assert [file['name'] for file in matched] == ['a-1.nii.gz', 'b-1.nii.gz']
+
+
+CONTENT = dict(INDEX, volumes={
+    'a': {'modality': 'CT', 'versions': [
+        {'id': 'a-1', 'tag': 'draft', 'score': 0.5, 'history': [{'id': 'old'}]},
+        {'id': 'a-2', 'extra': {'nested': True}},
+    ]},
+    'b': {'versions': []},
+})
+
+
+@pytest.fixture(params=[True, False], ids=['streaming', 'json'])
+def streaming(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(manifest, 'ijson', None)
+    elif manifest.ijson is None:
+        pytest.skip('ijson is not installed')
+    return request.param
+
+
+def _content():
+    return io.BytesIO(json.dumps(CONTENT).encode())
+
+
+def test_load_index(streaming):
+    index = manifest.load_index(_content())
+    assert index == CONTENT
+
+    with pytest.raises(ValueError):
+        manifest.load_index(io.BytesIO(b'[]'))
+
+
+def test_load_index_outline(streaming):
+    outline = manifest.load_index_outline(_content())
+    assert outline == dict(INDEX, volumes={
+        'a': {'versions': [{'id': 'a-1'}, {'id': 'a-2'}]},
+        'b': {'versions': []},
+    })
+    assert manifest.summarize_index(outline) == manifest.summarize_index(CONTENT)
+    assert version_file_names(outline) == version_file_names(CONTENT)
+
+    with pytest.raises(ValueError):
+        manifest.load_index_outline(io.BytesIO(b'[]'))
+
+
+def test_load_index_versions(streaming):
+    index = manifest.load_index_versions(_content(), 'a')
+    assert index == dict(INDEX, volumes={'a': {'versions': CONTENT['volumes']['a']['versions']}})
+    assert manifest.list_versions(index, 'a') == manifest.list_versions(CONTENT, 'a')
+
+    index = manifest.load_index_versions(_content())
+    assert manifest.list_versions(index) == manifest.list_versions(CONTENT)
+    assert 'modality' not in index['volumes']['a']
+    assert manifest.load_index_versions(_content(), 'missing')['volumes'] == {}
+
+
+def test_load_index_skips_unrelated_subtrees(monkeypatch):
+    if manifest.ijson is None:
+        pytest.skip('ijson is not installed')
+    built = []
+    build = manifest._build
+
+    def record_build(events, event, value):
+        value = build(events, event, value)
+        built.append(value)
+        return value
+
+    monkeypatch.setattr(manifest, '_build', record_build)
+    manifest.load_index_outline(_content())
+    # Only the settings and the version IDs are built
+    assert sorted(built) == ['.nii.gz', '.nrrd', 'a-1', 'a-2']
+
+    built.clear()
+    manifest.load_index_versions(_content(), 'b')
+    assert sorted(map(json.dumps, built)) == ['".nii.gz"', '".nrrd"', '[]']
+
+
+def test_summarize_and_list_volumes():
+    summary = manifest.summarize_index(INDEX)
+    assert 'volumes' not in summary
+    assert summary['volumeCount'] == 2
+    assert summary['versionCount'] == 3
+
+    page = manifest.list_volumes(INDEX, offset=1, limit=1)
+    assert page == {'total': 2, 'volumes': [{'id': 'b', 'versionCount': 1}]}
+    assert manifest.list_volumes(INDEX, text='A')['total'] == 1
+
+
+def test_list_versions():
+    versions = manifest.list_versions(INDEX)
+    assert [version['name'] for version in versions] == [
+        'a-1.nii.gz', 'a-2.nii.gz', 'b-1.nii.gz']
+    assert manifest.list_versions(INDEX, 'b') == [
+        {'id': 'b-1', 'volume': 'b', 'name': 'b-1.nii.gz'}]
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from segverviewer.derivatives import compute_label_derivatives
+from segverviewer.metrics import compute_metrics, surface_distances
+
+
+def test_shifted_cube_distances():
+    mask1 = np.zeros((10, 10, 10), dtype=bool)
+    mask1[2:6, 2:6, 2:6] = True
+    mask2 = np.zeros_like(mask1)
+    mask2[2:6, 2:6, 3:7] = True
+
+    distances = surface_distances(mask1, mask2, (2.0, 1.0, 1.0))
+    # The cube moved by one voxel along x, which is 2 mm
+    assert distances['hausdorff'] == pytest.approx(2.0)
+    assert distances['hd95'] == pytest.approx(2.0)
+    assert 0 < distances['assd'] < 2.0
+
+
+def test_compute_metrics():
+    seg1 = np.zeros((8, 8, 8), dtype=np.uint8)
+    seg1[1:4, 1:4, 1:4] = 1
+    seg1[5:7, 5:7, 5:7] = 2
+    seg2 = seg1.copy()
+    seg2[5:7, 5:7, 5:7] = 0
+    seg2[0, 0, 0] = 3
+
+    metrics = compute_metrics(
+        seg1, seg2, (1, 1, 1), compute_label_derivatives(seg1), compute_label_derivatives(seg2))
+    by_label = {entry['label']: entry for entry in metrics['labels']}
+
+    assert by_label[1]['dice'] == 1.0
+    assert by_label[1]['jaccard'] == 1.0
+    assert by_label[1]['hausdorff'] == 0.0
+    assert by_label[2]['dice'] == 0.0
+    assert by_label[2]['hausdorff'] is None
+    assert by_label[3]['dice'] == 0.0
+    assert metrics['overall']['dice'] == pytest.approx(2 * 27 / (35 + 28))
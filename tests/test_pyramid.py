@@ -0,0 +1,39 @@
+import numpy as np
+
+from segverviewer.pyramid import build_pyramid, downsample, level_geometry, pyramid_level
+
+
+def test_downsample():
+    volume = np.arange(4 * 4 * 4, dtype=np.float32).reshape(4, 4, 4)
+    assert np.array_equal(downsample(volume), [
+        [[10.5, 12.5], [18.5, 20.5]],
+        [[42.5, 44.5], [50.5, 52.5]],
+    ])
+    assert downsample(volume.astype(np.int16)).dtype == np.int16
+
+    labels = np.zeros((3, 4, 4), dtype=np.uint8)
+    labels[:2, :2, :2] = [[[1, 1], [1, 2]], [[2, 2], [2, 0]]]
+    labels[:2, 2:, :2] = [[[3, 3], [0, 0]], [[0, 0], [3, 3]]]
+    labels[2] = 5
+    reduced = downsample(labels, labels=True)
+    assert reduced.dtype == np.uint8
+    assert reduced.shape == (2, 2, 2)
+    # Ties go to the largest label, odd sizes repeat the last voxel
+    assert reduced[0, 0, 0] == 2
+    assert reduced[0, 1, 0] == 3
+    assert reduced[0, 0, 1] == 0
+    assert np.all(reduced[1] == 5)
+
+
+def test_pyramid_levels():
+    levels = build_pyramid(np.zeros((20, 100, 70), dtype=np.float32), min_size=32)
+    assert [level.shape for level in levels] == [(10, 50, 35), (5, 25, 18)]
+
+    assert pyramid_level((20, 100, 70), 0, 256, len(levels)) == 0
+    assert pyramid_level((20, 100, 70), 0, 50, len(levels)) == 1
+    assert pyramid_level((20, 100, 70), 2, 8, len(levels)) == 2
+
+    spacing, origin = level_geometry(
+        (0.5, 1.0, 2.0), (10.0, 0.0, 0.0), (-1, 0, 0, 0, 1, 0, 0, 0, 1), 1)
+    assert spacing == (1.0, 2.0, 4.0)
+    assert origin == (9.75, 0.5, 1.0)
@@ -0,0 +1,33 @@
+import numpy as np
+
+from segverviewer.quantification import quantify_labels
+
+
+def test_quantify_labels():
+    rng = np.random.default_rng(0)
+    seg = rng.integers(0, 4, size=(5, 6, 7)).astype(np.uint8)
+    image = rng.normal(1000, 50, size=seg.shape).astype(np.float32)
+
+    quantification = quantify_labels(seg, image, [1, 2, 3], (0.5, 0.5, 2.0))
+
+    assert [entry['label'] for entry in quantification['labels']] == [1, 2, 3]
+    for entry in quantification['labels']:
+        values = image[seg == entry['label']].astype(np.float64)
+        assert entry['count'] == values.size
+        assert entry['volume'] == values.size * 0.5
+        assert entry['min'] == values.min()
+        assert entry['max'] == values.max()
+        assert np.isclose(entry['mean'], values.mean())
+        assert np.isclose(entry['sd'], values.std())
+
+    foreground = image[seg != 0].astype(np.float64)
+    assert quantification['overall']['count'] == foreground.size
+    assert np.isclose(quantification['overall']['mean'], foreground.mean())
+
+
+def test_quantify_empty_segmentation():
+    seg = np.zeros((2, 2, 2), dtype=np.uint8)
+    quantification = quantify_labels(seg, np.ones(seg.shape), [], (1, 1, 1))
+    assert quantification['labels'] == []
+    assert quantification['overall']['count'] == 0
+    assert quantification['overall']['mean'] is None
@@ -0,0 +1,40 @@
+import pytest
+
+from segverviewer.search import search_query, search_record
+
+
+def test_search_record():
+    file = {'_id': 'f1', 'name': 'v2.nii.gz', 'tag': 'approved'}
+    version = {'id': 'v2', 'volume': 'case1', 'name': 'v2.nii.gz', 'tag': 'draft'}
+    record = search_record(file, version, {'labels': [1, 7], 'counts': [10, 3]})
+    assert record == {
+        'fileId': 'f1',
+        'name': 'v2.nii.gz',
+        'volume': 'case1',
+        'version': 'v2',
+        'tag': 'approved',
+        'labels': [1, 7],
+        'labelCounts': [{'label': 1, 'count': 10}, {'label': 7, 'count': 3}],
+    }
+
+    record = search_record({'_id': 'f2', 'name': 'other.nii.gz'})
+    assert record['volume'] is None
+    assert record['labels'] == []
+
+
+def test_search_query():
+    assert search_query('c', volume='case1', tag='approved', labels=[7]) == {
+        'collectionId': 'c',
+        'volume': 'case1',
+        'tag': 'approved',
+        'labels': {'$all': [7]},
+    }
+
+    query = search_query('c', labels=[1, 7], min_count=5)
+    assert query['$and'] == [
+        {'labelCounts': {'$elemMatch': {'label': 1, 'count': {'$gte': 5}}}},
+        {'labelCounts': {'$elemMatch': {'label': 7, 'count': {'$gte': 5}}}},
+    ]
+
+    with pytest.raises(ValueError):
+        search_query('c', min_count=5)
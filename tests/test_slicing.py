@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from segverviewer.slicing import extract_plane, plane_orientation
+
+# Coronal acquisition: columns towards the patient right, rows towards the feet
+DIRECTION = (-1, 0, 0, 0, 0, 1, 0, -1, 0)
+SPACING = (0.5, 2.0, 1.0)
+ORIGIN = (10.0, -5.0, 3.0)
+
+
+@pytest.mark.parametrize('plane, columns, rows', [
+    ('axial', (1, 0, 0), (0, 1, 0)),
+    ('coronal', (1, 0, 0), (0, 0, -1)),
+    ('sagittal', (0, 1, 0), (0, 0, -1)),
+])
+def test_extract_plane(plane, columns, rows):
+    array = np.arange(4 * 5 * 6).reshape(4, 5, 6)
+    matrix = np.reshape(DIRECTION, (3, 3))
+    index = 2
+    slice_array, geometry = extract_plane(array, SPACING, ORIGIN, DIRECTION, plane, index)
+
+    assert np.shares_memory(slice_array, array)
+    assert geometry['axis'] == plane_orientation(DIRECTION, plane)['axis']
+    assert geometry['shape'] == (slice_array.shape[1], slice_array.shape[0], 1)
+    axes = np.reshape(geometry['direction'], (3, 3))
+    assert tuple(axes[:, 0]) == columns
+    assert tuple(axes[:, 1]) == rows
+
+    # Every shown voxel is at the physical position of its source voxel
+    for row, column in np.ndindex(slice_array.shape):
+        z, y, x = np.unravel_index(slice_array[row, column], array.shape)
+        assert (z, y, x)[geometry['axis']] == index
+        expected = np.asarray(ORIGIN) + matrix @ (np.asarray(SPACING) * (x, y, z))
+        shown = np.asarray(geometry['origin']) + axes @ (
+            np.asarray(geometry['spacing']) * (column, row, 0))
+        assert np.allclose(shown, expected)
@@ -0,0 +1,65 @@
+import json
+import struct
+
+import numpy as np
+
+from segverviewer.transport import content_etag, encode_header, etag_matches, iter_raw, \
+    negotiate_encoding, pack_mask, to_transport_array
+
+
+def test_raw_layout_is_aligned():
+    array = to_transport_array(np.arange(12, dtype='>i2').reshape(3, 4))
+    body = b''.join(iter_raw({'shape': [4, 3, 1]}, array))
+
+    header_length = struct.unpack('<I', body[:4])[0]
+    assert (4 + header_length) % 8 == 0
+
+    header = json.loads(body[4:4 + header_length])
+    assert header == {'shape': [4, 3, 1], 'dtype': 'int16'}
+    voxels = np.frombuffer(body[4 + header_length:], dtype='<i2')
+    assert voxels.tolist() == list(range(12))
+
+
+def test_transport_array_conversion():
+    assert to_transport_array(np.zeros(3, dtype=bool)).dtype == np.uint8
+    assert to_transport_array(np.arange(3, dtype=np.int64)).dtype == np.int32
+    assert to_transport_array(np.array([2 ** 40])).dtype == np.float64
+
+    view = np.arange(16, dtype=np.float32).reshape(4, 4)[:, 1]
+    assert to_transport_array(view).flags['C_CONTIGUOUS']
+
+
+def test_header_is_json():
+    encoded = encode_header({'value': np.int64(3)})
+    assert json.loads(encoded[4:]) == {'value': 3}
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding('gzip, deflate, br') == 'gzip'
+    assert negotiate_encoding('gzip;q=0, deflate') is None
+    assert negotiate_encoding(None) is None
+
+
+def test_etags():
+    tag = content_etag([('5f0c', 'abc')], {'k': 3, 'format': 'raw'})
+    assert tag == content_etag([('5f0c', 'abc')], {'format': 'raw', 'k': 3})
+    assert tag != content_etag([('5f0c', 'abd')], {'k': 3, 'format': 'raw'})
+    assert tag.startswith('W/"')
+
+    assert etag_matches(tag, f'"other", {tag}')
+    assert etag_matches(tag, tag[2:])
+    assert etag_matches(tag, '*')
+    assert not etag_matches(tag, '"other"')
+    assert not etag_matches(tag, None)
+
+
+def test_pack_mask():
+    array = np.array([[0, 7, 7], [2, 0, 7], [7, 2, 0]], dtype=np.uint16)
+    packed, mask = pack_mask(array, [7])
+    assert packed.dtype == np.uint8
+    assert packed.tolist() == [0b01100110, 0b0]
+    assert mask == {'labels': [7], 'voxels': 9, 'encoding': 'packbits', 'bitorder': 'little'}
+
+    packed, _ = pack_mask(array, [2, 7])
+    bits = np.unpackbits(packed, count=array.size, bitorder='little').reshape(array.shape)
+    assert np.array_equal(bits, array != 0)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from segverviewer.version_matrix import pairwise_matrix
+
+
+def _versions():
+    base = np.zeros((6, 7, 8), dtype=np.uint8)
+    base[1:4, 1:4, 1:4] = 1
+    grown = base.copy()
+    grown[4, 1:4, 1:4] = 1
+    relabelled = base.copy()
+    relabelled[base == 1] = 2
+    return [base, grown, relabelled, np.zeros_like(base), np.zeros((2, 2, 2), dtype=np.uint8)]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_pairwise_matrix(workers):
+    progress = []
+    matrix = pairwise_matrix(_versions(), workers, lambda done, total: progress.append(done))
+
+    assert matrix['foreground'] == [27, 36, 27, 0, 0]
+    assert matrix['dice'][0][1] == matrix['dice'][1][0] == pytest.approx(2 * 27 / 63)
+    assert matrix['changed'][0][1] == 9
+    # Relabelling changes every voxel but keeps the foreground
+    assert matrix['dice'][0][2] == 1.0
+    assert matrix['changed'][0][2] == 27
+    assert matrix['dice'][0][3] == 0.0
+    assert matrix['dice'][3][3] is None
+    assert matrix['changed'][0][4] is None
+    assert sorted(progress)[-1] == 10
@@ -0,0 +1,39 @@
+from segverviewer.volume_cache import VolumeCache, file_cache_key
+
+
+def test_lru_eviction_by_bytes():
+    cache = VolumeCache(max_bytes=100, max_entries=10)
+    cache.put(('a', '1'), 'A', 60)
+    cache.put(('b', '1'), 'B', 30)
+    assert cache.get(('a', '1')) == 'A'
+
+    # 'b' is now the least recently used entry
+    cache.put(('c', '1'), 'C', 30)
+    assert cache.get(('b', '1')) is None
+    assert cache.get(('a', '1')) == 'A'
+    assert cache.get(('c', '1')) == 'C'
+
+    stats = cache.stats()
+    assert stats['bytes'] == 90
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 3
+    assert stats['misses'] == 1
+
+
+def test_invalidate_file():
+    cache = VolumeCache()
+    file = {'_id': 'abc', 'sha512': 'deadbeef'}
+    cache.put(file_cache_key(file), 'volume', 10)
+    cache.put(file_cache_key(file, 1), 'level 1', 5)
+    cache.put(file_cache_key({'_id': 'other', 'sha512': 'x'}), 'other', 5)
+
+    assert cache.invalidate('abc') == 2
+    assert cache.get(file_cache_key(file)) is None
+    assert cache.stats()['bytes'] == 5
+
+
+def test_oversized_values_are_not_stored():
+    cache = VolumeCache(max_bytes=10)
+    cache.put(('a', '1'), 'A', 11)
+    assert cache.get(('a', '1')) is None
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,44 @@
+import threading
+
+from segverviewer.work_queue import WorkQueue
+
+
+def test_work_queue():
+    work_queue = WorkQueue(workers=3)
+    results = []
+    lock = threading.Lock()
+
+    def task(value):
+        if value == 5:
+            raise ValueError('failing task')
+        with lock:
+            results.append(value)
+
+    for value in range(10):
+        assert work_queue.submit(task, value)
+    work_queue.join()
+
+    assert sorted(results) == [0, 1, 2, 3, 4, 6, 7, 8, 9]
+    stats = work_queue.stats()
+    assert stats['completed'] == 9
+    assert stats['failed'] == 1
+    assert stats['pending'] == stats['running'] == 0
+
+
+def test_work_queue_is_bounded():
+    work_queue = WorkQueue(workers=1, max_pending=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_task():
+        started.set()
+        release.wait()
+
+    assert work_queue.submit(blocking_task)
+    started.wait()
+    assert work_queue.submit(blocking_task)
+    # The worker is busy and one task is already waiting
+    assert not work_queue.submit(blocking_task)
+    release.set()
+    work_queue.join()
+    assert work_queue.stats()['rejected'] == 1